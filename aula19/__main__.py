@@ -0,0 +1,5 @@
+import sys
+
+from aula19.cli import main
+
+sys.exit(main())
@@ -0,0 +1,167 @@
+# Motor de análise para vários indicadores de uma vez
+#
+# Os scripts repetem o mesmo roteiro para cada indicador (agrupar por
+# munic, somar, média, mediana, quartis, IQR, limites, outliers). Aqui o
+# roteiro é feito UMA vez para todos os indicadores pedidos:
+#   1. uma única soma por município (np.bincount sobre os códigos
+#      inteiros dos municípios, ver municipios.py) de todas as colunas
+#      pedidas;
+#   2. todas as medidas calculadas com NumPy ao longo do eixo 0
+#      (matriz municípios x indicadores), sem laço por indicador;
+#   3. resultado numa tabela com uma linha por indicador.
+#
+# Uso:
+#   from aula19.analise import analisar
+#   df_estatisticas = analisar(['roubo_veiculo', 'estelionato'])
+#
+#   python -m aula19.analise roubo_veiculo estelionato
+#   python -m aula19.analise            # todos os indicadores
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from aula19.dados import carregar_ocorrencias
+from aula19.estatistica import FATOR_IQR, ranquear, resumir
+from aula19.municipios import (anexar_populacao, codificar, somar_por_codigo,
+                               taxa_por_habitantes)
+
+
+# Colunas que identificam o registro (delegacia, período, local) e portanto
+# não são indicadores de criminalidade.
+COLUNAS_CHAVE = ('cisp', 'mes', 'ano', 'mes_ano', 'aisp', 'risp', 'munic',
+                 'mcirc', 'regiao', 'fase')
+
+
+def indicadores_disponiveis(colunas):
+    """Lista as colunas que são indicadores (tudo que não é chave)."""
+    return [nome for nome in colunas if nome not in COLUNAS_CHAVE]
+
+
+def agregar_por_municipio(df_ocorrencias, indicadores, populacao=None):
+    """Total de cada indicador por município, numa única passada.
+
+    A soma é feita sobre os códigos inteiros dos municípios (np.bincount),
+    sem comparar nomes; os nomes só entram no índice do resultado.
+
+    populacao: tabela de população (municipios.ler_populacao). Se
+               informada, o resultado é a taxa por 100 mil habitantes, só
+               dos municípios com população conhecida.
+
+    Retorna um DataFrame com o município no índice e uma coluna por
+    indicador.
+    """
+    codigos, dimensao = codificar(df_ocorrencias['munic'], df_ocorrencias.get('mcirc'))
+    totais, linhas = somar_por_codigo(codigos, [df_ocorrencias[i] for i in indicadores],
+                                      len(dimensao['nomes']))
+    # Como observed=True: só os municípios que aparecem nos dados
+    presentes = np.flatnonzero(linhas)
+
+    if populacao is None:
+        totais = totais[presentes]
+        inteiros = all(pd.api.types.is_integer_dtype(df_ocorrencias[i]) for i in indicadores)
+        dados = totais.astype(np.int64) if inteiros else totais
+    else:
+        dimensao = anexar_populacao(dimensao, populacao)
+        presentes = presentes[~np.isnan(dimensao['populacao'][presentes])]
+        dados = taxa_por_habitantes(totais[presentes], dimensao['populacao'][presentes])
+
+    return pd.DataFrame(dados, columns=indicadores,
+                        index=pd.Index(dimensao['nomes'][presentes], name='munic'))
+
+
+def estatisticas(df_agregado, metodo='weibull', fator_iqr=FATOR_IQR, outliers=False):
+    """Calcula as medidas descritivas de todas as colunas de uma vez.
+
+    df_agregado: DataFrame municípios x indicadores (saída de
+                 agregar_por_municipio).
+    metodo: método dos quartis ('weibull', 'linear' ou 'hazen').
+    outliers: se True, inclui as listas de municípios outliers (inferiores
+              em ordem crescente, superiores em ordem decrescente).
+
+    Retorna um DataFrame com uma linha por indicador.
+    """
+    valores = df_agregado.to_numpy(dtype=np.float64)
+
+    # Quartis, limites e outliers saem de uma única ordenação por coluna
+    resumo = resumir(valores, metodo, fator_iqr)
+    media = valores.mean(axis=0)
+    mediana = resumo['mediana']
+    minimo = resumo['minimo']
+    maximo = resumo['maximo']
+
+    variancia = valores.var(axis=0)
+    desvio_padrao = np.sqrt(variancia)
+
+    # Mediana ou média zero (indicador sem registros) geram divisão por
+    # zero; nesses casos a medida fica NaN.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distancia = np.abs((media - mediana) / mediana)
+        coeficiente = desvio_padrao / media
+        distancia_var_media = variancia / media ** 2
+
+    df_estatisticas = pd.DataFrame({
+        'municipios': len(valores),
+        'media': media,
+        'mediana': mediana,
+        'distancia': distancia,
+        'minimo': minimo,
+        'q1': resumo['q1'],
+        'q2': resumo['q2'],
+        'q3': resumo['q3'],
+        'maximo': maximo,
+        'amplitude_total': maximo - minimo,
+        'iqr': resumo['iqr'],
+        'limite_inferior': resumo['limite_inferior'],
+        'limite_superior': resumo['limite_superior'],
+        'outliers_inferiores': resumo['outliers_inferiores'],
+        'outliers_superiores': resumo['outliers_superiores'],
+        'variancia': variancia,
+        'desvio_padrao': desvio_padrao,
+        'coeficiente': coeficiente,
+        'distancia_var_media': distancia_var_media,
+    }, index=pd.Index(df_agregado.columns, name='indicador'))
+
+    if outliers:
+        nomes = df_agregado.index.to_numpy()
+        extremos = [ranquear(resumo, 'outliers', j) for j in range(valores.shape[1])]
+        df_estatisticas['municipios_outliers_inferiores'] = [list(nomes[i]) for i, _ in extremos]
+        df_estatisticas['municipios_outliers_superiores'] = [list(nomes[s]) for _, s in extremos]
+    return df_estatisticas
+
+
+def analisar(indicadores=None, metodo='weibull', fator_iqr=FATOR_IQR, populacao=None,
+             **kwargs):
+    """Carrega os dados, agrega por município e calcula as medidas.
+
+    indicadores: lista de colunas (None = todos os indicadores do arquivo).
+    populacao: tabela de população; se informada, as medidas e os outliers
+               são das taxas por 100 mil habitantes.
+    Os demais argumentos nomeados vão para carregar_ocorrencias().
+
+    Retorna (df_agregado, df_estatisticas).
+    """
+    if indicadores is None:
+        df_ocorrencias = carregar_ocorrencias(**kwargs)
+        indicadores = indicadores_disponiveis(df_ocorrencias.columns)
+    else:
+        colunas = ['munic', *indicadores]
+        if populacao is not None and 'ibge' in populacao:
+            colunas.append('mcirc')
+        df_ocorrencias = carregar_ocorrencias(colunas, **kwargs)
+
+    df_agregado = agregar_por_municipio(df_ocorrencias, indicadores, populacao)
+    return df_agregado, estatisticas(df_agregado, metodo, fator_iqr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Estatísticas por município de vários indicadores')
+    parser.add_argument('indicadores', nargs='*', help='padrão: todos')
+    parser.add_argument('--metodo', default='weibull', choices=['weibull', 'linear', 'hazen'],
+                        help='método dos quartis')
+    parser.add_argument('--fator-iqr', type=float, default=FATOR_IQR)
+    args = parser.parse_args()
+
+    _, df_estatisticas = analisar(args.indicadores or None, args.metodo, args.fator_iqr)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(df_estatisticas.T)
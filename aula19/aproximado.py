@@ -0,0 +1,297 @@
+# Quantis aproximados em fluxo (sketch KLL)
+#
+# np.median e np.quantile precisam do array inteiro na memória. Para ~92
+# municípios isso não é problema, mas a mesma análise de outliers por IQR
+# no nível dos registros (cada CISP em cada mês) ou em bases sintéticas ou
+# nacionais muito maiores pode não caber na memória.
+#
+# O sketch KLL (Karnin, Lang e Liberty, 2016) guarda uma amostra pequena e
+# ponderada dos valores vistos:
+#   - o nível h guarda itens com peso 2**h;
+#   - quando um nível enche, ele é ordenado e metade dos itens (os de
+#     posição par ou ímpar, sorteado) sobe para o nível seguinte com o dobro
+#     do peso;
+#   - os níveis de cima têm mais capacidade que os de baixo (fator 2/3).
+# A memória fica em torno de 3*k itens, qualquer que seja o tamanho da
+# entrada. Dois sketches podem ser mesclados (mesclar_sketches), então cada
+# bloco, arquivo ou processo pode ter o seu e no final juntamos tudo.
+#
+# Limite de erro: o erro é no POSTO (rank), não no valor. Com k=200, o
+# quantil estimado para p fica, com ~99% de probabilidade, entre os
+# quantis exatos de p - 0.0165 e p + 0.0165 (1.65% do número de registros;
+# o erro cai aproximadamente com 1/k). Em valores, o erro depende da
+# densidade dos dados perto do quantil: onde há muitos valores repetidos
+# (contagens pequenas) o quantil aproximado costuma coincidir com o exato
+# weibull; nas caudas esparsas a diferença em valor é maior.
+# erro_posto() mede o erro real contra os quartis weibull exatos.
+#
+# Uso:
+#   from aula19.aproximado import relatorio_registros
+#   df = relatorio_registros(['roubo_veiculo'], modo='aproximado')
+import numpy as np
+import pandas as pd
+
+from aula19.analise import indicadores_disponiveis
+from aula19.dados import ENDERECO_DADOS, atualizar_cache, carregar_ocorrencias, ler_meta
+from aula19.estatistica import FATOR_IQR, quantis_ordenados
+
+
+K_PADRAO = 200
+FATOR_CAPACIDADE = 2 / 3
+MODOS = ('exato', 'aproximado')
+TAMANHO_BLOCO = 500_000
+
+
+def criar_sketch(k=K_PADRAO, semente=None):
+    """Cria um sketch KLL vazio. k controla o erro (~1.65/k) e a memória (~3k)."""
+    return {
+        'k': k,
+        'niveis': [np.empty(0)],
+        'n': 0,
+        'rng': np.random.default_rng(semente),
+    }
+
+
+def _capacidade(sketch, nivel):
+    altura = len(sketch['niveis'])
+    return int(np.ceil(sketch['k'] * FATOR_CAPACIDADE ** (altura - nivel - 1))) + 1
+
+
+def _tamanho(sketch):
+    return sum(len(itens) for itens in sketch['niveis'])
+
+
+def _capacidade_total(sketch):
+    return sum(_capacidade(sketch, h) for h in range(len(sketch['niveis'])))
+
+
+def _compactar(sketch):
+    niveis = sketch['niveis']
+    for h, itens in enumerate(niveis):
+        if len(itens) < _capacidade(sketch, h):
+            continue
+        if h + 1 == len(niveis):
+            niveis.append(np.empty(0))
+        itens = np.sort(itens)
+        # Com quantidade ímpar, o maior item fica no nível, para que a soma
+        # dos pesos continue exatamente igual a n.
+        sobra = itens[len(itens) - len(itens) % 2:]
+        pares = itens[:len(itens) - len(itens) % 2]
+        deslocamento = int(sketch['rng'].integers(2))
+        niveis[h + 1] = np.concatenate([niveis[h + 1], pares[deslocamento::2]])
+        niveis[h] = sobra
+        return
+
+
+def atualizar_sketch(sketch, valores):
+    """Acrescenta um array de valores ao sketch (valores NaN são ignorados)."""
+    valores = np.asarray(valores, dtype=np.float64).ravel()
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return sketch
+    sketch['niveis'][0] = np.concatenate([sketch['niveis'][0], valores])
+    sketch['n'] += len(valores)
+    while _tamanho(sketch) >= _capacidade_total(sketch):
+        _compactar(sketch)
+    return sketch
+
+
+def mesclar_sketches(a, b):
+    """Junta o sketch b em a (os dois devem ter o mesmo k). Retorna a."""
+    while len(a['niveis']) < len(b['niveis']):
+        a['niveis'].append(np.empty(0))
+    for h, itens in enumerate(b['niveis']):
+        a['niveis'][h] = np.concatenate([a['niveis'][h], itens])
+    a['n'] += b['n']
+    while _tamanho(a) >= _capacidade_total(a):
+        _compactar(a)
+    return a
+
+
+def _itens_ponderados(sketch):
+    itens = np.concatenate(sketch['niveis'])
+    pesos = np.concatenate([np.full(len(nivel), 2.0 ** h)
+                            for h, nivel in enumerate(sketch['niveis'])])
+    ordem = np.argsort(itens)
+    return itens[ordem], np.cumsum(pesos[ordem])
+
+
+def quantis_sketch(sketch, probabilidades):
+    """Quantis aproximados.
+
+    O posto procurado segue a mesma definição do método weibull,
+    (n + 1) * p, e o resultado é o primeiro item do sketch cujo peso
+    acumulado alcança esse posto.
+    """
+    if sketch['n'] == 0:
+        raise ValueError('Sketch vazio')
+    itens, acumulado = _itens_ponderados(sketch)
+    postos = (sketch['n'] + 1) * np.asarray(probabilidades, dtype=np.float64)
+    posicoes = np.searchsorted(acumulado, np.clip(postos, 1, sketch['n']))
+    return itens[np.minimum(posicoes, len(itens) - 1)]
+
+
+def erro_posto(sketch, valores, probabilidades=(0.25, 0.50, 0.75)):
+    """Erro de posto (fração de n) dos quantis do sketch contra os exatos.
+
+    Para cada p, compara a fração de valores <= quantil aproximado com a
+    fração de valores <= quantil exato weibull. Útil para conferir o limite
+    de ~1.65/k com os dados reais.
+    """
+    ordenados = np.sort(np.asarray(valores, dtype=np.float64))
+    ordenados = ordenados[~np.isnan(ordenados)]
+    n = len(ordenados)
+    exatos = quantis_ordenados(ordenados, probabilidades, 'weibull')
+    aproximados = quantis_sketch(sketch, probabilidades)
+    posto_exato = np.searchsorted(ordenados, exatos, side='right') / n
+    posto_aproximado = np.searchsorted(ordenados, aproximados, side='right') / n
+    return pd.DataFrame({
+        'p': probabilidades,
+        'exato': exatos,
+        'aproximado': aproximados,
+        'erro_posto': np.abs(posto_aproximado - posto_exato),
+    })
+
+
+def _medidas(registros, media, variancia, minimo, maximo, q1, q2, q3, fator_iqr):
+    iqr = q3 - q1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distancia = np.abs((media - q2) / q2)
+        desvio_padrao = np.sqrt(variancia)
+        coeficiente = desvio_padrao / media
+        distancia_var_media = variancia / media ** 2
+    return {
+        'registros': registros,
+        'media': media,
+        'mediana': q2,
+        'distancia': distancia,
+        'minimo': minimo,
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'maximo': maximo,
+        'amplitude_total': maximo - minimo,
+        'iqr': iqr,
+        'limite_inferior': q1 - fator_iqr * iqr,
+        'limite_superior': q3 + fator_iqr * iqr,
+        'variancia': variancia,
+        'desvio_padrao': desvio_padrao,
+        'coeficiente': coeficiente,
+        'distancia_var_media': distancia_var_media,
+    }
+
+
+def _medidas_vazias(fator_iqr):
+    # Indicador sem nenhum valor (coluna vazia ou base sem linhas): nada a
+    # medir, e nenhum outlier
+    medidas = _medidas(0, *[np.nan] * 7, fator_iqr)
+    medidas['outliers_inferiores'] = 0
+    medidas['outliers_superiores'] = 0
+    return medidas
+
+
+def _relatorio_exato(indicadores, metodo, fator_iqr, kwargs):
+    df = carregar_ocorrencias(indicadores, **kwargs)
+    linhas = {}
+    for indicador in indicadores:
+        valores = df[indicador].to_numpy(dtype=np.float64, na_value=np.nan)
+        valores = np.sort(valores[~np.isnan(valores)])
+        if len(valores) == 0:
+            linhas[indicador] = _medidas_vazias(fator_iqr)
+            continue
+        q1, q2, q3 = quantis_ordenados(valores, [0.25, 0.50, 0.75], metodo)
+        medidas = _medidas(len(valores), valores.mean(), valores.var(),
+                           valores[0], valores[-1], q1, q2, q3, fator_iqr)
+        # O exato usa a mediana do np.median, como os scripts
+        medidas['mediana'] = quantis_ordenados(valores, [0.50], 'linear')[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            medidas['distancia'] = abs((medidas['media'] - medidas['mediana']) / medidas['mediana'])
+        medidas['outliers_inferiores'] = np.searchsorted(valores, medidas['limite_inferior'], 'left')
+        medidas['outliers_superiores'] = len(valores) - np.searchsorted(
+            valores, medidas['limite_superior'], 'right')
+        linhas[indicador] = medidas
+    return linhas
+
+
+def _relatorio_aproximado(indicadores, k, chunksize, fator_iqr, kwargs):
+    sketches = {i: criar_sketch(k, semente=0) for i in indicadores}
+    soma = dict.fromkeys(indicadores, 0.0)
+    soma_quadrados = dict.fromkeys(indicadores, 0.0)
+    minimo = dict.fromkeys(indicadores, np.inf)
+    maximo = dict.fromkeys(indicadores, -np.inf)
+
+    # 1ª passada: sketch, média/variância e mínimo/máximo exatos
+    for bloco in carregar_ocorrencias(indicadores, chunksize=chunksize, **kwargs):
+        for indicador in indicadores:
+            valores = bloco[indicador].to_numpy(dtype=np.float64, na_value=np.nan)
+            valores = valores[~np.isnan(valores)]
+            if len(valores) == 0:
+                continue
+            atualizar_sketch(sketches[indicador], valores)
+            soma[indicador] += valores.sum()
+            soma_quadrados[indicador] += (valores ** 2).sum()
+            minimo[indicador] = min(minimo[indicador], valores.min())
+            maximo[indicador] = max(maximo[indicador], valores.max())
+
+    linhas = {}
+    for indicador in indicadores:
+        n = sketches[indicador]['n']
+        if n == 0:
+            linhas[indicador] = _medidas_vazias(fator_iqr)
+            continue
+        media = soma[indicador] / n
+        variancia = max(soma_quadrados[indicador] / n - media ** 2, 0.0)
+        q1, q2, q3 = quantis_sketch(sketches[indicador], [0.25, 0.50, 0.75])
+        linhas[indicador] = _medidas(n, media, variancia, minimo[indicador],
+                                     maximo[indicador], q1, q2, q3, fator_iqr)
+        linhas[indicador]['outliers_inferiores'] = 0
+        linhas[indicador]['outliers_superiores'] = 0
+
+    # 2ª passada: contagem exata de valores fora dos limites aproximados,
+    # nos mesmos dados da 1ª (sem consultar a origem de novo)
+    kwargs = {**kwargs, 'atualizar': False}
+    for bloco in carregar_ocorrencias(indicadores, chunksize=chunksize, **kwargs):
+        for indicador in indicadores:
+            valores = bloco[indicador].to_numpy(dtype=np.float64, na_value=np.nan)
+            linha = linhas[indicador]
+            linha['outliers_inferiores'] += int((valores < linha['limite_inferior']).sum())
+            linha['outliers_superiores'] += int((valores > linha['limite_superior']).sum())
+    return linhas
+
+
+def relatorio_registros(indicadores=None, modo='exato', metodo='weibull',
+                        fator_iqr=FATOR_IQR, k=K_PADRAO, chunksize=TAMANHO_BLOCO, **kwargs):
+    """Medidas e limites de outliers no nível dos registros (CISP x mês).
+
+    modo: 'exato' ordena todos os valores de cada indicador na memória;
+          'aproximado' lê os dados em blocos de chunksize linhas e estima os
+          quartis com um sketch KLL (erro de posto ~1.65/k). Média,
+          variância, mínimo, máximo e a contagem de outliers (em relação
+          aos limites obtidos) continuam exatos.
+    metodo: método dos quartis no modo exato (o aproximado segue o posto
+            do weibull).
+    Os demais argumentos nomeados vão para carregar_ocorrencias(). A
+    origem é consultada uma única vez, na primeira leitura.
+
+    Retorna um DataFrame com uma linha por indicador. Um indicador sem
+    nenhum valor fica com registros = 0 e medidas NaN.
+    """
+    if modo not in MODOS:
+        raise ValueError(f'Modo desconhecido: {modo} (use {", ".join(MODOS)})')
+    if indicadores is None:
+        pasta = kwargs.get('pasta')
+        if kwargs.get('atualizar', True):
+            meta = atualizar_cache(kwargs.get('origem', ENDERECO_DADOS), pasta)
+        else:
+            meta = ler_meta(pasta)
+        indicadores = indicadores_disponiveis(meta['colunas'])
+        kwargs['atualizar'] = False
+
+    if modo == 'exato':
+        linhas = _relatorio_exato(indicadores, metodo, fator_iqr, kwargs)
+    else:
+        linhas = _relatorio_aproximado(indicadores, k, chunksize, fator_iqr, kwargs)
+
+    df = pd.DataFrame.from_dict(linhas, orient='index')
+    df.index.name = 'indicador'
+    return df
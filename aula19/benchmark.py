@@ -0,0 +1,388 @@
+# Medições de tempo e memória
+#
+# Compara a forma antiga dos scripts com as versões otimizadas, usando um
+# CSV sintético (aula19/sintetico.py) para não depender do site do ISP.
+#
+# O comando suite mede cada etapa do fluxo (conversão do CSV, carga,
+# agregação, estatísticas, outliers e gráficos) e compara com uma linha de
+# base gravada antes, no estilo do asv: cada caso roda algumas vezes, vale
+# o menor tempo, e um caso mais lento que a base além da tolerância é uma
+# regressão (código de saída 1, útil em integração contínua). A base é
+# um JSON por máquina (padrão: <cache>/benchmark_base.json), gravada com
+# --salvar-base. O pytest roda a mesma suíte em miniatura
+# (tests/test_benchmark.py), só para garantir que todos os casos continuam
+# funcionando; tempo só se compara com a base da mesma máquina.
+#
+# Uso:
+#   python -m aula19.benchmark leitura --linhas 2000000
+#   python -m aula19.benchmark estatistica
+#   python -m aula19.benchmark paralelo
+#   python -m aula19.benchmark suite --salvar-base      # grava a base
+#   python -m aula19.benchmark suite --tolerancia 0.2   # compara com a base
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from aula19.analise import agregar_por_municipio, estatisticas, indicadores_disponiveis
+from aula19.aproximado import relatorio_registros
+from aula19.cubo import TIPOS_JANELA
+from aula19.dados import (CODIFICACAO, PASTA_COLUNAS, SEPARADOR, carregar_ocorrencias,
+                          converter_para_colunas, diretorio_cache, ler_csv_ocorrencias)
+from aula19.estatistica import FATOR_IQR, ranquear, resumir
+from aula19.lote import gerar_relatorios
+from aula19.sintetico import gerar_csv
+
+
+LINHAS_LEITURA = 2_000_000
+LINHAS_SUITE = 300_000
+REPETICOES = 5
+TOLERANCIA = 0.25
+# Diferenças menores que isso (segundos) são tratadas como ruído
+PISO_SEGUNDOS = 0.005
+NOME_BASE = 'benchmark_base.json'
+
+
+def medir(funcao, *args, **kwargs):
+    """Executa a função e retorna (resultado, segundos, pico de memória em MB).
+
+    O pico é medido com tracemalloc, que enxerga as alocações do numpy e do
+    pandas. Como o tracemalloc deixa tudo mais lento, o tempo é medido numa
+    execução separada, sem ele.
+    """
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    try:
+        funcao(*args, **kwargs)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultado, segundos, pico / 1024 ** 2
+
+
+def imprimir(nome, segundos, pico_mb):
+    print(f'{nome:<40} {segundos:>8.3f} s {pico_mb:>10.1f} MB')
+
+
+# ----------------------------------------------------------------------
+# Leitura do CSV
+# ----------------------------------------------------------------------
+def leitura_completa(caminho, indicador):
+    # Como os scripts faziam: lê tudo e depois descarta as colunas
+    df = pd.read_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO)
+    df = df[['munic', indicador]]
+    return df.groupby('munic').sum().reset_index()
+
+
+def leitura_projetada(caminho, indicador):
+    df = ler_csv_ocorrencias(caminho, ['munic', indicador])
+    return df.groupby('munic', observed=True).sum().reset_index()
+
+
+def leitura_em_blocos(caminho, indicador, chunksize=250_000):
+    # Soma bloco a bloco: só um bloco fica na memória de cada vez
+    total = None
+    for bloco in ler_csv_ocorrencias(caminho, ['munic', indicador], chunksize=chunksize):
+        parcial = bloco.groupby('munic', observed=True)[indicador].sum()
+        total = parcial if total is None else total.add(parcial, fill_value=0)
+    return total.reset_index()
+
+
+def benchmark_leitura(caminho, indicador='roubo_veiculo'):
+    print(f'\nLeitura de {caminho} ({indicador})')
+    print(70 * '-')
+    for nome, funcao in [('read_csv completo + seleção', leitura_completa),
+                         ('read_csv projetado e tipado', leitura_projetada),
+                         ('read_csv projetado em blocos', leitura_em_blocos)]:
+        _, segundos, pico = medir(funcao, caminho, indicador)
+        imprimir(nome, segundos, pico)
+
+
+# ----------------------------------------------------------------------
+# Quartis e outliers
+# ----------------------------------------------------------------------
+def estatistica_roteiro(df_agregado):
+    # Sequência do exemplo1.py, repetida para cada indicador
+    resultado = {}
+    for indicador in df_agregado.columns:
+        df = df_agregado[[indicador]]
+        array = np.array(df[indicador])
+        mediana = np.median(array)
+        q1 = np.quantile(array, 0.25, method='weibull')
+        q2 = np.quantile(array, 0.50, method='weibull')
+        q3 = np.quantile(array, 0.75, method='weibull')
+        iqr = q3 - q1
+        limite_superior = q3 + (FATOR_IQR * iqr)
+        limite_inferior = q1 - (FATOR_IQR * iqr)
+        menores = df[df[indicador] < q1].sort_values(by=indicador, ascending=True)
+        maiores = df[df[indicador] > q3].sort_values(by=indicador, ascending=False)
+        inferiores = df[df[indicador] < limite_inferior].sort_values(by=indicador, ascending=True)
+        superiores = df[df[indicador] > limite_superior].sort_values(by=indicador, ascending=False)
+        resultado[indicador] = (mediana, q1, q2, q3, menores, maiores, inferiores, superiores)
+    return resultado
+
+
+def estatistica_nucleo(df_agregado):
+    # Uma ordenação por coluna para todos os indicadores de uma vez
+    resumo = resumir(df_agregado.to_numpy(dtype=np.float64))
+    resultado = {}
+    for j, indicador in enumerate(df_agregado.columns):
+        resultado[indicador] = (ranquear(resumo, 'quartis', j),
+                                ranquear(resumo, 'outliers', j))
+    return resumo, resultado
+
+
+def _repetir(funcao, argumento, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(argumento)
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def benchmark_estatistica(formatos=((92, 50), (5_000, 50), (100_000, 10)), repeticoes=5):
+    print('\nQuartis, limites e outliers (tempo médio por rodada)')
+    print(70 * '-')
+    rng = np.random.default_rng(0)
+    for municipios, indicadores in formatos:
+        valores = rng.lognormal(8, 1.2, (municipios, indicadores)).round()
+        df_agregado = pd.DataFrame(valores, columns=[f'indicador_{i}' for i in range(indicadores)])
+        roteiro = _repetir(estatistica_roteiro, df_agregado, repeticoes)
+        nucleo = _repetir(estatistica_nucleo, df_agregado, repeticoes)
+        print(f'{municipios:>7} x {indicadores:<3} roteiro {roteiro * 1000:>9.2f} ms'
+              f'   núcleo {nucleo * 1000:>9.2f} ms   {roteiro / nucleo:>6.1f}x')
+
+
+# ----------------------------------------------------------------------
+# Relatórios em paralelo
+# ----------------------------------------------------------------------
+def cubo_sintetico(municipios=2_000, indicadores=50, meses=264, semente=0):
+    """Cubo com valores aleatórios, sem passar pelo CSV."""
+    rng = np.random.default_rng(semente)
+    escala = rng.lognormal(3, 1.2, (1, municipios, 1))
+    valores = rng.poisson(escala, (meses, municipios, indicadores)).astype(np.float64)
+    acumulado = np.zeros((meses + 1, municipios, indicadores))
+    np.cumsum(valores, axis=0, out=acumulado[1:])
+    return {
+        'municipios': pd.Index([f'municipio_{m}' for m in range(municipios)], name='munic'),
+        'indicadores': [f'indicador_{k}' for k in range(indicadores)],
+        'inicio': 2003 * 12,
+        'valores': valores,
+        'acumulado': acumulado,
+    }
+
+
+def benchmark_paralelo(trabalhadores=None):
+    cubo = cubo_sintetico()
+    maximo = os.cpu_count() or 1
+    trabalhadores = trabalhadores or sorted({1, 2, 4, 8, 16, maximo} & set(range(1, maximo + 1)))
+    print(f'\nRelatórios {len(cubo["municipios"])} municípios x '
+          f'{len(cubo["indicadores"])} indicadores x {", ".join(TIPOS_JANELA)} '
+          f'({maximo} CPUs)')
+    print(70 * '-')
+    base = None
+    for quantidade in trabalhadores:
+        inicio = time.perf_counter()
+        gerar_relatorios(cubo, trabalhadores=quantidade)
+        segundos = time.perf_counter() - inicio
+        base = base or segundos
+        print(f'{quantidade:>3} processos {segundos:>8.2f} s   aceleração {base / segundos:>5.2f}x')
+
+
+# ----------------------------------------------------------------------
+# Suíte com linha de base
+# ----------------------------------------------------------------------
+def cronometrar(funcao, repeticoes=REPETICOES):
+    """Executa a função uma vez para aquecer e depois `repeticoes` vezes.
+
+    Retorna {'minimo', 'mediana', 'repeticoes'} em segundos. O mínimo é o
+    valor comparado com a base: é o menos afetado por outros processos.
+    """
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {'minimo': min(tempos), 'mediana': statistics.median(tempos),
+            'repeticoes': repeticoes}
+
+
+def executar_suite(linhas=LINHAS_SUITE, repeticoes=REPETICOES, graficos=True, semente=0):
+    """Mede as etapas do fluxo sobre um CSV sintético de `linhas` linhas.
+
+    Cada caso recebe o resultado (já pronto) da etapa anterior, então mede
+    só a própria etapa. Retorna o dicionário gravado como linha de base.
+    """
+    casos = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = gerar_csv(os.path.join(pasta, 'sintetico.csv'), linhas, semente=semente)
+        pasta_colunas = os.path.join(pasta, PASTA_COLUNAS)
+        opcoes = {'pasta': pasta, 'atualizar': False}
+
+        casos['conversao'] = cronometrar(
+            lambda: converter_para_colunas(caminho, pasta_colunas), repeticoes)
+        casos['carga'] = cronometrar(lambda: carregar_ocorrencias(**opcoes), repeticoes)
+
+        df_ocorrencias = carregar_ocorrencias(**opcoes)
+        indicadores = indicadores_disponiveis(df_ocorrencias.columns)
+        casos['agregacao'] = cronometrar(
+            lambda: agregar_por_municipio(df_ocorrencias, indicadores), repeticoes)
+
+        df_agregado = agregar_por_municipio(df_ocorrencias, indicadores)
+        casos['estatisticas'] = cronometrar(lambda: estatisticas(df_agregado), repeticoes)
+        casos['outliers_municipio'] = cronometrar(
+            lambda: estatisticas(df_agregado, outliers=True), repeticoes)
+        casos['outliers_registro'] = cronometrar(
+            lambda: relatorio_registros(indicadores, 'exato', **opcoes), repeticoes)
+
+        if graficos:
+            from aula19.graficos import renderizar_lote
+
+            pasta_graficos = os.path.join(pasta, 'graficos')
+            um_indicador = df_agregado[indicadores[:1]]
+            casos['grafico'] = cronometrar(
+                lambda: renderizar_lote(um_indicador, pasta_graficos), repeticoes)
+
+    return {
+        'parametros': {'linhas': linhas, 'semente': semente},
+        'ambiente': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'maquina': platform.node(),
+            'processador': platform.processor() or platform.machine(),
+        },
+        'casos': casos,
+    }
+
+
+def comparar(atual, base, tolerancia=TOLERANCIA, piso=PISO_SEGUNDOS):
+    """Compara os tempos mínimos de cada caso com a base.
+
+    Situação de cada caso: 'regressao' (mais lento que base * (1 +
+    tolerancia) e por mais de `piso` segundos), 'melhora' (o inverso),
+    'ok' ou 'novo' (caso sem base).
+
+    Retorna uma lista de (caso, segundos, segundos_base, razao, situacao).
+    """
+    linhas = []
+    for caso, medida in atual['casos'].items():
+        segundos = medida['minimo']
+        anterior = base['casos'].get(caso)
+        if anterior is None:
+            linhas.append((caso, segundos, None, None, 'novo'))
+            continue
+        segundos_base = anterior['minimo']
+        razao = segundos / segundos_base if segundos_base else float('inf')
+        if segundos > segundos_base * (1 + tolerancia) and segundos - segundos_base > piso:
+            situacao = 'regressao'
+        elif segundos_base > segundos * (1 + tolerancia) and segundos_base - segundos > piso:
+            situacao = 'melhora'
+        else:
+            situacao = 'ok'
+        linhas.append((caso, segundos, segundos_base, razao, situacao))
+    return linhas
+
+
+def benchmark_suite(linhas=LINHAS_SUITE, repeticoes=REPETICOES, caminho_base=None,
+                    salvar_base=False, tolerancia=TOLERANCIA, graficos=True):
+    """Roda a suíte, compara com a base e retorna o código de saída (1 = regressão)."""
+    caminho_base = caminho_base or os.path.join(diretorio_cache(), NOME_BASE)
+    print(f'Suíte com {linhas} linhas sintéticas, {repeticoes} repetições por caso')
+    atual = executar_suite(linhas, repeticoes, graficos)
+
+    base = None
+    if os.path.exists(caminho_base):
+        with open(caminho_base, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        if base['parametros'] != atual['parametros']:
+            print(f'\nBase {caminho_base} foi gravada com {base["parametros"]}; '
+                  'sem comparação', file=sys.stderr)
+            base = None
+
+    print(70 * '-')
+    regressoes = 0
+    if base is None:
+        for caso, medida in atual['casos'].items():
+            print(f'{caso:<22} {medida["minimo"] * 1000:>10.2f} ms '
+                  f'(mediana {medida["mediana"] * 1000:.2f} ms)')
+    else:
+        for caso, segundos, segundos_base, razao, situacao in comparar(atual, base, tolerancia):
+            if segundos_base is None:
+                print(f'{caso:<22} {segundos * 1000:>10.2f} ms {"":>12} {"":>7} {situacao}')
+                continue
+            print(f'{caso:<22} {segundos * 1000:>10.2f} ms {segundos_base * 1000:>9.2f} ms '
+                  f'{razao:>6.2f}x {situacao}')
+            regressoes += situacao == 'regressao'
+
+    if salvar_base:
+        os.makedirs(os.path.dirname(caminho_base) or '.', exist_ok=True)
+        with open(caminho_base, 'w', encoding='utf-8') as arquivo:
+            json.dump(atual, arquivo, indent=2)
+        print(f'\nBase gravada em {caminho_base}')
+    if regressoes:
+        print(f'\n{regressoes} caso(s) mais lento(s) que a base (tolerância '
+              f'{tolerancia:.0%})', file=sys.stderr)
+    return 1 if regressoes else 0
+
+
+def _csv_sintetico(args):
+    if args.csv:
+        return args.csv, None
+    pasta = tempfile.TemporaryDirectory()
+    caminho = os.path.join(pasta.name, 'sintetico.csv')
+    print(f'Gerando {args.linhas} linhas sintéticas...')
+    gerar_csv(caminho, args.linhas)
+    return caminho, pasta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks do aula19')
+    parser.add_argument('benchmark', choices=['leitura', 'estatistica', 'paralelo', 'suite'])
+    parser.add_argument('--linhas', type=int,
+                        help=f'linhas do CSV sintético (padrão: {LINHAS_LEITURA} na '
+                             f'leitura, {LINHAS_SUITE} na suíte)')
+    parser.add_argument('--csv', help='usa um CSV existente em vez de gerar um')
+    parser.add_argument('--trabalhadores', type=int, nargs='+',
+                        help='quantidades de processos a comparar (paralelo)')
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES, help='suíte')
+    parser.add_argument('--base', help=f'arquivo da linha de base (padrão: <cache>/{NOME_BASE})')
+    parser.add_argument('--salvar-base', action='store_true',
+                        help='grava os tempos desta execução como nova base')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help='quanto mais lento que a base (fração) conta como regressão')
+    parser.add_argument('--sem-graficos', action='store_true',
+                        help='não mede os gráficos (sem importar o matplotlib)')
+    args = parser.parse_args()
+
+    if args.benchmark == 'suite':
+        raise SystemExit(benchmark_suite(args.linhas or LINHAS_SUITE, args.repeticoes,
+                                         args.base, args.salvar_base, args.tolerancia,
+                                         not args.sem_graficos))
+    args.linhas = args.linhas or LINHAS_LEITURA
+
+    if args.benchmark == 'estatistica':
+        benchmark_estatistica()
+        raise SystemExit
+    if args.benchmark == 'paralelo':
+        benchmark_paralelo(args.trabalhadores)
+        raise SystemExit
+
+    caminho, pasta = _csv_sintetico(args)
+    try:
+        if args.benchmark == 'leitura':
+            benchmark_leitura(caminho)
+    finally:
+        if pasta is not None:
+            pasta.cleanup()
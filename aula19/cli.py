@@ -0,0 +1,305 @@
+# Ponto de entrada único da linha de comando
+#
+# Uso:
+#   python -m aula19 analisar --indicador roubo_veiculo
+#   python -m aula19 analisar --indicador estelionato --graficos saida/
+#   python -m aula19 analisar --janela ano --indicador roubo_veiculo
+#   python -m aula19 analisar --indicador roubo_veiculo --populacao populacao.csv
+#   python -m aula19 analisar --nivel registro --aproximado
+#   python -m aula19 analisar --nivel hierarquia --indicador roubo_veiculo
+#   python -m aula19 lote --trabalhadores 8 --saida relatorio.csv
+#   python -m aula19 pipeline --indicador roubo_veiculo --metricas metricas.jsonl
+#   python -m aula19 servidor --porta 8000
+#   python -m aula19 importtime --top 10 analisar --indicador roubo_veiculo
+#
+# Este módulo só importa argparse no topo. numpy, pandas e matplotlib são
+# importados dentro de cada comando, e o matplotlib apenas quando há
+# gráficos a gerar. Assim "python -m aula19 --help" e as execuções sem
+# gráfico não pagam o custo de importar o que não usam. O comando
+# importtime mostra quanto tempo cada pacote leva para ser importado.
+import argparse
+import sys
+import time
+
+
+METODOS = ('weibull', 'linear', 'hazen')
+TIPOS_JANELA = ('ano', 'trimestre', 'movel12')
+FATOR_IQR = 1.5
+
+
+def _argumentos_dados(parser):
+    parser.add_argument('--origem', help='URL ou caminho do CSV (padrão: site do ISP)')
+    parser.add_argument('--offline', action='store_true',
+                        help='usa o cache local sem consultar a origem')
+    parser.add_argument('--metodo', default='weibull', choices=METODOS,
+                        help='método dos quartis')
+    parser.add_argument('--fator-iqr', type=float, default=FATOR_IQR)
+
+
+def _opcoes_dados(args):
+    opcoes = {'atualizar': not args.offline}
+    if args.origem:
+        opcoes['origem'] = args.origem
+    return opcoes
+
+
+def _imprimir_outliers(df_estatisticas):
+    for indicador, linha in df_estatisticas.iterrows():
+        print(f'\n{indicador}')
+        print(45 * '-')
+        print('Outliers inferiores:', ', '.join(linha['municipios_outliers_inferiores']) or 'nenhum')
+        print('Outliers superiores:', ', '.join(linha['municipios_outliers_superiores']) or 'nenhum')
+
+
+def _analisar_hierarquia(args, opcoes):
+    import pandas as pd
+
+    from aula19.niveis import analisar_niveis
+
+    df_limites, df_outliers = analisar_niveis(args.indicador, args.metodo, args.fator_iqr,
+                                              **opcoes)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        for analise, df in df_outliers.groupby('analise', sort=False):
+            print(f'\n{analise}')
+            print(45 * '-')
+            print(df.drop(columns='analise').to_string(index=False))
+    if args.saida:
+        df_limites.to_csv(args.saida, sep=';')
+        print(f'\nLimites de cada grupo gravados em {args.saida}')
+    if args.graficos:
+        print('\nGráficos disponíveis apenas para o histórico por município', file=sys.stderr)
+        return 1
+    return 0
+
+
+def comando_analisar(args):
+    import pandas as pd
+
+    opcoes = _opcoes_dados(args)
+    if args.nivel == 'hierarquia':
+        return _analisar_hierarquia(args, opcoes)
+
+    df_agregado = None
+    if args.nivel == 'registro':
+        from aula19.aproximado import relatorio_registros
+
+        modo = 'aproximado' if args.aproximado else 'exato'
+        df_estatisticas = relatorio_registros(args.indicador, modo, args.metodo,
+                                              args.fator_iqr, args.k, **opcoes)
+    elif args.janela:
+        from aula19.cubo import montar_cubo, relatorio_janelas
+
+        cubo = montar_cubo(args.indicador, **opcoes)
+        df_estatisticas = relatorio_janelas(cubo, args.janela, args.indicador,
+                                            args.metodo, args.fator_iqr, outliers=True)
+    elif args.sem_cache or args.populacao:
+        from aula19.analise import agregar_por_municipio, estatisticas, indicadores_disponiveis
+        from aula19.dados import carregar_ocorrencias
+        from aula19.municipios import ler_populacao
+
+        populacao = ler_populacao(args.populacao) if args.populacao else None
+        if args.indicador:
+            colunas = ['munic', *args.indicador]
+            if populacao is not None and 'ibge' in populacao:
+                colunas.append('mcirc')
+            df_ocorrencias = carregar_ocorrencias(colunas, **opcoes)
+            indicadores = args.indicador
+        else:
+            df_ocorrencias = carregar_ocorrencias(**opcoes)
+            indicadores = indicadores_disponiveis(df_ocorrencias.columns)
+        df_agregado = agregar_por_municipio(df_ocorrencias, indicadores, populacao)
+        df_estatisticas = estatisticas(df_agregado, args.metodo, args.fator_iqr, outliers=True)
+    else:
+        from aula19.memo import resultados
+
+        df_agregado, df_estatisticas = resultados(args.indicador, args.metodo,
+                                                  args.fator_iqr, **opcoes)
+
+    nomes = ['municipios_outliers_inferiores', 'municipios_outliers_superiores']
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None,
+                           'display.width', 200):
+        print(df_estatisticas.drop(columns=nomes, errors='ignore').T)
+    if nomes[0] in df_estatisticas:
+        _imprimir_outliers(df_estatisticas)
+
+    if args.graficos:
+        if df_agregado is None:
+            print('\nGráficos disponíveis apenas para o histórico por município',
+                  file=sys.stderr)
+            return 1
+        # Único ponto que importa o matplotlib
+        from aula19.graficos import renderizar_lote
+
+        caminhos = renderizar_lote(df_agregado, args.graficos, args.formato or ['png'],
+                                   trabalhadores=args.trabalhadores,
+                                   df_estatisticas=df_estatisticas)
+        print(f'\n{len(caminhos)} arquivos gravados em {args.graficos}')
+    return 0
+
+
+def comando_lote(args):
+    from aula19.cubo import montar_cubo
+    from aula19.lote import gerar_relatorios
+
+    cubo = montar_cubo(args.indicador, **_opcoes_dados(args))
+    df_relatorio = gerar_relatorios(cubo, args.indicador, args.janelas, args.metodo,
+                                    args.fator_iqr, args.trabalhadores)
+    if args.saida:
+        df_relatorio.to_csv(args.saida, sep=';')
+        print(f'{len(df_relatorio)} linhas gravadas em {args.saida}')
+    else:
+        print(df_relatorio)
+    return 0
+
+
+def comando_pipeline(args):
+    from aula19.pipeline import executar, gravar_metricas
+
+    opcoes = {'origem': args.origem} if args.origem else {}
+    try:
+        df_estatisticas, metricas = executar(args.indicador, metodo=args.metodo,
+                                             fator_iqr=args.fator_iqr, graficos=args.graficos,
+                                             formatos=args.formato or ['png'],
+                                             tentativas=args.tentativas, espera=args.espera,
+                                             **opcoes)
+    except Exception as erro:
+        gravar_metricas(getattr(erro, 'metricas', []), args.metricas)
+        print(f'Erro: {type(erro).__name__}: {erro}', file=sys.stderr)
+        return 1
+
+    gravar_metricas(metricas, args.metricas)
+    if args.imprimir:
+        print(df_estatisticas.T)
+    return 0
+
+
+def comando_servidor(args):
+    from aula19.servidor import executar
+
+    executar(args.host, args.porta, args.trabalhadores, **_opcoes_dados(args))
+    return 0
+
+
+def tempos_importacao(saida_importtime):
+    """Soma o tempo de importação (-X importtime) por pacote de primeiro nível.
+
+    Retorna uma lista (pacote, microssegundos) do mais lento para o mais
+    rápido. Usa o tempo "self" de cada módulo, para não contar duas vezes
+    os submódulos.
+    """
+    por_pacote = {}
+    for linha in saida_importtime.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, _, nome = linha[len('import time:'):].split('|')
+        pacote = nome.strip().split('.')[0]
+        por_pacote[pacote] = por_pacote.get(pacote, 0) + int(proprio)
+    return sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)
+
+
+def comando_importtime(args):
+    import subprocess
+
+    comando = [sys.executable, '-X', 'importtime', '-m', 'aula19', *args.resto]
+    inicio = time.perf_counter()
+    processo = subprocess.run(comando, capture_output=True, text=True)
+    total = time.perf_counter() - inicio
+
+    if processo.returncode != 0:
+        erros = [linha for linha in processo.stderr.splitlines()
+                 if not linha.startswith('import time:')]
+        print('\n'.join(erros), file=sys.stderr)
+
+    tempos = tempos_importacao(processo.stderr)
+    soma = sum(us for _, us in tempos)
+    print(f'Comando: python -m aula19 {" ".join(args.resto)}')
+    print(f'Tempo total do processo: {total * 1000:.0f} ms')
+    print(f'Tempo total de importações: {soma / 1000:.0f} ms')
+    print(45 * '-')
+    for pacote, us in tempos[:args.top]:
+        print(f'{pacote:<30} {us / 1000:>8.1f} ms')
+    return processo.returncode
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='python -m aula19',
+                                     description='Análises dos dados do ISP')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    analisar = comandos.add_parser('analisar', help='estatísticas e outliers por município')
+    analisar.add_argument('--indicador', action='append',
+                          help='indicador a analisar (pode repetir; padrão: todos)')
+    analisar.add_argument('--janela', choices=TIPOS_JANELA,
+                          help='relatório por período em vez do histórico inteiro')
+    analisar.add_argument('--nivel', choices=['municipio', 'registro', 'hierarquia'],
+                          default='municipio',
+                          help='totais por município (padrão), cada registro CISP x mês ou '
+                               'CISPs por município e municípios por região e no estado')
+    analisar.add_argument('--saida', metavar='ARQUIVO',
+                          help='com --nivel hierarquia, grava os limites de cada grupo (CSV)')
+    analisar.add_argument('--aproximado', action='store_true',
+                          help='com --nivel registro, estima os quartis em fluxo (sketch KLL)')
+    analisar.add_argument('--k', type=int, default=200,
+                          help='tamanho do sketch KLL (erro de posto ~1.65/k)')
+    analisar.add_argument('--sem-cache', action='store_true',
+                          help='recalcula em vez de usar o cache de resultados')
+    analisar.add_argument('--populacao', metavar='ARQUIVO',
+                          help='CSV (;) com populacao e munic ou ibge: analisa a taxa '
+                               'por 100 mil habitantes')
+    analisar.add_argument('--graficos', metavar='PASTA',
+                          help='grava os gráficos nesta pasta (sem isso, não há gráficos)')
+    analisar.add_argument('--formato', action='append', choices=['png', 'svg'],
+                          help='formato dos gráficos (pode repetir; padrão: png)')
+    analisar.add_argument('--trabalhadores', type=int, default=1,
+                          help='processos para gerar os gráficos')
+    _argumentos_dados(analisar)
+    analisar.set_defaults(funcao=comando_analisar)
+
+    lote = comandos.add_parser('lote', help='relatórios de todos os indicadores e períodos')
+    lote.add_argument('--indicador', action='append', help='padrão: todos')
+    lote.add_argument('--janelas', nargs='+', choices=TIPOS_JANELA, default=list(TIPOS_JANELA))
+    lote.add_argument('--trabalhadores', type=int, default=None, help='padrão: número de CPUs')
+    lote.add_argument('--saida', help='arquivo CSV de saída')
+    _argumentos_dados(lote)
+    lote.set_defaults(funcao=comando_lote)
+
+    pipeline = comandos.add_parser('pipeline',
+                                   help='fluxo completo com métricas por etapa (JSON)')
+    pipeline.add_argument('--indicador', action='append', help='padrão: todos')
+    pipeline.add_argument('--origem', help='URL ou caminho do CSV (padrão: site do ISP)')
+    pipeline.add_argument('--metodo', default='weibull', choices=METODOS)
+    pipeline.add_argument('--fator-iqr', type=float, default=FATOR_IQR)
+    pipeline.add_argument('--graficos', metavar='PASTA', help='também gera os gráficos')
+    pipeline.add_argument('--formato', action='append', choices=['png', 'svg'])
+    pipeline.add_argument('--tentativas', type=int, default=3,
+                          help='tentativas de download antes de usar o cache local')
+    pipeline.add_argument('--espera', type=float, default=1.0,
+                          help='espera (s) antes da 2ª tentativa; dobra a cada nova tentativa')
+    pipeline.add_argument('--metricas', metavar='ARQUIVO',
+                          help='acrescenta as métricas (JSON por linha) neste arquivo; padrão: stdout')
+    pipeline.add_argument('--imprimir', action='store_true', help='imprime as estatísticas')
+    pipeline.set_defaults(funcao=comando_pipeline)
+
+    servidor = comandos.add_parser('servidor',
+                                   help='servidor HTTP com estatísticas, outliers e gráficos')
+    servidor.add_argument('--host', default='127.0.0.1')
+    servidor.add_argument('--porta', type=int, default=8000)
+    servidor.add_argument('--trabalhadores', type=int, default=None,
+                          help='processos para os gráficos (padrão: número de CPUs)')
+    servidor.add_argument('--origem', help='URL ou caminho do CSV (padrão: site do ISP)')
+    servidor.add_argument('--offline', action='store_true',
+                          help='usa o cache local sem consultar a origem')
+    servidor.set_defaults(funcao=comando_servidor)
+
+    importtime = comandos.add_parser('importtime',
+                                     help='mede o tempo de importação de outro comando')
+    importtime.add_argument('--top', type=int, default=15)
+    importtime.add_argument('resto', nargs=argparse.REMAINDER,
+                            help='comando a medir, por exemplo: analisar --indicador roubo_veiculo')
+    importtime.set_defaults(funcao=comando_importtime)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    return args.funcao(args)
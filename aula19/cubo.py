@@ -0,0 +1,239 @@
+# Cubo de totais por município e período (ano, mes)
+#
+# As análises somam todo o histórico em um total por município. Para fazer
+# o mesmo relatório por ano, por trimestre ou em janelas móveis de 12
+# meses, seria preciso filtrar e agrupar os dados brutos para cada janela.
+#
+# Aqui os dados são agrupados UMA vez num cubo:
+#   valores[t, m, k] = total do indicador k no município m no mês t
+# e guardamos as somas acumuladas ao longo do tempo:
+#   acumulado[t, m, k] = soma de valores[0:t, m, k]
+# Assim o total de qualquer janela [inicio, fim) é só uma subtração,
+#   acumulado[fim] - acumulado[inicio],
+# sem depender do tamanho da janela nem do tamanho dos dados brutos.
+#
+# Uso:
+#   from aula19.cubo import montar_cubo, relatorio_janelas
+#   cubo = montar_cubo(['roubo_veiculo', 'estelionato'])
+#   df_relatorio = relatorio_janelas(cubo, 'ano')        # um ano por janela
+#   df_relatorio = relatorio_janelas(cubo, 'trimestre')
+#   df_relatorio = relatorio_janelas(cubo, 'movel12')    # 12 meses móveis
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from aula19.analise import estatisticas, indicadores_disponiveis
+from aula19.dados import carregar_ocorrencias
+from aula19.estatistica import FATOR_IQR, ranquear, resumir
+
+
+TIPOS_JANELA = ('ano', 'trimestre', 'movel12')
+
+NOME_ACUMULADO = 'acumulado.npy'
+NOME_CUBO = 'cubo.json'
+
+
+def periodo(ano, mes):
+    """Número sequencial do mês (ano * 12 + mes - 1), escalar ou array.
+
+    É a definição de tempo usada em todo o pacote: uma janela
+    ((ano, mes), (ano, mes)) contém os meses com periodo entre os dois
+    extremos, inclusive (ver totais()).
+    """
+    return np.asarray(ano, dtype=np.int64) * 12 + np.asarray(mes, dtype=np.int64) - 1
+
+
+def _rotulo_mes(periodo):
+    ano, mes = divmod(int(periodo), 12)
+    return f'{ano}m{mes + 1:02d}'
+
+
+def cubo_de_dataframe(df_ocorrencias, indicadores):
+    """Monta o cubo a partir de um DataFrame com munic, ano, mes e indicadores.
+
+    Retorna um dicionário com:
+      municipios: nomes dos municípios (eixo m);
+      indicadores: nomes dos indicadores (eixo k);
+      inicio: número do primeiro mês (ano * 12 + mes - 1) (eixo t);
+      valores: array (meses, municípios, indicadores);
+      acumulado: array (meses + 1, municípios, indicadores).
+    """
+    munic = pd.Categorical(df_ocorrencias['munic'])
+    codigos = munic.codes.astype(np.int64)
+    ano = df_ocorrencias['ano'].to_numpy(dtype=np.float64, na_value=np.nan)
+    mes = df_ocorrencias['mes'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # Linhas sem município (código -1) ou sem ano/mes não pertencem a
+    # nenhuma célula; no bincount, um -1 cairia no município anterior
+    validas = (codigos >= 0) & ~np.isnan(ano) & ~np.isnan(mes)
+    if not validas.any():
+        raise ValueError('Nenhuma linha com município, ano e mês')
+    codigos = codigos[validas]
+    periodos = periodo(ano[validas], mes[validas])
+    inicio = int(periodos.min())
+    meses = int(periodos.max()) - inicio + 1
+    quantidade = len(munic.categories)
+
+    # Cada linha cai na célula (t, m); bincount soma todas as linhas de uma
+    # célula de uma vez, sem laço em Python sobre as linhas.
+    celula = (periodos - inicio) * quantidade + codigos
+    valores = np.empty((meses, quantidade, len(indicadores)))
+    for k, indicador in enumerate(indicadores):
+        pesos = df_ocorrencias[indicador].to_numpy(dtype=np.float64, na_value=np.nan)
+        pesos = np.nan_to_num(pesos[validas])
+        valores[:, :, k] = np.bincount(celula, pesos, minlength=meses * quantidade).reshape(meses, quantidade)
+
+    acumulado = np.zeros((meses + 1, quantidade, len(indicadores)))
+    np.cumsum(valores, axis=0, out=acumulado[1:])
+
+    return {
+        'municipios': pd.Index([str(c) for c in munic.categories], name='munic'),
+        'indicadores': list(indicadores),
+        'inicio': inicio,
+        'valores': valores,
+        'acumulado': acumulado,
+    }
+
+
+def montar_cubo(indicadores=None, **kwargs):
+    """Carrega os dados do cache e monta o cubo.
+
+    indicadores: lista de colunas (None = todos).
+    Os demais argumentos nomeados vão para carregar_ocorrencias().
+    """
+    if indicadores is None:
+        df_ocorrencias = carregar_ocorrencias(**kwargs)
+        indicadores = indicadores_disponiveis(df_ocorrencias.columns)
+    else:
+        df_ocorrencias = carregar_ocorrencias(['munic', 'ano', 'mes', *indicadores], **kwargs)
+    return cubo_de_dataframe(df_ocorrencias, indicadores)
+
+
+def gravar_cubo(cubo, pasta):
+    """Grava o acumulado do cubo em disco (.npy + json).
+
+    O arquivo pode depois ser aberto com memória mapeada por vários
+    processos ao mesmo tempo (abrir_cubo), sem copiar os dados para cada um.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    np.save(os.path.join(pasta, NOME_ACUMULADO), cubo['acumulado'])
+    with open(os.path.join(pasta, NOME_CUBO), 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'municipios': list(cubo['municipios']),
+            'indicadores': cubo['indicadores'],
+            'inicio': cubo['inicio'],
+        }, arquivo, ensure_ascii=False)
+
+
+def abrir_cubo(pasta):
+    """Abre um cubo gravado com gravar_cubo, com o acumulado mapeado em memória.
+
+    O cubo aberto não tem 'valores' (só o acumulado), o que basta para
+    totais(), janelas() e os relatórios.
+    """
+    with open(os.path.join(pasta, NOME_CUBO), encoding='utf-8') as arquivo:
+        info = json.load(arquivo)
+    return {
+        'municipios': pd.Index(info['municipios'], name='munic'),
+        'indicadores': info['indicadores'],
+        'inicio': info['inicio'],
+        'acumulado': np.load(os.path.join(pasta, NOME_ACUMULADO), mmap_mode='r'),
+    }
+
+
+def _meses(cubo):
+    return len(cubo['acumulado']) - 1
+
+
+def totais(cubo, inicio, fim):
+    """Totais (municípios x indicadores) entre os meses inicio e fim.
+
+    inicio e fim são tuplas (ano, mes), ambas incluídas na janela.
+    """
+    t_inicio = int(periodo(*inicio)) - cubo['inicio']
+    t_fim = int(periodo(*fim)) - cubo['inicio'] + 1
+    meses = _meses(cubo)
+    t_inicio, t_fim = max(t_inicio, 0), min(t_fim, meses)
+    if t_inicio >= t_fim:
+        raise ValueError(f'Janela {inicio} a {fim} fora dos dados')
+    acumulado = cubo['acumulado']
+    return pd.DataFrame(acumulado[t_fim] - acumulado[t_inicio],
+                        index=cubo['municipios'], columns=cubo['indicadores'])
+
+
+def janelas(cubo, tipo='ano'):
+    """Lista as janelas (rotulo, t_inicio, t_fim) de um tipo.
+
+    t_inicio e t_fim são posições no eixo de tempo do cubo, com t_fim
+    exclusivo. Anos e trimestres incompletos nas pontas são mantidos, e as
+    janelas móveis de 12 meses começam quando há 12 meses de dados.
+    """
+    inicio = cubo['inicio']
+    fim = inicio + _meses(cubo)
+
+    if tipo == 'movel12':
+        return [(_rotulo_mes(periodo - 1), periodo - 12 - inicio, periodo - inicio)
+                for periodo in range(inicio + 12, fim + 1)]
+
+    if tipo == 'ano':
+        tamanho = 12
+    elif tipo == 'trimestre':
+        tamanho = 3
+    else:
+        raise ValueError(f'Tipo de janela desconhecido: {tipo} (use {", ".join(TIPOS_JANELA)})')
+
+    lista = []
+    for periodo in range(inicio - inicio % tamanho, fim, tamanho):
+        ano, mes = divmod(periodo, 12)
+        rotulo = str(ano) if tipo == 'ano' else f'{ano}t{mes // 3 + 1}'
+        lista.append((rotulo, max(periodo, inicio) - inicio, min(periodo + tamanho, fim) - inicio))
+    return lista
+
+
+def relatorio(cubo, lista, indicadores=None, metodo='weibull', fator_iqr=FATOR_IQR,
+              outliers=False):
+    """Medidas descritivas e limites de outliers para as janelas da lista.
+
+    lista: janelas no formato de janelas(): (rotulo, t_inicio, t_fim).
+    outliers: se True, inclui os nomes dos municípios outliers.
+
+    Os totais de todas as janelas saem do acumulado de uma vez, e as
+    estatísticas de todas as janelas e indicadores são calculadas numa
+    única chamada (cada par janela/indicador é uma coluna).
+
+    Retorna um DataFrame com índice (janela, indicador).
+    """
+    indicadores = indicadores or cubo['indicadores']
+    colunas = [cubo['indicadores'].index(i) for i in indicadores]
+
+    t_inicio = np.array([j[1] for j in lista])
+    t_fim = np.array([j[2] for j in lista])
+    acumulado = cubo['acumulado'][:, :, colunas]
+    # (janelas, municípios, indicadores) -> (municípios, janelas * indicadores)
+    por_janela = acumulado[t_fim] - acumulado[t_inicio]
+    largura = por_janela.transpose(1, 0, 2).reshape(len(cubo['municipios']), -1)
+
+    df_estatisticas = estatisticas(pd.DataFrame(largura, index=cubo['municipios']),
+                                   metodo, fator_iqr, outliers)
+    df_estatisticas.index = pd.MultiIndex.from_product(
+        [[j[0] for j in lista], indicadores], names=['janela', 'indicador'])
+    return df_estatisticas
+
+
+def relatorio_janelas(cubo, tipo='ano', indicadores=None, metodo='weibull',
+                      fator_iqr=FATOR_IQR, outliers=False):
+    """relatorio() para todas as janelas de um tipo ('ano', 'trimestre' ou 'movel12')."""
+    return relatorio(cubo, janelas(cubo, tipo), indicadores, metodo, fator_iqr, outliers)
+
+
+def outliers_janela(cubo, indicador, inicio, fim, metodo='weibull', fator_iqr=FATOR_IQR):
+    """Municípios outliers de um indicador numa janela.
+
+    Retorna (df_inferiores, df_superiores), ranqueados como no exemplo1.py.
+    """
+    serie = totais(cubo, inicio, fim)[indicador]
+    resumo = resumir(serie.to_numpy(), metodo, fator_iqr)
+    inferiores, superiores = ranquear(resumo, 'outliers')
+    return serie.iloc[inferiores].reset_index(), serie.iloc[superiores].reset_index()
@@ -0,0 +1,727 @@
+# Módulo de acesso aos dados do ISP (Instituto de Segurança Pública)
+#
+# Antes, cada script fazia pd.read_csv() direto na URL do ISP a cada
+# execução: baixava o arquivo inteiro, decodificava o texto latin-1 e
+# jogava fora quase todas as colunas. Aqui o arquivo é baixado UMA vez,
+# convertido para um formato colunar (um arquivo .npy por coluna, que pode
+# ser aberto com memória mapeada) e só é baixado/convertido de novo quando
+# o servidor avisar que mudou (ETag / Last-Modified) ou quando o conteúdo
+# (hash sha256) for diferente.
+# Quando o CSV novo é o antigo mais linhas no final (o caso comum: um
+# mês a mais), só as linhas novas são interpretadas e acrescentadas às
+# colunas (acrescentar_colunas).
+#
+# Estrutura do cache (por padrão em ~/.cache/aula19, ou na variável de
+# ambiente AULA19_CACHE):
+#   BaseDPEvolucaoMensalCisp.csv  -> cópia do CSV original
+#   origem.json                   -> url, etag, last_modified e sha256
+#   colunas/meta.json             -> tipos de cada coluna e categorias
+#   colunas/<coluna>.npy          -> dados de cada coluna
+#   trava                         -> trava entre processos (ver travar_cache)
+#
+# Uso:
+#   from aula19.dados import carregar_ocorrencias
+#   df_ocorrencias = carregar_ocorrencias(['munic', 'roubo_veiculo'])
+#
+#   # Em blocos, para manter a memória limitada:
+#   for bloco in carregar_ocorrencias(['munic', 'roubo_veiculo'], chunksize=100_000):
+#       ...
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+ENDERECO_DADOS = "https://www.ispdados.rj.gov.br/Arquivos/BaseDPEvolucaoMensalCisp.csv"
+
+# Separador e codificação do CSV do ISP
+SEPARADOR = ';'
+CODIFICACAO = 'iso-8859-1'
+
+NOME_CSV = 'BaseDPEvolucaoMensalCisp.csv'
+NOME_ORIGEM = 'origem.json'
+PASTA_COLUNAS = 'colunas'
+NOME_META = 'meta.json'
+NOME_TRAVA = 'trava'
+
+TAMANHO_BLOCO = 1024 * 1024
+
+# Linhas por bloco na conversão do CSV para colunas
+LINHAS_CONVERSAO = 100_000
+
+# Tempo máximo (segundos) sem resposta do servidor ao baixar o CSV
+TEMPO_LIMITE = 60
+
+# Colunas de texto do CSV do ISP. Viram 'category' (cada nome de município
+# é guardado uma única vez e as linhas guardam apenas um código inteiro).
+COLUNAS_TEXTO = ('mes_ano', 'munic', 'regiao')
+
+# Colunas sem as quais as análises não funcionam. Um cabeçalho sem elas
+# indica que a origem devolveu outra coisa (uma página de erro em HTML,
+# por exemplo).
+COLUNAS_OBRIGATORIAS = ('munic', 'ano', 'mes')
+
+# Demais colunas são contagens. 'Int32' é inteiro de 4 bytes que aceita
+# valores vazios (o padrão do pandas seria float64 de 8 bytes).
+TIPO_CONTAGEM = 'Int32'
+LIMITES_CONTAGEM = (-2 ** 31, 2 ** 31 - 1)
+
+
+def diretorio_cache():
+    """Retorna a pasta do cache local (AULA19_CACHE ou ~/.cache/aula19)."""
+    padrao = os.path.join(os.path.expanduser('~'), '.cache', 'aula19')
+    return os.environ.get('AULA19_CACHE', padrao)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_json(caminho, conteudo):
+    # Grava num arquivo temporário e troca no final, para que uma execução
+    # interrompida não deixe um json pela metade. O nome do temporário é
+    # único: dois processos gravando ao mesmo tempo não se atrapalham.
+    pasta, nome = os.path.split(os.fspath(caminho))
+    temporario = tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=pasta or '.',
+                                             prefix=nome + '.', suffix='.tmp', delete=False)
+    try:
+        with temporario:
+            json.dump(conteudo, temporario, ensure_ascii=False, indent=2)
+        os.replace(temporario.name, caminho)
+    except BaseException:
+        os.remove(temporario.name)
+        raise
+
+
+@contextlib.contextmanager
+def travar_cache(pasta=None):
+    """Trava exclusiva do cache, entre processos.
+
+    Só um processo por vez baixa e converte; os outros esperam e, ao
+    entrar, encontram o cache já em dia (304 ou mesmo sha256) e reutilizam
+    a conversão. A trava é um arquivo na pasta do cache (fcntl.flock, ou
+    msvcrt.locking no Windows) e é liberada pelo sistema se o processo
+    morrer. Não é reentrante: quem já tem a trava não deve pedi-la de novo.
+    """
+    pasta = pasta or diretorio_cache()
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, NOME_TRAVA), 'a+b') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+        else:
+            # LK_LOCK desiste depois de 10 tentativas (uma por segundo)
+            arquivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _hash_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def _eh_url(origem):
+    return origem.startswith(('http://', 'https://', 'file://'))
+
+
+def baixar_csv(origem=ENDERECO_DADOS, pasta=None, tempo_limite=TEMPO_LIMITE):
+    """Baixa o CSV para um arquivo temporário do cache somente se ele mudou.
+
+    A origem pode ser uma URL (http, https ou file) ou um caminho local.
+    Para URLs http, envia If-None-Match / If-Modified-Since com os valores
+    da última cópia; se o servidor responder 304, nada é baixado. Uma
+    resposta com menos bytes que o Content-Length anunciado (conexão
+    interrompida) lança urllib.error.ContentTooShortError.
+
+    Nada no cache é alterado aqui: quem chama (atualizar_cache) só troca o
+    CSV e o origem.json depois de converter o arquivo novo com sucesso.
+
+    Retorna (info, temporario): info é o novo conteúdo de origem.json (url,
+    etag, last_modified, sha256) e temporario o caminho do arquivo baixado,
+    ou None se a cópia local continua válida (304 ou mesmo sha256).
+    """
+    pasta = pasta or diretorio_cache()
+    os.makedirs(pasta, exist_ok=True)
+    caminho_csv = os.path.join(pasta, NOME_CSV)
+
+    anterior = _ler_json(os.path.join(pasta, NOME_ORIGEM))
+    if anterior.get('url') != origem or not os.path.exists(caminho_csv):
+        anterior = {}
+
+    # urllib.request é importado aqui porque demora (~70 ms) e só é
+    # necessário quando a origem é consultada.
+    import urllib.error
+    import urllib.request
+
+    temporario = tempfile.NamedTemporaryFile(dir=pasta, suffix='.csv', delete=False)
+    try:
+        with temporario:
+            if _eh_url(origem):
+                requisicao = urllib.request.Request(origem)
+                if anterior.get('etag'):
+                    requisicao.add_header('If-None-Match', anterior['etag'])
+                if anterior.get('last_modified'):
+                    requisicao.add_header('If-Modified-Since', anterior['last_modified'])
+                try:
+                    with urllib.request.urlopen(requisicao, timeout=tempo_limite) as resposta:
+                        shutil.copyfileobj(resposta, temporario, TAMANHO_BLOCO)
+                        etag = resposta.headers.get('ETag')
+                        last_modified = resposta.headers.get('Last-Modified')
+                        esperado = resposta.headers.get('Content-Length')
+                except urllib.error.HTTPError as erro:
+                    # 304 Not Modified: a cópia local continua válida
+                    if erro.code == 304 and anterior:
+                        temporario.close()
+                        os.remove(temporario.name)
+                        return anterior, None
+                    raise
+                # copyfileobj para sem erro quando a conexão cai no meio
+                recebido = temporario.tell()
+                if esperado is not None and esperado.isdigit() and recebido != int(esperado):
+                    raise urllib.error.ContentTooShortError(
+                        f'Download incompleto: {recebido} de {esperado} bytes', None)
+            else:
+                with open(origem, 'rb') as arquivo:
+                    shutil.copyfileobj(arquivo, temporario, TAMANHO_BLOCO)
+                etag = None
+                last_modified = None
+
+        sha256 = _hash_arquivo(temporario.name)
+    except BaseException:
+        os.remove(temporario.name)
+        raise
+
+    info = {
+        'url': origem,
+        'etag': etag,
+        'last_modified': last_modified,
+        'sha256': sha256,
+    }
+    if sha256 == anterior.get('sha256'):
+        # Mesmo conteúdo: só os cabeçalhos guardados mudam
+        os.remove(temporario.name)
+        return info, None
+    return info, temporario.name
+
+
+def tipos_colunas(colunas):
+    """Dicionário coluna -> dtype usado na leitura do CSV."""
+    return {nome: 'category' if nome in COLUNAS_TEXTO else TIPO_CONTAGEM
+            for nome in colunas}
+
+
+def ler_csv_ocorrencias(caminho_csv, colunas=None, chunksize=None, tipos=None, inicio=0):
+    """Lê o CSV do ISP interpretando somente as colunas pedidas.
+
+    Diferente de ler tudo e depois fazer df[['munic', 'roubo_veiculo']],
+    aqui o parser do pandas descarta as outras colunas durante a leitura
+    (usecols) e já cria cada coluna com o tipo certo (dtype), sem passar
+    por object/float64.
+
+    colunas: lista de colunas (None = todas).
+    chunksize: se informado, devolve um iterador de DataFrames com esse
+               número de linhas, para processar arquivos maiores que a
+               memória.
+    tipos: dicionário para sobrescrever o dtype de alguma coluna.
+    inicio: posição (em bytes) de um começo de linha a partir da qual ler;
+            o cabeçalho continua vindo da primeira linha do arquivo. Serve
+            para ler só as linhas acrescentadas no final.
+
+    Uma coluna de contagem que não pode virar Int32 não interrompe a
+    leitura: ela fica com outro tipo (ver _como_contagem). Com chunksize,
+    essa escolha é feita em cada bloco.
+    """
+    nomes = None
+    if colunas is None or inicio:
+        nomes = list(pd.read_csv(caminho_csv, sep=SEPARADOR,
+                                 encoding=CODIFICACAO, nrows=0).columns)
+        colunas = nomes if colunas is None else colunas
+    dtype = tipos_colunas(colunas)
+    dtype.update(tipos or {})
+
+    # Pedir 'Int32' direto ao parser é várias vezes mais lento (o pandas
+    # converte valor a valor). As contagens são lidas como inteiros com
+    # valores vazios (dtype_backend) e convertidas para Int32 em seguida,
+    # coluna a coluna.
+    contagens = [nome for nome, tipo in dtype.items() if tipo == TIPO_CONTAGEM]
+    outros = {nome: tipo for nome, tipo in dtype.items() if tipo != TIPO_CONTAGEM}
+    opcoes = {'sep': SEPARADOR, 'encoding': CODIFICACAO, 'usecols': colunas,
+              'dtype': outros, 'dtype_backend': 'numpy_nullable'}
+    arquivo = None
+    if inicio:
+        arquivo = open(caminho_csv, 'rb')
+        arquivo.seek(inicio)
+        caminho_csv = arquivo
+        opcoes.update(header=None, names=nomes)
+
+    if chunksize:
+        leitor = pd.read_csv(caminho_csv, chunksize=chunksize, **opcoes)
+        return _converter_blocos(leitor, contagens, arquivo)
+    with arquivo or contextlib.nullcontext():
+        df = pd.read_csv(caminho_csv, **opcoes)
+    return _converter_contagens(df, contagens)
+
+
+def _converter_blocos(leitor, contagens, arquivo=None):
+    with leitor, arquivo or contextlib.nullcontext():
+        for bloco in leitor:
+            yield _converter_contagens(bloco, contagens)
+
+
+def _como_contagem(serie):
+    # Int32 quando todos os valores são inteiros que cabem em 4 bytes. Senão:
+    #   - células que não são números ('-', por exemplo) viram vazias, e a
+    #     coluna fica como texto ('category') se nenhuma célula for número;
+    #   - números com fração ficam Float64 e inteiros grandes Int64, em vez
+    #     de serem truncados pelo astype('Int32').
+    if not pd.api.types.is_numeric_dtype(serie.dtype):
+        numeros = pd.to_numeric(serie, errors='coerce')
+        if numeros.isna().all() and serie.notna().any():
+            return serie.astype('category')
+        serie = numeros
+    if not pd.api.types.is_integer_dtype(serie.dtype):
+        return serie.astype('Float64')
+    minimo, maximo = serie.min(), serie.max()
+    if pd.notna(minimo) and (minimo < LIMITES_CONTAGEM[0] or maximo > LIMITES_CONTAGEM[1]):
+        return serie.astype('Int64')
+    return serie.astype(TIPO_CONTAGEM)
+
+
+def _converter_contagens(df, contagens):
+    for nome in contagens:
+        df[nome] = _como_contagem(df[nome])
+    return df
+
+
+def validar_cabecalho(colunas):
+    """Confere o cabeçalho do CSV antes da conversão.
+
+    Os nomes das colunas viram nomes de arquivo (<coluna>.npy), então só
+    são aceitos nomes no formato de identificador (letras, dígitos e _;
+    colunas repetidas chegam do pandas como 'nome.1' e também são
+    recusadas), e as COLUNAS_OBRIGATORIAS precisam estar presentes.
+    Lança ValueError caso contrário.
+    """
+    invalidas = [nome for nome in colunas if not str(nome).isidentifier()]
+    if invalidas:
+        raise ValueError(f'Cabeçalho inválido no CSV, colunas: {invalidas[:5]}')
+    faltando = [nome for nome in COLUNAS_OBRIGATORIAS if nome not in colunas]
+    if faltando:
+        raise ValueError(f'Cabeçalho inválido no CSV, faltando: {", ".join(faltando)}')
+
+
+def converter_para_colunas(caminho_csv, pasta_colunas, sha256=None):
+    """Converte o CSV do ISP em um arquivo .npy por coluna.
+
+    Colunas de texto (munic, regiao, mes_ano...) são guardadas como códigos
+    inteiros + lista de categorias no meta.json. Colunas numéricas são
+    reduzidas para o menor tipo inteiro possível (ou float32 quando há
+    valores vazios ou números com fração).
+
+    O CSV é lido em blocos de LINHAS_CONVERSAO linhas e cada bloco é
+    gravado em disco antes do próximo, então a memória usada não depende
+    do tamanho do arquivo.
+    """
+    colunas = list(pd.read_csv(caminho_csv, sep=SEPARADOR, encoding=CODIFICACAO,
+                               nrows=0).columns)
+    validar_cabecalho(colunas)
+    return _converter(caminho_csv, colunas, pasta_colunas, sha256)
+
+
+def acrescentar_colunas(caminho_csv, pasta_colunas, inicio, sha256=None):
+    """Acrescenta ao cache colunar as linhas do CSV a partir do byte inicio.
+
+    Para quando o CSV novo é o CSV já convertido mais linhas no final (ver
+    _inicio_acrescimo): só essas linhas são interpretadas. As colunas
+    antigas são copiadas dos .npy (sem passar pelo parser) para uma pasta
+    nova, junto com as linhas novas, e o resultado é o mesmo de converter
+    o CSV inteiro.
+
+    O meta.json novo guarda em 'anteriores' o sha256 e o número de linhas
+    de cada versão que recebeu acréscimos, para que os agregados de
+    incremental.py também somem só as linhas novas.
+
+    Retorna o meta.json novo, ou None quando uma coluna mudaria de tipo
+    (contagem sempre vazia que passou a ter texto); nesse caso converta o
+    CSV inteiro.
+    """
+    anterior = _ler_json(os.path.join(pasta_colunas, NOME_META))
+    return _converter(caminho_csv, list(anterior['colunas']), pasta_colunas, sha256,
+                      anterior, inicio)
+
+
+def _converter(caminho_csv, nomes, pasta_colunas, sha256, anterior=None, inicio=0):
+    # Converte numa pasta temporária (nome único, ao lado da definitiva) e
+    # troca no final, para que quem estiver lendo o cache nunca veja uma
+    # conversão pela metade.
+    pasta_colunas = os.fspath(pasta_colunas)
+    pai, nome_pasta = os.path.split(os.path.abspath(pasta_colunas))
+    os.makedirs(pai, exist_ok=True)
+    temporaria = tempfile.mkdtemp(dir=pai, prefix=nome_pasta + '.', suffix='.tmp')
+    try:
+        meta = _gravar_colunas(caminho_csv, nomes, temporaria, sha256,
+                               anterior, pasta_colunas, inicio)
+        if meta is not None:
+            _trocar_pasta(temporaria, pasta_colunas)
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+    return meta
+
+
+def _trocar_pasta(nova, destino):
+    # A pasta antiga é renomeada para um nome único antes de ser apagada:
+    # destino fica sem pasta só entre os dois os.replace, e quem ainda
+    # tiver arquivos antigos mapeados continua lendo (no Linux/macOS).
+    antiga = None
+    if os.path.exists(destino):
+        antiga = tempfile.mkdtemp(dir=os.path.dirname(nova), suffix='.antiga')
+        os.replace(destino, os.path.join(antiga, 'colunas'))
+    os.replace(nova, destino)
+    if antiga is not None:
+        shutil.rmtree(antiga, ignore_errors=True)
+
+
+def _menor_inteiro(minimo, maximo):
+    for tipo in (np.int8, np.int16, np.int32):
+        limites = np.iinfo(tipo)
+        if limites.min <= minimo and maximo <= limites.max:
+            return np.dtype(tipo)
+    return np.dtype(np.int64)
+
+
+def _nova_coluna(pasta, nome, tipo):
+    # Os valores de cada bloco vão para um arquivo bruto (<coluna>.bin) com
+    # um tipo largo: int32 para os códigos das categorias e float64 para os
+    # números (exato para inteiros até 2**53). O tipo final, o menor
+    # possível, só é conhecido depois do último bloco.
+    caminho = os.path.join(pasta, nome + '.bin')
+    return {
+        'tipo': tipo,
+        'caminho': caminho,
+        'arquivo': open(caminho, 'wb'),
+        'categorias': {},
+        'minimo': np.inf,
+        'maximo': -np.inf,
+        'vazios': False,
+        'fracao': False,
+        'texto': False,
+        'anterior': None,
+    }
+
+
+def _continuar_coluna(coluna, info, valores):
+    # Coluna do cache atual que vai receber linhas novas. As categorias
+    # antigas mantêm os códigos e os limites incluem os do dtype antigo
+    # (float32 continua float32), então o tipo final é o mesmo de uma
+    # conversão do CSV inteiro.
+    coluna['anterior'] = valores
+    if info['tipo'] == 'categoria':
+        coluna['categorias'] = {nome: codigo for codigo, nome in enumerate(info['categorias'])}
+    elif valores.dtype.kind == 'f':
+        coluna['fracao'] = True
+    else:
+        limites = np.iinfo(valores.dtype)
+        coluna['minimo'], coluna['maximo'] = limites.min, limites.max
+
+
+def _acrescentar_codigos(coluna, codigos, categorias):
+    # Os códigos do bloco apontam para as categorias do bloco; aqui viram
+    # códigos da lista da coluna inteira (o vazio, -1, continua -1).
+    mapa = [coluna['categorias'].setdefault(str(c), len(coluna['categorias']))
+            for c in categorias]
+    mapa = np.array(mapa + [-1], dtype=np.int32)
+    mapa[np.asarray(codigos)].tofile(coluna['arquivo'])
+
+
+def _acrescentar_numeros(coluna, valores):
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = valores[~np.isnan(valores)]
+    coluna['vazios'] = coluna['vazios'] or len(validos) < len(valores)
+    if len(validos):
+        coluna['minimo'] = min(coluna['minimo'], validos.min())
+        coluna['maximo'] = max(coluna['maximo'], validos.max())
+        coluna['fracao'] = coluna['fracao'] or bool((validos != np.round(validos)).any())
+    valores.tofile(coluna['arquivo'])
+
+
+def _acrescentar_bloco(coluna, serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        if coluna['tipo'] == 'categoria':
+            _acrescentar_codigos(coluna, serie.cat.codes.to_numpy(), serie.cat.categories)
+            return
+        # Contagem sem nenhum número neste bloco (_como_contagem devolveu
+        # texto): as células ficam vazias, e a coluna só vira texto se
+        # nenhum bloco tiver números (ver _gravar_colunas).
+        coluna['texto'] = coluna['texto'] or bool(serie.notna().any())
+        valores = np.full(len(serie), np.nan)
+    else:
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    _acrescentar_numeros(coluna, valores)
+
+
+def _finalizar_coluna(coluna, pasta, nome, linhas):
+    """Grava <nome>.npy (linhas antigas + arquivo bruto) e devolve a entrada do meta.json."""
+    coluna['arquivo'].close()
+    if coluna['tipo'] == 'categoria':
+        # Categorias em ordem alfabética, como o pandas as cria ao ler o CSV
+        categorias = sorted(coluna['categorias'])
+        mapa = np.full(len(categorias) + 1, -1, dtype=np.int64)
+        mapa[[coluna['categorias'][c] for c in categorias]] = np.arange(len(categorias))
+        dtype = _menor_inteiro(-1, len(categorias) - 1)
+        bruto, converter = np.int32, mapa.__getitem__
+        info = {'tipo': 'categoria', 'dtype': dtype.str, 'categorias': categorias}
+    else:
+        if coluna['vazios'] or coluna['fracao']:
+            dtype = np.dtype(np.float32)
+        elif coluna['minimo'] <= coluna['maximo']:
+            dtype = _menor_inteiro(coluna['minimo'], coluna['maximo'])
+        else:
+            dtype = np.dtype(np.int8)
+        bruto, converter = np.float64, np.asarray
+        info = {'tipo': 'numero', 'dtype': dtype.str}
+
+    destino = os.path.join(pasta, nome + '.npy')
+    anterior = coluna['anterior'] if coluna['anterior'] is not None else np.empty(0, dtype)
+    antigas = len(anterior)
+    if antigas + linhas == 0:
+        np.save(destino, np.empty(0, dtype=dtype))
+    else:
+        saida = np.lib.format.open_memmap(destino, mode='w+', dtype=dtype,
+                                          shape=(antigas + linhas,))
+        for inicio in range(0, antigas, LINHAS_CONVERSAO):
+            fim = min(inicio + LINHAS_CONVERSAO, antigas)
+            saida[inicio:fim] = converter(anterior[inicio:fim])
+        if linhas:
+            entrada = np.memmap(coluna['caminho'], dtype=bruto, mode='r', shape=(linhas,))
+            for inicio in range(0, linhas, LINHAS_CONVERSAO):
+                fim = inicio + LINHAS_CONVERSAO
+                saida[antigas + inicio:antigas + fim] = converter(entrada[inicio:fim])
+            del entrada
+        saida.flush()
+        del saida
+    os.remove(coluna['caminho'])
+    return info
+
+
+def _gravar_colunas(caminho_csv, nomes, pasta, sha256, anterior=None, pasta_anterior=None,
+                    inicio=0):
+    tipos = {}
+    colunas = {}
+    for nome in nomes:
+        tipo = 'categoria' if nome in COLUNAS_TEXTO else 'numero'
+        if anterior is not None:
+            tipo = anterior['colunas'][nome]['tipo']
+            if tipo == 'categoria':
+                tipos[nome] = 'category'
+        colunas[nome] = _nova_coluna(pasta, nome, tipo)
+    try:
+        if anterior is not None:
+            for nome, coluna in colunas.items():
+                valores = np.load(os.path.join(pasta_anterior, nome + '.npy'), mmap_mode='r')
+                _continuar_coluna(coluna, anterior['colunas'][nome], valores)
+
+        linhas = 0
+        for bloco in ler_csv_ocorrencias(caminho_csv, nomes, LINHAS_CONVERSAO, tipos, inicio):
+            for nome in nomes:
+                _acrescentar_bloco(colunas[nome], bloco[nome])
+            linhas += len(bloco)
+
+        # Contagem sem nenhum número em nenhum bloco: é uma coluna de texto,
+        # relida sozinha como 'category' (caso raro; lê só essa coluna)
+        for nome, coluna in colunas.items():
+            if coluna['texto'] and coluna['minimo'] > coluna['maximo']:
+                if anterior is not None:
+                    if np.isnan(coluna['anterior']).all():
+                        return None
+                    continue
+                coluna['arquivo'].close()
+                colunas[nome] = coluna = _nova_coluna(pasta, nome, 'categoria')
+                for bloco in ler_csv_ocorrencias(caminho_csv, [nome], LINHAS_CONVERSAO,
+                                                 {nome: 'category'}):
+                    _acrescentar_bloco(coluna, bloco[nome])
+
+        meta = {
+            'sha256': sha256,
+            'linhas': linhas,
+            'colunas': {nome: _finalizar_coluna(coluna, pasta, nome, linhas)
+                        for nome, coluna in colunas.items()},
+        }
+        if anterior is not None:
+            meta['linhas'] += anterior['linhas']
+            meta['anteriores'] = anterior.get('anteriores', []) + [
+                {'sha256': anterior['sha256'], 'linhas': anterior['linhas']}]
+    finally:
+        for coluna in colunas.values():
+            coluna['arquivo'].close()
+    _gravar_json(os.path.join(pasta, NOME_META), meta)
+    return meta
+
+
+def ler_meta(pasta=None):
+    """Lê o meta.json do cache colunar existente, sem consultar a origem."""
+    pasta_colunas = os.path.join(pasta or diretorio_cache(), PASTA_COLUNAS)
+    meta = _ler_json(os.path.join(pasta_colunas, NOME_META))
+    if not meta:
+        raise FileNotFoundError(f'Cache vazio em {pasta_colunas}')
+    return meta
+
+
+def atualizar_cache(origem=ENDERECO_DADOS, pasta=None, tempo_limite=TEMPO_LIMITE):
+    """Garante que o cache colunar está em dia com a origem.
+
+    Só converte de novo quando o hash do CSV for diferente do hash usado na
+    última conversão. Um arquivo novo só substitui o CSV e o origem.json
+    depois de convertido com sucesso: se o download ou a conversão
+    falharem, o cache anterior continua inteiro. Tudo acontece dentro de
+    travar_cache(): processos simultâneos não convertem o mesmo arquivo
+    duas vezes nem trocam os arquivos uns dos outros. Retorna o meta.json
+    das colunas.
+    """
+    pasta = pasta or diretorio_cache()
+    with travar_cache(pasta):
+        info, temporario = baixar_csv(origem, pasta, tempo_limite)
+        return instalar_csv(info, temporario, pasta)
+
+
+def instalar_csv(info, temporario, pasta=None):
+    """Converte o resultado de baixar_csv() e o coloca no cache.
+
+    Segunda metade de atualizar_cache(), separada para que quem chama
+    possa medir ou tratar o download e a conversão como etapas distintas
+    (ver pipeline.py). Deve ser chamada dentro de travar_cache(), junto
+    com o baixar_csv() correspondente. O arquivo temporário é apagado em
+    qualquer caso. Retorna o meta.json das colunas.
+    """
+    pasta = pasta or diretorio_cache()
+    caminho_csv = os.path.join(pasta, NOME_CSV)
+    pasta_colunas = os.path.join(pasta, PASTA_COLUNAS)
+    try:
+        meta = _ler_json(os.path.join(pasta_colunas, NOME_META))
+        if temporario is not None:
+            inicio = _inicio_acrescimo(caminho_csv, temporario, meta)
+            novo = None
+            if inicio:
+                novo = acrescentar_colunas(temporario, pasta_colunas, inicio, info['sha256'])
+            meta = novo or converter_para_colunas(temporario, pasta_colunas, info['sha256'])
+            os.replace(temporario, caminho_csv)
+        elif meta.get('sha256') != info['sha256']:
+            meta = converter_para_colunas(caminho_csv, pasta_colunas, info['sha256'])
+    finally:
+        if temporario is not None and os.path.exists(temporario):
+            os.remove(temporario)
+
+    _gravar_json(os.path.join(pasta, NOME_ORIGEM), info)
+    return meta
+
+
+def _inicio_acrescimo(caminho_csv, caminho_novo, meta):
+    """Posição das linhas novas, se o CSV novo é o convertido mais linhas no final.
+
+    O arquivo só cresceu quando os primeiros bytes do novo, até o tamanho
+    do CSV atual, têm o sha256 da última conversão (meta). O trecho antigo
+    precisa terminar numa quebra de linha; senão a última linha dele pode
+    ter continuado no arquivo novo. Retorna None caso contrário (um valor
+    revisado, uma linha removida ou reordenada).
+    """
+    if not meta.get('linhas') or not os.path.exists(caminho_csv):
+        return None
+    tamanho = os.path.getsize(caminho_csv)
+    if os.path.getsize(caminho_novo) <= tamanho:
+        return None
+    sha256 = hashlib.sha256()
+    with open(caminho_novo, 'rb') as arquivo:
+        restante = tamanho
+        while restante:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            sha256.update(bloco)
+            restante -= len(bloco)
+    if sha256.hexdigest() != meta['sha256'] or not bloco.endswith(b'\n'):
+        return None
+    return tamanho
+
+
+def _montar_dataframe(meta, arrays, inicio=0, fim=None):
+    fim = meta['linhas'] if fim is None else min(fim, meta['linhas'])
+    dados = {}
+    for nome, valores in arrays.items():
+        info = meta['colunas'][nome]
+        valores = np.asarray(valores[inicio:fim])
+        if info['tipo'] == 'categoria':
+            dados[nome] = pd.Categorical.from_codes(valores,
+                                                    categories=info['categorias'])
+        else:
+            dados[nome] = valores
+    return pd.DataFrame(dados, index=pd.RangeIndex(inicio, fim))
+
+
+def _blocos(meta, arrays, chunksize, inicio=0):
+    for inicio in range(inicio, meta['linhas'], chunksize):
+        yield _montar_dataframe(meta, arrays, inicio, inicio + chunksize)
+
+
+def carregar_ocorrencias(colunas=None, chunksize=None, origem=ENDERECO_DADOS,
+                         pasta=None, atualizar=True, inicio=0):
+    """Carrega as ocorrências do cache colunar como DataFrame.
+
+    colunas: lista de colunas desejadas (None = todas). Só as colunas
+             pedidas são lidas do disco.
+    chunksize: se informado, devolve um iterador de DataFrames com esse
+               número de linhas (os arquivos são lidos com memória mapeada,
+               então só o bloco atual fica na memória).
+    atualizar: se False, usa o cache existente sem consultar a origem.
+    inicio: primeira linha carregada (para ler só as linhas acrescentadas
+            desde uma versão anterior, ver meta['anteriores']).
+
+    Colunas de texto voltam como 'category' e as contagens como o menor
+    tipo inteiro que comporta os valores.
+    """
+    pasta = pasta or diretorio_cache()
+    pasta_colunas = os.path.join(pasta, PASTA_COLUNAS)
+    if atualizar:
+        meta = atualizar_cache(origem, pasta)
+    else:
+        meta = ler_meta(pasta)
+
+    if colunas is None:
+        colunas = list(meta['colunas'])
+
+    arrays = {}
+    for nome in colunas:
+        if nome not in meta['colunas']:
+            raise KeyError(f'Coluna inexistente: {nome}')
+        arrays[nome] = np.load(os.path.join(pasta_colunas, nome + '.npy'),
+                               mmap_mode='r')
+
+    if chunksize:
+        return _blocos(meta, arrays, chunksize, inicio)
+    return _montar_dataframe(meta, arrays, inicio)
@@ -0,0 +1,246 @@
+# Núcleo de quartis e outliers
+#
+# O exemplo1.py chama np.quantile três vezes (uma por quartil), e cada
+# chamada ordena o array de novo. Depois cria quatro máscaras booleanas
+# (< q1, > q3, < limite inferior, > limite superior) e ordena cada
+# resultado com sort_values.
+#
+# Aqui cada coluna é ordenada UMA única vez (argsort). A partir dessa
+# ordenação saem:
+#   - os quartis, por interpolação direta nas posições ordenadas, com o
+#     mesmo resultado de np.quantile para os métodos weibull, linear e hazen;
+#   - mínimo, máximo e mediana (primeira, última e posição do meio);
+#   - IQR e limites inferior/superior;
+#   - os outliers e os menores/maiores já ranqueados, que são apenas o
+#     começo e o fim da ordenação.
+#
+# Funciona com um array 1-D (um indicador) ou 2-D (municípios x
+# indicadores), tratando cada coluna de forma independente.
+#
+# resumir_agrupado() faz o mesmo para vários grupos de uma vez (por
+# exemplo, as CISPs de cada município): cada coluna é ordenada por grupo e
+# valor, e os quartis de todos os grupos saem das posições de início e
+# tamanho de cada grupo na ordenação, sem laço pelos grupos.
+#
+# Uso:
+#   from aula19.estatistica import resumir, ranquear
+#   resumo = resumir(array_roubo_veiculo)
+#   inferiores, superiores = ranquear(resumo, 'outliers')
+import numpy as np
+
+
+FATOR_IQR = 1.5
+
+# alpha e beta de cada método, na mesma definição usada pelo NumPy
+# (Hyndman & Fan). A posição (base 0) do quantil p numa amostra ordenada de
+# tamanho n é: n*p + alpha + p*(1 - alpha - beta) - 1
+METODOS = {
+    'weibull': (0.0, 0.0),
+    'linear': (1.0, 1.0),
+    'hazen': (0.5, 0.5),
+}
+
+
+def _alpha_beta(metodo):
+    if metodo not in METODOS:
+        raise ValueError(f'Método de quantil desconhecido: {metodo} '
+                         f'(use {", ".join(METODOS)})')
+    return METODOS[metodo]
+
+
+def quantis_ordenados(ordenados, probabilidades, metodo='weibull'):
+    """Quantis de um array já ordenado ao longo do eixo 0.
+
+    Retorna um array com uma linha por probabilidade.
+    """
+    alpha, beta = _alpha_beta(metodo)
+    n = ordenados.shape[0]
+    probabilidades = np.asarray(probabilidades, dtype=np.float64)
+
+    posicao = n * probabilidades + alpha + probabilidades * (1 - alpha - beta) - 1
+    posicao = np.clip(posicao, 0, n - 1)
+    abaixo = np.floor(posicao).astype(np.intp)
+    acima = np.minimum(abaixo + 1, n - 1)
+    peso = posicao - abaixo
+    if ordenados.ndim > 1:
+        peso = peso.reshape(-1, *([1] * (ordenados.ndim - 1)))
+
+    inferior = ordenados[abaixo]
+    superior = ordenados[acima]
+    return inferior + (superior - inferior) * peso
+
+
+def resumir(valores, metodo='weibull', fator_iqr=FATOR_IQR):
+    """Ordena uma vez e calcula quartis, limites e contagens de outliers.
+
+    valores: array 1-D ou 2-D (cada coluna é uma variável).
+
+    Retorna um dicionário de arrays (escalares no caso 1-D):
+      ordem, ordenados, minimo, q1, q2, q3, maximo, mediana, iqr,
+      limite_inferior, limite_superior, menores, maiores,
+      outliers_inferiores, outliers_superiores
+    Os quatro últimos são quantidades de valores < q1, > q3,
+    < limite_inferior e > limite_superior.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    if valores.shape[0] == 0:
+        raise ValueError('Não é possível resumir um array vazio')
+
+    ordem = np.argsort(valores, axis=0)
+    ordenados = np.take_along_axis(valores, ordem, axis=0)
+
+    q1, q2, q3 = quantis_ordenados(ordenados, [0.25, 0.50, 0.75], metodo)
+    # A mediana do np.median é sempre a interpolação linear
+    mediana = quantis_ordenados(ordenados, [0.50], 'linear')[0]
+
+    iqr = q3 - q1
+    limite_inferior = q1 - fator_iqr * iqr
+    limite_superior = q3 + fator_iqr * iqr
+
+    return {
+        'ordem': ordem,
+        'ordenados': ordenados,
+        'minimo': ordenados[0],
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'maximo': ordenados[-1],
+        'mediana': mediana,
+        'iqr': iqr,
+        'limite_inferior': limite_inferior,
+        'limite_superior': limite_superior,
+        'menores': (ordenados < q1).sum(axis=0),
+        'maiores': (ordenados > q3).sum(axis=0),
+        'outliers_inferiores': (ordenados < limite_inferior).sum(axis=0),
+        'outliers_superiores': (ordenados > limite_superior).sum(axis=0),
+    }
+
+
+def ranquear(resumo, tipo='outliers', coluna=None):
+    """Índices (posições originais) dos extremos, já ranqueados.
+
+    tipo: 'outliers' (fora dos limites) ou 'quartis' (< q1 e > q3).
+    coluna: qual coluna, quando o resumo for de um array 2-D.
+
+    Retorna (inferiores em ordem crescente, superiores em ordem decrescente).
+    """
+    if tipo == 'outliers':
+        chaves = ('outliers_inferiores', 'outliers_superiores')
+    elif tipo == 'quartis':
+        chaves = ('menores', 'maiores')
+    else:
+        raise ValueError(f"tipo deve ser 'outliers' ou 'quartis', não {tipo!r}")
+
+    ordem = resumo['ordem']
+    quantidade_inferior = resumo[chaves[0]]
+    quantidade_superior = resumo[chaves[1]]
+    if ordem.ndim > 1:
+        if coluna is None:
+            raise ValueError('Informe a coluna para um resumo 2-D')
+        ordem = ordem[:, coluna]
+        quantidade_inferior = quantidade_inferior[coluna]
+        quantidade_superior = quantidade_superior[coluna]
+
+    n = len(ordem)
+    inferiores = ordem[:quantidade_inferior]
+    superiores = ordem[n - quantidade_superior:][::-1]
+    return inferiores, superiores
+
+
+def quantis_agrupados(ordenados, inicio, tamanho, probabilidades, metodo='weibull'):
+    """Quantis de cada grupo de um array ordenado por (grupo, valor).
+
+    ordenados: array (n, k); as linhas de cada grupo são contíguas e
+               ordenadas em cada coluna.
+    inicio, tamanho: posição da primeira linha e número de linhas de cada
+                     grupo (arrays de G elementos).
+
+    Retorna um array (probabilidades, G, k). Grupos vazios ficam com NaN.
+    """
+    alpha, beta = _alpha_beta(metodo)
+    probabilidades = np.asarray(probabilidades, dtype=np.float64)[:, None]
+    ultimo = np.maximum(tamanho - 1, 0)
+
+    # Mesma fórmula de quantis_ordenados, com um n diferente por grupo
+    posicao = tamanho * probabilidades + alpha + probabilidades * (1 - alpha - beta) - 1
+    posicao = np.clip(posicao, 0, ultimo)
+    abaixo = np.floor(posicao).astype(np.intp)
+    acima = np.minimum(abaixo + 1, ultimo)
+    peso = (posicao - abaixo)[..., None]
+
+    maximo = len(ordenados) - 1
+    inferior = ordenados[np.minimum(inicio + abaixo, maximo)]
+    superior = ordenados[np.minimum(inicio + acima, maximo)]
+    quantis = inferior + (superior - inferior) * peso
+    quantis[:, tamanho == 0] = np.nan
+    return quantis
+
+
+def _contar_por_grupo(mascara, grupos, quantidade):
+    # Conta os True de cada (grupo, coluna) com um único bincount
+    colunas = mascara.shape[1]
+    posicoes = (grupos[:, None] * colunas + np.arange(colunas)).ravel()
+    contagens = np.bincount(posicoes, weights=mascara.ravel(), minlength=quantidade * colunas)
+    return contagens.reshape(quantidade, colunas).astype(np.int64)
+
+
+def resumir_agrupado(valores, grupos, quantidade=None, metodo='weibull', fator_iqr=FATOR_IQR):
+    """Quartis, limites e outliers de cada grupo, sem laço pelos grupos.
+
+    valores: array 1-D ou 2-D (n linhas x k colunas).
+    grupos: array com o grupo (0..G-1) de cada linha.
+    quantidade: número de grupos G (padrão: maior grupo + 1).
+
+    Retorna um dicionário com:
+      tamanho (G,);
+      minimo, q1, q2, q3, maximo, mediana, iqr, limite_inferior,
+      limite_superior, outliers_inferiores, outliers_superiores (G, k);
+      inferior, superior: máscaras (n, k) das linhas abaixo do limite
+      inferior / acima do limite superior do próprio grupo.
+    No caso 1-D, os arrays (G, k) e (n, k) perdem o eixo k.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    uma_coluna = valores.ndim == 1
+    if uma_coluna:
+        valores = valores[:, None]
+    grupos = np.asarray(grupos, dtype=np.intp)
+    quantidade = int(grupos.max()) + 1 if quantidade is None else quantidade
+
+    # Ordena cada coluna pelo valor e depois, de forma estável, pelo
+    # grupo: o resultado fica ordenado por (grupo, valor).
+    ordem = np.argsort(valores, axis=0)
+    ordem = np.take_along_axis(ordem, np.argsort(grupos[ordem], axis=0, kind='stable'), axis=0)
+    ordenados = np.take_along_axis(valores, ordem, axis=0)
+
+    tamanho = np.bincount(grupos, minlength=quantidade)
+    inicio = np.cumsum(tamanho) - tamanho
+    q1, q2, q3 = quantis_agrupados(ordenados, inicio, tamanho, [0.25, 0.50, 0.75], metodo)
+    mediana = quantis_agrupados(ordenados, inicio, tamanho, [0.50], 'linear')[0]
+    minimo, maximo = quantis_agrupados(ordenados, inicio, tamanho, [0.0, 1.0], 'linear')
+
+    iqr = q3 - q1
+    limite_inferior = q1 - fator_iqr * iqr
+    limite_superior = q3 + fator_iqr * iqr
+    inferior = valores < limite_inferior[grupos]
+    superior = valores > limite_superior[grupos]
+
+    resumo = {
+        'tamanho': tamanho,
+        'minimo': minimo,
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'maximo': maximo,
+        'mediana': mediana,
+        'iqr': iqr,
+        'limite_inferior': limite_inferior,
+        'limite_superior': limite_superior,
+        'outliers_inferiores': _contar_por_grupo(inferior, grupos, quantidade),
+        'outliers_superiores': _contar_por_grupo(superior, grupos, quantidade),
+        'inferior': inferior,
+        'superior': superior,
+    }
+    if uma_coluna:
+        resumo = {nome: valor if nome == 'tamanho' else valor[..., 0]
+                  for nome, valor in resumo.items()}
+    return resumo
@@ -5,24 +5,23 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 
+# Executar a partir da raiz do projeto: python -m aula19.exemplo1
+from aula19.dados import carregar_ocorrencias
+
 
 try:
     print("Obtendo dados...")
-    ENDERECO_DADOS = "https://www.ispdados.rj.gov.br/Arquivos/BaseDPEvolucaoMensalCisp.csv"
-
-    # Buscar a base de dados CSV online do site ISP (Instituto de Segurança Pública)
-    # encoding='iso-8859-1' - Codificação dos caracteres com acentuação
-    # outras opções: utf-8, iso-8859-1, latin1, cp1252
-    # encodings principais: https://docs.python.org/3/library/codecs.html#standard-encodings
-    df_ocorrencias = pd.read_csv(ENDERECO_DADOS, sep=';', encoding='iso-8859-1')
 
+    # Os dados vêm do cache local (aula19/dados.py): o CSV do ISP
+    # (Instituto de Segurança Pública) só é baixado de novo quando muda no
+    # site, e somente as colunas pedidas são lidas do disco.
     # Demilitando somente as variáveis do Exemplo01: munic e roubo_veiculo
-    df_ocorrencias = df_ocorrencias[['munic', 'roubo_veiculo']]
+    df_ocorrencias = carregar_ocorrencias(['munic', 'roubo_veiculo'])
 
     # Totalizar roubo de veiculo por municipio (agrupar e somar)
     # reset_index(), traz de volta os índices que numera as colunas, pois se
     # perdem nesta operação
-    df_roubo_veiculo = df_ocorrencias.groupby('munic').sum(['roubo_veiculo']).reset_index()
+    df_roubo_veiculo = df_ocorrencias.groupby('munic', observed=True).sum().reset_index()
 
     # Printando as linhas iniciais com o método head() apenas para ver se os dados
     # foram obtidos corretamente
@@ -2,14 +2,13 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-try:
-    ENDEREÇO_DADOS = "https://www.ispdados.rj.gov.br/Arquivos/BaseDPEvolucaoMensalCisp.csv"
-
-    df_ocorrencias = pd.read_csv(ENDEREÇO_DADOS, sep=';', encoding='iso-8859-1')
+# Executar a partir da raiz do projeto: python -m aula19.exercicio1
+from aula19.dados import carregar_ocorrencias
 
-    df_ocorrencias = df_ocorrencias[['munic', 'estelionato']]
+try:
+    df_ocorrencias = carregar_ocorrencias(['munic', 'estelionato'])
 
-    df_estelionato = df_ocorrencias.groupby('munic').sum(['estelionato']).reset_index()
+    df_estelionato = df_ocorrencias.groupby('munic', observed=True).sum().reset_index()
 
     print(df_estelionato.head())
 
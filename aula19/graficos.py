@@ -0,0 +1,182 @@
+# Geração dos gráficos sem janela (para servidores)
+#
+# O exemplo1.py monta a figura 2x2 (boxplot, painel de medidas, outliers
+# inferiores e superiores) com a interface do pyplot e termina com
+# plt.show(), que abre uma janela e bloqueia a execução.
+#
+# Aqui:
+#   - usamos a interface orientada a objetos (matplotlib.figure.Figure),
+#     sem pyplot e sem mexer no backend do processo: os arquivos são
+#     gravados pelo Agg (PNG) ou pelo backend SVG, escolhidos pelo
+#     formato no savefig;
+#   - a figura, os eixos, os títulos e os textos do painel de medidas são
+#     criados UMA vez (o "modelo") e reaproveitados para cada indicador; só
+#     o conteúdo que muda (boxplot, barras e valores) é redesenhado;
+#   - o layout é fixo (subplots_adjust), em vez de recalcular
+#     tight_layout() a cada figura;
+#   - vários indicadores são gerados em lote, opcionalmente em paralelo
+#     (um modelo por processo).
+#
+# Uso:
+#   from aula19.graficos import renderizar_lote
+#   caminhos = renderizar_lote(df_agregado, 'graficos', formatos=('png', 'svg'))
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from aula19.analise import estatisticas
+from aula19.estatistica import FATOR_IQR
+
+FORMATOS = ('png', 'svg')
+
+# Linhas do painel de medidas: (x, y, rótulo, coluna de estatisticas(), formato)
+LINHAS_MEDIDAS = [
+    (0.1, 0.9, 'Limite inferior', 'limite_inferior', '{}'),
+    (0.1, 0.8, 'Menor valor', 'minimo', '{}'),
+    (0.1, 0.7, 'Q1', 'q1', '{}'),
+    (0.1, 0.6, 'Mediana', 'mediana', '{}'),
+    (0.1, 0.5, 'Q3', 'q3', '{}'),
+    (0.1, 0.4, 'Média', 'media', '{:.3f}'),
+    (0.1, 0.3, 'Maior valor', 'maximo', '{}'),
+    (0.1, 0.2, 'Limite superior', 'limite_superior', '{}'),
+    (0.5, 0.9, 'Distância Média e Mediana', 'distancia', '{:.4f}'),
+    (0.5, 0.8, 'IQR', 'iqr', '{}'),
+    (0.5, 0.7, 'Amplitude Total', 'amplitude_total', '{}'),
+]
+
+
+def criar_modelo():
+    """Cria a figura 2x2 com os elementos fixos, pronta para ser reutilizada."""
+    figura = Figure(figsize=(16, 10))
+    eixos = figura.subplots(2, 2)
+    figura.subplots_adjust(left=0.13, right=0.97, bottom=0.06, top=0.92,
+                           wspace=0.35, hspace=0.25)
+
+    painel = eixos[0, 1]
+    painel.set_title('Medidas Estatísticas')
+    textos = [painel.text(x, y, '', fontsize=10) for x, y, *_ in LINHAS_MEDIDAS]
+
+    return {
+        'figura': figura,
+        'titulo': figura.suptitle(''),
+        'boxplot': eixos[0, 0],
+        'textos': textos,
+        'inferiores': eixos[1, 0],
+        'superiores': eixos[1, 1],
+    }
+
+
+def _barras(eixo, titulo, nomes, valores, vazio, rotulo_x, **kwargs):
+    eixo.cla()
+    eixo.set_title(titulo)
+    if len(nomes) == 0:
+        eixo.text(0.5, 0.5, vazio, ha='center', va='center', fontsize=12)
+        eixo.set_xticks([])
+        eixo.set_yticks([])
+        return
+    barras = eixo.barh(nomes, valores, **kwargs)
+    eixo.bar_label(barras, fmt='%.0f', label_type='edge', fontsize=8, padding=2)
+    eixo.tick_params(labelsize=8)
+    eixo.set_xlabel(rotulo_x)
+
+
+def desenhar(modelo, titulo, valores, medidas, rotulo_x=''):
+    """Preenche o modelo com um indicador.
+
+    valores: Series com o total por município (índice = nome).
+    medidas: linha de estatisticas(..., outliers=True) do indicador.
+    """
+    modelo['titulo'].set_text(titulo)
+
+    eixo = modelo['boxplot']
+    eixo.cla()
+    eixo.boxplot(valores.to_numpy(), orientation='horizontal', showmeans=True)
+    eixo.set_title('Boxplot dos Dados')
+
+    for texto, (_, _, rotulo, coluna, formato) in zip(modelo['textos'], LINHAS_MEDIDAS):
+        texto.set_text(f'{rotulo}: {formato.format(medidas[coluna])}')
+
+    # Barras em ordem crescente, como no exemplo1.py (a maior fica no topo)
+    inferiores = list(medidas['municipios_outliers_inferiores'])
+    superiores = list(medidas['municipios_outliers_superiores'])[::-1]
+    _barras(modelo['inferiores'], 'Outliers Inferiores', inferiores,
+            valores.loc[inferiores].to_numpy(), 'Sem Outliers Inferiores', rotulo_x)
+    _barras(modelo['superiores'], 'Outliers Superiores', superiores,
+            valores.loc[superiores].to_numpy(), 'Sem outliers superiores', rotulo_x,
+            color='black')
+
+
+def salvar(modelo, caminho_base, formatos=('png',), dpi=100):
+    """Grava a figura atual em cada formato. Retorna os caminhos gravados."""
+    caminhos = []
+    for formato in formatos:
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato não suportado: {formato} (use {", ".join(FORMATOS)})')
+        caminho = f'{caminho_base}.{formato}'
+        modelo['figura'].savefig(caminho, format=formato, dpi=dpi)
+        caminhos.append(caminho)
+    return caminhos
+
+
+# Modelo de cada processo trabalhador (criado na primeira renderização)
+_modelo = None
+
+
+def _renderizar(tarefa):
+    global _modelo
+    if _modelo is None:
+        _modelo = criar_modelo()
+    indicador, valores, medidas, pasta, formatos, dpi = tarefa
+    desenhar(_modelo, f'Análise de {indicador} no RJ', valores, medidas,
+             f'Total {indicador}')
+    return salvar(_modelo, os.path.join(pasta, indicador), formatos, dpi)
+
+
+def renderizar_bytes(indicador, valores, medidas, formato='png', dpi=100):
+    """Desenha um indicador e devolve o arquivo em memória (bytes), sem gravar em disco.
+
+    Usa o modelo do processo atual; não chamar de várias threads ao mesmo
+    tempo (em servidores, usar um processo por trabalhador).
+    """
+    global _modelo
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato não suportado: {formato} (use {", ".join(FORMATOS)})')
+    if _modelo is None:
+        _modelo = criar_modelo()
+    desenhar(_modelo, f'Análise de {indicador} no RJ', valores, medidas, f'Total {indicador}')
+    arquivo = io.BytesIO()
+    _modelo['figura'].savefig(arquivo, format=formato, dpi=dpi)
+    return arquivo.getvalue()
+
+
+def renderizar_lote(df_agregado, pasta, formatos=('png',), metodo='weibull',
+                    fator_iqr=FATOR_IQR, trabalhadores=1, dpi=100, df_estatisticas=None):
+    """Gera um gráfico por coluna (indicador) de df_agregado.
+
+    df_agregado: DataFrame municípios x indicadores.
+    pasta: onde gravar <indicador>.<formato>.
+    trabalhadores: número de processos (1 = no processo atual).
+    df_estatisticas: estatisticas(..., outliers=True) já calculadas, se
+                     houver; senão são calculadas aqui numa única chamada.
+
+    Retorna a lista de arquivos gravados.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    if df_estatisticas is None:
+        df_estatisticas = estatisticas(df_agregado, metodo, fator_iqr, outliers=True)
+
+    lista = [(indicador, df_agregado[indicador].astype(np.float64),
+              df_estatisticas.loc[indicador], pasta, formatos, dpi)
+             for indicador in df_agregado.columns]
+
+    if trabalhadores == 1:
+        resultados = map(_renderizar, lista)
+        return [caminho for caminhos in resultados for caminho in caminhos]
+
+    with ProcessPoolExecutor(trabalhadores) as executor:
+        chunksize = max(1, len(lista) // (trabalhadores * 2))
+        resultados = executor.map(_renderizar, lista, chunksize=chunksize)
+        return [caminho for caminhos in resultados for caminho in caminhos]
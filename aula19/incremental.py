@@ -0,0 +1,199 @@
+# Atualização incremental dos totais por município
+#
+# O arquivo do ISP só cresce: a cada mês entram novas linhas (ano/mes) para
+# cada CISP. Mesmo assim, cada execução refazia o groupby('munic').sum()
+# sobre todo o histórico.
+#
+# Aqui os totais por município ficam guardados em disco junto com:
+#   - contagem: número de registros somados;
+#   - soma_quadrados: soma dos quadrados dos registros,
+# o que permite obter média, variância e desvio padrão por município sem
+# voltar aos dados brutos.
+#
+# Junto com os totais guardamos o sha256 e o número de linhas do CSV que
+# foi somado. Quando o arquivo muda:
+#   - se o CSV novo é o antigo mais linhas no final, dados.atualizar_cache
+#     interpreta só essas linhas e as acrescenta às colunas do cache
+#     (dados.acrescentar_colunas), anotando a versão antiga em
+#     meta['anteriores']. Se os totais são de uma dessas versões, somente
+#     as linhas seguintes são carregadas (memória mapeada), agregadas e
+#     acrescentadas aos totais;
+#   - se qualquer byte antigo mudou (um valor revisado, uma linha removida
+#     ou reordenada), o cache colunar é convertido de novo e os totais são
+#     recalculados do zero.
+#
+# O que continua proporcional ao histórico inteiro: conferir o sha256 do
+# trecho antigo do CSV e copiar as colunas antigas para a pasta nova do
+# cache (cópia de arrays, sem interpretar texto).
+#
+# Os quartis continuam sendo calculados a cada vez, mas sobre a tabela
+# pequena de municípios, e não sobre o histórico.
+#
+# Uso:
+#   from aula19.incremental import analisar_incremental
+#   df_agregado, df_estatisticas = analisar_incremental(['roubo_veiculo'])
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from aula19.analise import estatisticas, indicadores_disponiveis
+from aula19.dados import atualizar_cache, carregar_ocorrencias, diretorio_cache, ler_meta
+from aula19.estatistica import FATOR_IQR
+
+
+PASTA_AGREGADOS = 'agregados'
+NOME_ESTADO = 'estado.json'
+NOME_VALORES = 'valores.npz'
+
+MEDIDAS = ('soma', 'contagem', 'soma_quadrados')
+
+
+def _agregar(df, indicadores):
+    """Soma, contagem e soma dos quadrados por município."""
+    valores = df[indicadores].astype(np.float64)
+    grupos = valores.groupby(df['munic'], observed=True)
+    agregados = {
+        'soma': grupos.sum(),
+        'contagem': grupos.count().astype(np.float64),
+        'soma_quadrados': (valores ** 2).groupby(df['munic'], observed=True).sum(),
+    }
+    # Índice de texto, como o lido de volta por ler_estado(): as categorias
+    # do arquivo antigo e das linhas novas não são as mesmas
+    municipios = pd.Index([str(m) for m in agregados['soma'].index], name='munic')
+    for tabela in agregados.values():
+        tabela.index = municipios
+    return agregados
+
+
+def ler_estado(pasta=None):
+    """Lê os agregados guardados. Retorna None se ainda não existem."""
+    pasta_agregados = os.path.join(pasta or diretorio_cache(), PASTA_AGREGADOS)
+    try:
+        with open(os.path.join(pasta_agregados, NOME_ESTADO), encoding='utf-8') as arquivo:
+            estado = json.load(arquivo)
+        valores = np.load(os.path.join(pasta_agregados, NOME_VALORES))
+    except (OSError, ValueError):
+        return None
+
+    municipios = pd.Index(estado['municipios'], name='munic')
+    for medida in MEDIDAS:
+        estado[medida] = pd.DataFrame(valores[medida], index=municipios,
+                                      columns=estado['indicadores'])
+    return estado
+
+
+def gravar_estado(estado, pasta=None):
+    pasta_agregados = os.path.join(pasta or diretorio_cache(), PASTA_AGREGADOS)
+    os.makedirs(pasta_agregados, exist_ok=True)
+
+    # Primeiro os valores, depois o json: o json só aponta para valores
+    # completos. Os temporários têm nome único, para dois processos não
+    # gravarem no mesmo arquivo.
+    with tempfile.NamedTemporaryFile(dir=pasta_agregados, suffix='.npz',
+                                     delete=False) as temporario:
+        np.savez(temporario, **{medida: estado[medida].to_numpy() for medida in MEDIDAS})
+    os.replace(temporario.name, os.path.join(pasta_agregados, NOME_VALORES))
+
+    conteudo = {chave: valor for chave, valor in estado.items() if chave not in MEDIDAS}
+    conteudo['municipios'] = [str(m) for m in estado['soma'].index]
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=pasta_agregados,
+                                     suffix='.json', delete=False) as temporario:
+        json.dump(conteudo, temporario, ensure_ascii=False, indent=2)
+    os.replace(temporario.name, os.path.join(pasta_agregados, NOME_ESTADO))
+
+
+def _recalcular(indicadores, meta, pasta):
+    df = carregar_ocorrencias(['munic', *indicadores], pasta=pasta, atualizar=False)
+    return {
+        'sha256': meta['sha256'],
+        'indicadores': list(indicadores),
+        'linhas': len(df),
+        **_agregar(df, indicadores),
+    }
+
+
+def atualizar_agregados(indicadores=None, pasta=None, atualizar=True, **kwargs):
+    """Atualiza (ou cria) os agregados por município e os retorna.
+
+    indicadores: lista de colunas (None = todos). Se algum indicador pedido
+                 ainda não estiver guardado, os agregados são refeitos com
+                 todos os anteriores mais os novos.
+    atualizar: se False, usa o cache de dados existente sem consultar a
+               origem.
+    Os demais argumentos nomeados vão para atualizar_cache() (origem).
+
+    Só as linhas acrescentadas no final do CSV desde a última vez são
+    lidas e somadas; se o trecho já somado mudou, os agregados são
+    refeitos do zero.
+
+    Retorna o estado: dicionário com soma, contagem e soma_quadrados
+    (DataFrames municípios x indicadores) e as informações de controle.
+    """
+    pasta = pasta or diretorio_cache()
+    meta = atualizar_cache(pasta=pasta, **kwargs) if atualizar else ler_meta(pasta)
+    if indicadores is None:
+        indicadores = indicadores_disponiveis(meta['colunas'])
+
+    estado = ler_estado(pasta)
+    if estado is not None:
+        # Nada mudou desde a última vez
+        if estado['sha256'] == meta['sha256'] and set(indicadores) <= set(estado['indicadores']):
+            return estado
+        faltando = [i for i in indicadores if i not in estado['indicadores']]
+        if faltando:
+            indicadores = estado['indicadores'] + faltando
+            estado = None
+    else:
+        indicadores = list(indicadores)
+
+    # Os totais são de uma versão que só recebeu linhas no final?
+    if estado is not None:
+        versao = {'sha256': estado['sha256'], 'linhas': estado['linhas']}
+        if versao not in meta.get('anteriores', []):
+            estado = None
+
+    if estado is None:
+        # Primeira vez, indicadores novos ou histórico revisado
+        estado = _recalcular(indicadores, meta, pasta)
+    else:
+        df = carregar_ocorrencias(['munic', *indicadores], pasta=pasta, atualizar=False,
+                                  inicio=estado['linhas'])
+        agregados = _agregar(df, indicadores)
+        for medida in MEDIDAS:
+            estado[medida] = estado[medida].add(agregados[medida], fill_value=0)
+        estado['linhas'] += len(df)
+        estado['sha256'] = meta['sha256']
+    gravar_estado(estado, pasta)
+    return estado
+
+
+def medidas_por_municipio(estado, indicador):
+    """Total, registros, média e desvio padrão de um indicador por município.
+
+    A variância vem de soma e soma_quadrados:
+    var = soma_quadrados / n - (soma / n) ** 2
+    """
+    soma = estado['soma'][indicador]
+    contagem = estado['contagem'][indicador]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = soma / contagem
+        variancia = (estado['soma_quadrados'][indicador] / contagem - media ** 2).clip(lower=0)
+    return pd.DataFrame({
+        'total': soma,
+        'registros': contagem,
+        'media': media,
+        'desvio_padrao': np.sqrt(variancia),
+    })
+
+
+def analisar_incremental(indicadores=None, metodo='weibull', fator_iqr=FATOR_IQR, **kwargs):
+    """Mesmo resultado de analise.analisar(), mas a partir dos agregados.
+
+    Retorna (df_agregado, df_estatisticas).
+    """
+    estado = atualizar_agregados(indicadores, **kwargs)
+    df_agregado = estado['soma'][indicadores or estado['indicadores']]
+    return df_agregado, estatisticas(df_agregado, metodo, fator_iqr)
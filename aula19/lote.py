@@ -0,0 +1,100 @@
+# Geração em lote dos relatórios (indicadores x períodos) em paralelo
+#
+# Cada par (indicador, tipo de janela) é um relatório independente dos
+# outros, então o trabalho pode ser dividido entre vários processos.
+#
+# Os dados não são enviados para cada processo (o que exigiria copiar o
+# cubo inteiro via pickle): o cubo é gravado uma vez em disco e cada
+# processo o abre com memória mapeada (np.load(mmap_mode='r')). O sistema
+# operacional compartilha as mesmas páginas entre todos os processos.
+#
+# Quanto os processos aceleram depende das CPUs disponíveis e ainda não
+# foi medido numa máquina com mais de uma. Com 1 CPU, 2 ou 4 processos
+# levam cerca de 13% a mais que 1 (criação do pool e gravação do cubo).
+# Para medir na sua máquina: python -m aula19.benchmark paralelo
+#
+# Uso:
+#   python -m aula19.lote --trabalhadores 8 --janelas ano movel12 --saida relatorio.csv
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from aula19.cubo import (TIPOS_JANELA, abrir_cubo, gravar_cubo, janelas,
+                         montar_cubo, relatorio)
+from aula19.estatistica import FATOR_IQR
+
+
+# Cubo aberto em cada processo trabalhador (preenchido por _iniciar)
+_cubo = None
+
+
+def _iniciar(pasta_cubo):
+    global _cubo
+    _cubo = abrir_cubo(pasta_cubo)
+
+
+def _executar(tarefa, cubo=None):
+    # Nos trabalhadores o cubo é o aberto por _iniciar
+    cubo = _cubo if cubo is None else cubo
+    indicador, tipo, metodo, fator_iqr = tarefa
+    df = relatorio(cubo, janelas(cubo, tipo), [indicador], metodo, fator_iqr, outliers=True)
+    return pd.concat({tipo: df}, names=['tipo'])
+
+
+def tarefas(cubo, indicadores=None, tipos=TIPOS_JANELA, metodo='weibull', fator_iqr=FATOR_IQR):
+    """Lista as tarefas (indicador, tipo de janela, metodo, fator_iqr)."""
+    indicadores = indicadores or cubo['indicadores']
+    return [(indicador, tipo, metodo, fator_iqr) for tipo in tipos for indicador in indicadores]
+
+
+def gerar_relatorios(cubo, indicadores=None, tipos=TIPOS_JANELA, metodo='weibull',
+                     fator_iqr=FATOR_IQR, trabalhadores=None):
+    """Gera todos os relatórios e junta numa única tabela.
+
+    trabalhadores: número de processos (None = número de CPUs). Com 1, tudo
+                   roda no processo atual, sem pool e sem gravar o cubo.
+
+    Retorna um DataFrame com índice (tipo, janela, indicador).
+    """
+    lista = tarefas(cubo, indicadores, tipos, metodo, fator_iqr)
+    trabalhadores = trabalhadores or os.cpu_count()
+
+    if trabalhadores == 1:
+        # No próprio processo o cubo já está na memória: nada a gravar
+        resultados = [_executar(tarefa, cubo) for tarefa in lista]
+    else:
+        with tempfile.TemporaryDirectory(prefix='aula19_cubo_') as pasta_cubo:
+            gravar_cubo(cubo, pasta_cubo)
+            with ProcessPoolExecutor(trabalhadores, initializer=_iniciar,
+                                     initargs=(pasta_cubo,)) as executor:
+                # chunksize agrupa várias tarefas pequenas por envio
+                chunksize = max(1, len(lista) // (trabalhadores * 4))
+                resultados = list(executor.map(_executar, lista, chunksize=chunksize))
+
+    return pd.concat(resultados).sort_index(level=['tipo', 'janela'], sort_remaining=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Relatórios de todos os indicadores e períodos em paralelo')
+    parser.add_argument('indicadores', nargs='*', help='padrão: todos')
+    parser.add_argument('--janelas', nargs='+', choices=TIPOS_JANELA, default=list(TIPOS_JANELA))
+    parser.add_argument('--trabalhadores', type=int, default=None, help='padrão: número de CPUs')
+    parser.add_argument('--metodo', default='weibull', choices=['weibull', 'linear', 'hazen'])
+    parser.add_argument('--fator-iqr', type=float, default=FATOR_IQR)
+    parser.add_argument('--saida', help='arquivo CSV de saída (padrão: imprime um resumo)')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    cubo = montar_cubo(args.indicadores or None)
+    df_relatorio = gerar_relatorios(cubo, args.indicadores or None, args.janelas,
+                                    args.metodo, args.fator_iqr, args.trabalhadores)
+    print(f'{len(df_relatorio)} linhas em {time.perf_counter() - inicio:.2f} s')
+
+    if args.saida:
+        df_relatorio.to_csv(args.saida, sep=';')
+    else:
+        print(df_relatorio)
@@ -0,0 +1,161 @@
+# Cache dos resultados das análises
+#
+# Rodar a mesma análise com os mesmos dados refaz o groupby, as medidas e
+# as listas de outliers. Aqui cada resultado (total por município, quartis,
+# limites e outliers de um indicador) é guardado em disco e reaproveitado.
+#
+# A chave é o hash (sha256) do conteúdo do CSV + indicador + método dos
+# quartis + fator do IQR + janela. Como o hash dos dados faz parte da
+# chave, quando o CSV muda os resultados antigos deixam de ser encontrados
+# e são apagados na próxima gravação.
+#
+# O tamanho total é limitado (padrão 50 MB, ou AULA19_LIMITE_RESULTADOS em
+# bytes): quando passa do limite, os resultados usados há mais tempo são
+# apagados primeiro (LRU). A data de modificação de cada arquivo marca o
+# último uso.
+#
+# Uso:
+#   from aula19.memo import resultados
+#   df_agregado, df_estatisticas = resultados(['roubo_veiculo'])
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from aula19.analise import agregar_por_municipio, estatisticas, indicadores_disponiveis
+from aula19.cubo import montar_cubo, totais
+from aula19.dados import atualizar_cache, carregar_ocorrencias, diretorio_cache, ler_meta
+from aula19.estatistica import FATOR_IQR
+
+
+PASTA_RESULTADOS = 'resultados'
+LIMITE_PADRAO = 50 * 1024 * 1024
+EXTENSAO = '.pkl'
+
+
+def limite_bytes():
+    return int(os.environ.get('AULA19_LIMITE_RESULTADOS', LIMITE_PADRAO))
+
+
+def _pasta(pasta=None):
+    return os.path.join(pasta or diretorio_cache(), PASTA_RESULTADOS)
+
+
+def chave(sha256, **parametros):
+    """Nome do arquivo de um resultado: <hash dos dados>-<hash dos parâmetros>."""
+    texto = json.dumps(parametros, sort_keys=True, default=str)
+    return f'{sha256[:16]}-{hashlib.sha256(texto.encode()).hexdigest()[:32]}'
+
+
+def ler(nome, pasta=None):
+    """Lê um resultado guardado (None se não existir) e marca o uso."""
+    caminho = os.path.join(_pasta(pasta), nome + EXTENSAO)
+    try:
+        with open(caminho, 'rb') as arquivo:
+            resultado = pickle.load(arquivo)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(caminho)
+    return resultado
+
+
+def gravar(nome, resultado, pasta=None, limite=None):
+    """Guarda um resultado, apaga os de outras versões dos dados e aplica o LRU."""
+    pasta_resultados = _pasta(pasta)
+    os.makedirs(pasta_resultados, exist_ok=True)
+    caminho = os.path.join(pasta_resultados, nome + EXTENSAO)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        pickle.dump(resultado, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+    limpar(nome.split('-')[0], pasta, limite)
+
+
+def limpar(versao_atual=None, pasta=None, limite=None):
+    """Apaga resultados de outras versões dos dados e os menos usados.
+
+    versao_atual: prefixo do hash dos dados atuais (None = não apaga por
+                  versão).
+    limite: tamanho máximo em bytes (None = limite_bytes()).
+    """
+    pasta_resultados = _pasta(pasta)
+    limite = limite_bytes() if limite is None else limite
+    arquivos = []
+    with os.scandir(pasta_resultados) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith(EXTENSAO):
+                continue
+            if versao_atual and not entrada.name.startswith(versao_atual + '-'):
+                os.remove(entrada.path)
+                continue
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite:
+            break
+        os.remove(caminho)
+        total -= tamanho
+
+
+def _calcular(indicadores, metodo, fator_iqr, janela, opcoes):
+    if janela is None:
+        df_ocorrencias = carregar_ocorrencias(['munic', *indicadores], **opcoes)
+        df_agregado = agregar_por_municipio(df_ocorrencias, indicadores)
+    else:
+        # Os totais de uma janela saem do cubo, como em cubo.py: os mesmos
+        # meses e os mesmos municípios (com total zero fora da janela) que
+        # os relatórios por janela usam
+        cubo = montar_cubo(indicadores, **opcoes)
+        df_agregado = totais(cubo, *janela)
+    return df_agregado, estatisticas(df_agregado, metodo, fator_iqr, outliers=True)
+
+
+def resultados(indicadores=None, metodo='weibull', fator_iqr=FATOR_IQR, janela=None,
+               pasta=None, atualizar=True, limite=None, **kwargs):
+    """Mesmo resultado de analise.analisar(), passando pelo cache de resultados.
+
+    indicadores: lista de colunas (None = todos).
+    janela: None (todo o histórico) ou ((ano, mes), (ano, mes)), inclusive.
+            Os totais vêm de cubo.totais(): municípios sem registros na
+            janela entram com total zero.
+    atualizar: se False, não consulta a origem (só o cache local), o que
+               deixa uma consulta repetida na casa dos milissegundos.
+    Os demais argumentos nomeados vão para atualizar_cache() (origem).
+
+    Cada indicador é guardado separadamente. Os que não estiverem no cache
+    são calculados juntos, numa única passada pelos dados.
+
+    Retorna (df_agregado, df_estatisticas), com as listas de outliers.
+    """
+    pasta = pasta or diretorio_cache()
+    meta = atualizar_cache(pasta=pasta, **kwargs) if atualizar else ler_meta(pasta)
+    if indicadores is None:
+        indicadores = indicadores_disponiveis(meta['colunas'])
+    if janela is not None:
+        janela = (tuple(janela[0]), tuple(janela[1]))
+
+    nomes = {indicador: chave(meta['sha256'], indicador=indicador, metodo=metodo,
+                              fator_iqr=float(fator_iqr), janela=janela)
+             for indicador in indicadores}
+    encontrados = {indicador: ler(nome, pasta) for indicador, nome in nomes.items()}
+    faltando = [indicador for indicador, resultado in encontrados.items() if resultado is None]
+
+    if faltando:
+        df_agregado, df_estatisticas = _calcular(faltando, metodo, fator_iqr, janela,
+                                                 {'pasta': pasta, 'atualizar': False})
+        for indicador in faltando:
+            resultado = {
+                'agregado': df_agregado[indicador],
+                'estatisticas': df_estatisticas.loc[indicador],
+            }
+            gravar(nomes[indicador], resultado, pasta, limite)
+            encontrados[indicador] = resultado
+
+    df_agregado = pd.concat([encontrados[i]['agregado'] for i in indicadores], axis=1)
+    df_estatisticas = pd.DataFrame([encontrados[i]['estatisticas'] for i in indicadores])
+    df_estatisticas.index.name = 'indicador'
+    return df_agregado, df_estatisticas
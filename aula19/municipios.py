@@ -0,0 +1,173 @@
+# Dimensão de municípios codificada por inteiros
+#
+# Nos scripts, o nome do município (texto) acompanha cada linha até o fim:
+# o groupby('munic') compara textos, o sort_values reordena textos e as
+# barras dos gráficos são montadas a partir deles.
+#
+# Aqui cada município é um código inteiro 0..M-1 (o mesmo código da
+# coluna 'category' do cache) e os dados do município ficam numa tabela à
+# parte, a "dimensão", com um array por campo, indexado pelo código:
+#   nomes      -> nome do município;
+#   ibge       -> código IBGE (coluna mcirc do ISP), se disponível;
+#   populacao  -> habitantes, se uma tabela de população for informada.
+# Somas, contagens e taxas são feitas com np.bincount sobre os códigos, e
+# o "join" com a população é só indexar o array da dimensão pelos códigos.
+# Os nomes só voltam a aparecer na saída.
+#
+# A tabela de população é um CSV separado por ';' com a coluna populacao e
+# a coluna ibge (código IBGE de 7 dígitos) ou munic (nome, como no ISP):
+#   munic;populacao
+#   Niterói;481749
+#
+# Uso:
+#   from aula19.municipios import codificar, ler_populacao, anexar_populacao
+#   codigos, dimensao = codificar(df_ocorrencias['munic'])
+#   dimensao = anexar_populacao(dimensao, ler_populacao('populacao.csv'))
+import os
+
+import numpy as np
+import pandas as pd
+
+from aula19.dados import PASTA_COLUNAS, SEPARADOR, diretorio_cache, ler_meta
+
+
+POR_HABITANTES = 100_000
+
+
+def criar_dimensao(nomes, ibge=None, populacao=None):
+    """Monta a dimensão: arrays indexados pelo código do município."""
+    return {
+        'nomes': np.asarray(nomes, dtype=object),
+        'ibge': None if ibge is None else np.asarray(ibge, dtype=np.int64),
+        'populacao': None if populacao is None else np.asarray(populacao, dtype=np.float64),
+    }
+
+
+def _ibge_por_codigo(codigos, mcirc, quantidade):
+    # Cada município tem um único mcirc; basta espalhar os valores pelos
+    # códigos (0 = município sem código IBGE).
+    ibge = np.zeros(quantidade, dtype=np.int64)
+    validos = (codigos >= 0) & ~np.isnan(mcirc)
+    ibge[codigos[validos]] = mcirc[validos]
+    return ibge
+
+
+def codificar(munic, mcirc=None):
+    """Códigos inteiros e dimensão de uma coluna de municípios.
+
+    munic: Series 'category' (como vem de carregar_ocorrencias) ou de
+           texto (codificada aqui, em ordem alfabética).
+    mcirc: Series com o código IBGE de cada linha (opcional).
+
+    Retorna (codigos, dimensao). Linhas sem município ficam com código -1.
+    """
+    if isinstance(munic.dtype, pd.CategoricalDtype):
+        codigos = munic.cat.codes.to_numpy()
+        nomes = munic.cat.categories.to_numpy()
+    else:
+        codigos, nomes = pd.factorize(munic, sort=True)
+        nomes = np.asarray(nomes)
+
+    ibge = None
+    if mcirc is not None:
+        valores = mcirc.to_numpy(dtype=np.float64, na_value=np.nan)
+        ibge = _ibge_por_codigo(codigos, valores, len(nomes))
+    return codigos, criar_dimensao(nomes, ibge)
+
+
+def dimensao_do_cache(pasta=None):
+    """Dimensão dos municípios a partir do cache colunar, sem montar DataFrame.
+
+    Os nomes vêm das categorias do meta.json e, se o CSV tiver a coluna
+    mcirc, o código IBGE é lido dos arquivos .npy com memória mapeada.
+    """
+    pasta = pasta or diretorio_cache()
+    meta = ler_meta(pasta)
+    nomes = meta['colunas']['munic']['categorias']
+    ibge = None
+    if 'mcirc' in meta['colunas']:
+        pasta_colunas = os.path.join(pasta, PASTA_COLUNAS)
+        codigos = np.load(os.path.join(pasta_colunas, 'munic.npy'), mmap_mode='r')
+        mcirc = np.load(os.path.join(pasta_colunas, 'mcirc.npy'), mmap_mode='r')
+        ibge = _ibge_por_codigo(np.asarray(codigos), np.asarray(mcirc, dtype=np.float64),
+                                len(nomes))
+    return criar_dimensao(nomes, ibge)
+
+
+def ler_populacao(caminho, codificacao='utf-8'):
+    """Lê a tabela de população (colunas populacao e ibge ou munic)."""
+    tabela = pd.read_csv(caminho, sep=SEPARADOR, encoding=codificacao)
+    if 'populacao' not in tabela or not ({'ibge', 'munic'} & set(tabela.columns)):
+        raise ValueError(f'{caminho}: esperadas as colunas populacao e ibge ou munic')
+    return tabela
+
+
+def anexar_populacao(dimensao, tabela):
+    """Acrescenta a população à dimensão (NaN para quem não estiver na tabela).
+
+    A ligação é feita pelo código IBGE quando a tabela e a dimensão o têm,
+    e pelo nome do município nos demais casos. É a única comparação de
+    textos, feita uma vez por município e não por linha dos dados.
+
+    Lança ValueError se a tabela repetir um município (a população seria
+    ambígua) ou se nenhum município dela corresponder aos dados (tabela de
+    outro lugar, ou nomes/códigos em outro formato).
+    """
+    if 'ibge' in tabela and dimensao['ibge'] is not None:
+        campo = 'ibge'
+        chaves = pd.Index(tabela['ibge'].astype(np.int64))
+        procurados = dimensao['ibge']
+    elif 'munic' not in tabela:
+        raise ValueError('Tabela só com código IBGE, mas os dados não têm a coluna mcirc')
+    else:
+        campo = 'munic'
+        chaves = pd.Index(tabela['munic'].astype(str).str.strip())
+        procurados = dimensao['nomes']
+
+    if chaves.has_duplicates:
+        repetidos = chaves[chaves.duplicated()].unique().tolist()
+        raise ValueError(f'Tabela de população com {campo} repetido: {repetidos[:5]}')
+    posicoes = chaves.get_indexer(procurados)
+    if len(procurados) and (posicoes < 0).all():
+        raise ValueError(f'Nenhum município da tabela de população corresponde aos dados '
+                         f'(ligação pela coluna {campo})')
+
+    populacao = tabela['populacao'].to_numpy(dtype=np.float64)
+    alinhada = np.where(posicoes >= 0, populacao[posicoes], np.nan)
+    return criar_dimensao(dimensao['nomes'], dimensao['ibge'], alinhada)
+
+
+def somar_por_codigo(codigos, colunas, quantidade):
+    """Soma cada coluna por código de município (np.bincount).
+
+    codigos: array de códigos (-1 = sem município, ignorado).
+    colunas: lista de arrays/Series, uma por indicador. Valores vazios
+             contam como zero, como no sum() do pandas.
+    quantidade: número de municípios da dimensão.
+
+    Retorna (totais, linhas): matriz municípios x colunas e o número de
+    linhas de cada município.
+    """
+    validos = codigos >= 0
+    if validos.all():
+        validos = slice(None)
+    codigos = codigos[validos]
+    totais = np.empty((quantidade, len(colunas)), dtype=np.float64)
+    for j, coluna in enumerate(colunas):
+        if isinstance(coluna, pd.Series):
+            valores = coluna.to_numpy(dtype=np.float64, na_value=0.0)
+        else:
+            valores = np.nan_to_num(np.asarray(coluna, dtype=np.float64))
+        totais[:, j] = np.bincount(codigos, valores[validos], minlength=quantidade)
+    linhas = np.bincount(codigos, minlength=quantidade)
+    return totais, linhas
+
+
+def taxa_por_habitantes(totais, populacao, por=POR_HABITANTES):
+    """Taxa por `por` habitantes (padrão: 100 mil) de uma matriz municípios x indicadores.
+
+    populacao: array alinhado às linhas de totais (NaN = sem população,
+               a taxa fica NaN).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return totais / np.asarray(populacao, dtype=np.float64)[:, None] * por
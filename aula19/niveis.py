@@ -0,0 +1,208 @@
+# Outliers em vários níveis: CISP, município e região
+#
+# Os scripts só procuram outliers entre os municípios, depois de somar.
+# Para achar as delegacias (CISPs) fora do padrão dentro de cada município,
+# ou os municípios fora do padrão dentro de cada região, seria preciso
+# reagrupar os dados em laços aninhados (para cada município, agrupar as
+# suas CISPs, calcular quartis...).
+#
+# Aqui:
+#   1. os registros são ordenados UMA vez por (regiao, munic, cisp). Com
+#      isso cada CISP, cada município e cada região ocupam linhas
+#      contíguas, e os totais de todos os níveis saem de somas por faixa
+#      (np.add.reduceat), cada nível somando o nível de baixo, como um
+#      ROLLUP (grouping sets) do SQL;
+#   2. os quartis e limites de cada grupo (as CISPs de cada município, os
+#      municípios de cada região) são calculados de uma vez por
+#      estatistica.resumir_agrupado, sem laço pelos grupos.
+#
+# Análises (unidade comparada, dentro de qual grupo):
+#   cisp_municipio    -> CISPs dentro do seu município
+#   municipio_regiao  -> municípios dentro da sua região
+#   municipio_estado  -> municípios no estado todo (a análise dos scripts)
+#
+# Uso:
+#   from aula19.niveis import analisar_niveis
+#   df_limites, df_outliers = analisar_niveis(['roubo_veiculo'])
+import numpy as np
+import pandas as pd
+
+from aula19.analise import indicadores_disponiveis
+from aula19.dados import carregar_ocorrencias
+from aula19.estatistica import FATOR_IQR, resumir_agrupado
+from aula19.municipios import codificar
+
+
+NIVEIS = ('cisp', 'munic', 'regiao')
+
+# Nome da análise -> (nível da unidade, nível do grupo; None = estado)
+ANALISES = {
+    'cisp_municipio': ('cisp', 'munic'),
+    'municipio_regiao': ('munic', 'regiao'),
+    'municipio_estado': ('munic', None),
+}
+
+NOME_ESTADO = 'Estado'
+
+
+def _inicios(*chaves):
+    # True na primeira linha de cada grupo formado pelas chaves (ordenadas)
+    muda = np.zeros(len(chaves[0]), dtype=bool)
+    muda[0] = True
+    for chave in chaves:
+        muda[1:] |= chave[1:] != chave[:-1]
+    return muda
+
+
+def agregar_niveis(df_ocorrencias, indicadores):
+    """Totais por CISP, município e região numa única ordenação.
+
+    df_ocorrencias: DataFrame com cisp, munic, regiao e os indicadores.
+
+    Retorna um dicionário com:
+      indicadores: nomes das colunas;
+      cisp, munic, regiao: para cada nível, {'nomes', 'totais', 'pai'},
+        onde totais é uma matriz (grupos x indicadores) e pai é a posição
+        de cada grupo no nível de cima;
+      total: total do estado.
+    """
+    codigos, nomes = [], []
+    for nivel in NIVEIS:
+        codigo, dimensao = codificar(df_ocorrencias[nivel])
+        codigos.append(codigo)
+        nomes.append(dimensao['nomes'])
+    cisp, munic, regiao = codigos
+
+    ordem = np.lexsort((cisp, munic, regiao))
+    ordem = ordem[(cisp[ordem] >= 0) & (munic[ordem] >= 0) & (regiao[ordem] >= 0)]
+    if len(ordem) == 0:
+        raise ValueError('Nenhum registro com cisp, munic e regiao preenchidos')
+    cisp, munic, regiao = cisp[ordem], munic[ordem], regiao[ordem]
+
+    valores = np.column_stack([
+        df_ocorrencias[indicador].to_numpy(dtype=np.float64, na_value=0.0)[ordem]
+        for indicador in indicadores
+    ])
+
+    # Nível mais baixo: faixas de linhas de cada (regiao, munic, cisp)
+    inicio_cisp = np.flatnonzero(_inicios(regiao, munic, cisp))
+    totais_cisp = np.add.reduceat(valores, inicio_cisp, axis=0)
+
+    # Níveis de cima: somam as linhas já agregadas do nível de baixo
+    muda_munic = _inicios(regiao[inicio_cisp], munic[inicio_cisp])
+    inicio_munic = np.flatnonzero(muda_munic)
+    totais_munic = np.add.reduceat(totais_cisp, inicio_munic, axis=0)
+
+    primeira_linha_munic = inicio_cisp[inicio_munic]
+    muda_regiao = _inicios(regiao[primeira_linha_munic])
+    inicio_regiao = np.flatnonzero(muda_regiao)
+    totais_regiao = np.add.reduceat(totais_munic, inicio_regiao, axis=0)
+
+    return {
+        'indicadores': list(indicadores),
+        'cisp': {
+            'nomes': nomes[0][cisp[inicio_cisp]],
+            'totais': totais_cisp,
+            'pai': np.cumsum(muda_munic) - 1,
+        },
+        'munic': {
+            'nomes': nomes[1][munic[primeira_linha_munic]],
+            'totais': totais_munic,
+            'pai': np.cumsum(muda_regiao) - 1,
+        },
+        'regiao': {
+            'nomes': nomes[2][regiao[primeira_linha_munic[inicio_regiao]]],
+            'totais': totais_regiao,
+            'pai': np.zeros(len(inicio_regiao), dtype=np.intp),
+        },
+        'total': totais_regiao.sum(axis=0),
+    }
+
+
+def _limites(analise, nomes_grupo, indicadores, resumo):
+    quantidade, colunas = len(nomes_grupo), len(indicadores)
+    indice = pd.MultiIndex.from_arrays(
+        [np.full(quantidade * colunas, analise), np.repeat(nomes_grupo, colunas),
+         np.tile(indicadores, quantidade)],
+        names=['analise', 'grupo', 'indicador'])
+    return pd.DataFrame({
+        'unidades': np.repeat(resumo['tamanho'], colunas),
+        'q1': resumo['q1'].ravel(),
+        'q2': resumo['q2'].ravel(),
+        'q3': resumo['q3'].ravel(),
+        'iqr': resumo['iqr'].ravel(),
+        'limite_inferior': resumo['limite_inferior'].ravel(),
+        'limite_superior': resumo['limite_superior'].ravel(),
+        'outliers_inferiores': resumo['outliers_inferiores'].ravel(),
+        'outliers_superiores': resumo['outliers_superiores'].ravel(),
+    }, index=indice)
+
+
+def _outliers(analise, unidades, grupos, nomes_grupo, indicadores, resumo):
+    totais = unidades['totais']
+    linhas, colunas = np.nonzero(resumo['inferior'] | resumo['superior'])
+    valores = totais[linhas, colunas]
+    # Ordem de saída: grupo, indicador e valor decrescente (por códigos,
+    # antes de trazer os nomes)
+    ordem = np.lexsort((-valores, colunas, grupos[linhas]))
+    linhas, colunas, valores = linhas[ordem], colunas[ordem], valores[ordem]
+    pais = grupos[linhas]
+    return pd.DataFrame({
+        'analise': analise,
+        'grupo': nomes_grupo[pais],
+        'indicador': np.asarray(indicadores, dtype=object)[colunas],
+        'unidade': unidades['nomes'][linhas],
+        'valor': valores,
+        'tipo': np.where(resumo['inferior'][linhas, colunas], 'inferior', 'superior'),
+        'limite_inferior': resumo['limite_inferior'][pais, colunas],
+        'limite_superior': resumo['limite_superior'][pais, colunas],
+    })
+
+
+def outliers_niveis(niveis, metodo='weibull', fator_iqr=FATOR_IQR, analises=tuple(ANALISES)):
+    """Quartis, limites e outliers de cada grupo, para cada análise.
+
+    niveis: saída de agregar_niveis().
+    analises: nomes de ANALISES a calcular.
+
+    Retorna (df_limites, df_outliers):
+      df_limites: uma linha por (analise, grupo, indicador) com o número
+                  de unidades, quartis, limites e quantidade de outliers;
+      df_outliers: uma linha por unidade fora dos limites do seu grupo.
+    """
+    indicadores = niveis['indicadores']
+    limites, outliers = [], []
+    for analise in analises:
+        unidade, grupo = ANALISES[analise]
+        unidades = niveis[unidade]
+        if grupo is None:
+            grupos = np.zeros(len(unidades['nomes']), dtype=np.intp)
+            nomes_grupo = np.array([NOME_ESTADO], dtype=object)
+        else:
+            grupos = unidades['pai']
+            nomes_grupo = niveis[grupo]['nomes']
+
+        resumo = resumir_agrupado(unidades['totais'], grupos, len(nomes_grupo),
+                                  metodo, fator_iqr)
+        limites.append(_limites(analise, nomes_grupo, indicadores, resumo))
+        outliers.append(_outliers(analise, unidades, grupos, nomes_grupo, indicadores, resumo))
+
+    return pd.concat(limites), pd.concat(outliers, ignore_index=True)
+
+
+def analisar_niveis(indicadores=None, metodo='weibull', fator_iqr=FATOR_IQR,
+                    analises=tuple(ANALISES), **kwargs):
+    """Carrega os dados e procura outliers por CISP, município e região.
+
+    indicadores: lista de colunas (None = todos).
+    Os demais argumentos nomeados vão para carregar_ocorrencias().
+
+    Retorna (df_limites, df_outliers), como outliers_niveis().
+    """
+    if indicadores is None:
+        df_ocorrencias = carregar_ocorrencias(**kwargs)
+        indicadores = indicadores_disponiveis(df_ocorrencias.columns)
+    else:
+        df_ocorrencias = carregar_ocorrencias([*NIVEIS, *indicadores], **kwargs)
+    niveis = agregar_niveis(df_ocorrencias, indicadores)
+    return outliers_niveis(niveis, metodo, fator_iqr, analises)
@@ -0,0 +1,228 @@
+# Execução do fluxo completo com medições por etapa e tolerância a falhas
+#
+# Nos scripts, cada etapa fica num try/except Exception que imprime o erro
+# e chama exit(): não sabemos quanto tempo cada etapa leva e uma falha
+# passageira (site do ISP fora do ar, por exemplo) derruba a execução.
+#
+# Aqui cada etapa (download, conversão, carga, agregação, estatísticas,
+# gráficos) é medida com:
+#   - segundos: tempo de relógio;
+#   - memoria_pico_mb: maior uso de memória (RSS) durante a etapa. O pico
+#     do processo é zerado no início de cada etapa, o que só o Linux
+#     permite (/proc/self/clear_refs); nos outros sistemas fica None;
+#   - memoria_pico_processo_mb: maior uso de memória do processo desde o
+#     início, acumulado entre as etapas (ru_maxrss; não disponível no
+#     Windows);
+#   - linhas: quantidade de linhas processadas, quando faz sentido;
+#   - status: 'ok', 'fallback' ou 'erro'.
+# As medições são impressas/gravadas como JSON (uma linha por etapa), fáceis
+# de enviar para um sistema de métricas ou comparar entre execuções.
+#
+# O download é repetido com espera crescente (1 s, 2 s, 4 s...) e, se
+# todas as tentativas falharem, ou se o arquivo baixado não puder ser
+# lido/convertido (etapa de conversão), usa o último cache local válido.
+#
+# Uso:
+#   python -m aula19 pipeline --indicador roubo_veiculo --metricas metricas.jsonl
+import contextlib
+import json
+import sys
+import time
+
+from aula19.analise import agregar_por_municipio, estatisticas, indicadores_disponiveis
+from aula19.dados import (ENDERECO_DADOS, baixar_csv, carregar_ocorrencias, diretorio_cache,
+                          instalar_csv, ler_meta, travar_cache)
+from aula19.estatistica import FATOR_IQR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Erros que valem uma nova tentativa. OSError inclui URLError/HTTPError,
+# tempo esgotado e conexão recusada.
+ERROS_PASSAGEIROS = (OSError,)
+
+# Maior pico de memória do processo já lido, em MB. No Linux, zerar o pico
+# (zerar_pico_memoria) também zera o ru_maxrss, então o acumulado é
+# guardado aqui.
+_pico_processo = 0.0
+
+
+def memoria_pico_processo_mb():
+    """Pico de memória do processo desde o início, em MB (None se não disponível)."""
+    global _pico_processo
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    pico = pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+    _pico_processo = max(_pico_processo, pico)
+    return _pico_processo
+
+
+def zerar_pico_memoria():
+    """Zera o pico de memória do processo. Retorna False se não for possível.
+
+    Só no Linux: escrever 5 em /proc/self/clear_refs volta o pico (VmHWM)
+    para o uso atual.
+    """
+    memoria_pico_processo_mb()
+    try:
+        with open('/proc/self/clear_refs', 'w') as arquivo:
+            arquivo.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def memoria_pico_mb():
+    """Pico de memória desde o último zerar_pico_memoria(), em MB (só Linux)."""
+    try:
+        with open('/proc/self/status') as arquivo:
+            for linha in arquivo:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+@contextlib.contextmanager
+def etapa(metricas, nome):
+    """Mede uma etapa e acrescenta o registro em metricas.
+
+    O registro é entregue ao bloco, que pode preencher 'linhas' ou outros
+    campos. Se o bloco lançar uma exceção, o registro fica com status
+    'erro' e a exceção continua subindo.
+    """
+    registro = {'etapa': nome, 'status': 'ok'}
+    por_etapa = zerar_pico_memoria()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as erro:
+        registro['status'] = 'erro'
+        registro['erro'] = f'{type(erro).__name__}: {erro}'
+        raise
+    finally:
+        registro['segundos'] = round(time.perf_counter() - inicio, 6)
+        registro['memoria_pico_mb'] = memoria_pico_mb() if por_etapa else None
+        registro['memoria_pico_processo_mb'] = memoria_pico_processo_mb()
+        metricas.append(registro)
+
+
+def baixar_com_repeticao(origem=ENDERECO_DADOS, pasta=None, tentativas=3,
+                         espera=1.0, fator=2.0, registro=None):
+    """baixar_csv() com novas tentativas.
+
+    Erros de rede (ERROS_PASSAGEIROS) levam a novas tentativas, até
+    `tentativas` chamadas, esperando espera, espera*fator, ... segundos
+    entre elas; depois da última, o erro sobe. Outros erros sobem na
+    hora. registro['tentativas'] recebe o número de chamadas feitas.
+    """
+    registro = registro if registro is not None else {}
+    for tentativa in range(1, tentativas + 1):
+        registro['tentativas'] = tentativa
+        try:
+            return baixar_csv(origem, pasta)
+        except ERROS_PASSAGEIROS:
+            if tentativa == tentativas:
+                raise
+            time.sleep(espera * fator ** (tentativa - 1))
+
+
+def usar_cache_local(pasta, registro, erro):
+    """Volta ao último cache convertido depois de uma falha.
+
+    registro['status'] fica 'fallback' e registro['erro'] com o erro. O
+    cache anterior continua inteiro, porque o CSV e as colunas só são
+    trocados depois de uma conversão bem-sucedida. Sem cache, relança o
+    erro.
+    """
+    try:
+        meta = ler_meta(pasta)
+    except FileNotFoundError:
+        raise erro from None
+    registro['status'] = 'fallback'
+    registro['erro'] = f'{type(erro).__name__}: {erro}'
+    return meta
+
+
+def executar(indicadores=None, origem=ENDERECO_DADOS, pasta=None, metodo='weibull',
+             fator_iqr=FATOR_IQR, graficos=None, formatos=('png',), tentativas=3,
+             espera=1.0):
+    """Executa download, conversão, carga, agregação, estatísticas e gráficos.
+
+    graficos: pasta dos gráficos (None = sem gráficos).
+
+    Retorna (df_estatisticas, metricas). Em caso de erro, a exceção sobe
+    com o atributo 'metricas' contendo as etapas medidas até a falha.
+    """
+    pasta = pasta or diretorio_cache()
+    metricas = []
+    try:
+        # Download e conversão dentro da mesma trava, como em
+        # dados.atualizar_cache()
+        with travar_cache(pasta):
+            with etapa(metricas, 'download') as registro:
+                try:
+                    info, temporario = baixar_com_repeticao(origem, pasta, tentativas, espera,
+                                                            registro=registro)
+                except Exception as erro:
+                    meta = usar_cache_local(pasta, registro, erro)
+                    info = None
+                else:
+                    registro['novo'] = temporario is not None
+                    registro['sha256'] = info['sha256']
+
+            if info is not None:
+                with etapa(metricas, 'conversao') as registro:
+                    try:
+                        meta = instalar_csv(info, temporario, pasta)
+                    except Exception as erro:
+                        meta = usar_cache_local(pasta, registro, erro)
+                    registro['linhas'] = meta['linhas']
+                    registro['sha256'] = meta['sha256']
+
+        with etapa(metricas, 'carga') as registro:
+            if indicadores is None:
+                indicadores = indicadores_disponiveis(meta['colunas'])
+            df_ocorrencias = carregar_ocorrencias(['munic', *indicadores], pasta=pasta,
+                                                  atualizar=False)
+            registro['linhas'] = len(df_ocorrencias)
+            registro['colunas'] = len(df_ocorrencias.columns)
+
+        with etapa(metricas, 'agregacao') as registro:
+            df_agregado = agregar_por_municipio(df_ocorrencias, indicadores)
+            registro['linhas'] = len(df_agregado)
+
+        with etapa(metricas, 'estatisticas') as registro:
+            df_estatisticas = estatisticas(df_agregado, metodo, fator_iqr, outliers=True)
+            registro['linhas'] = len(df_estatisticas)
+
+        if graficos:
+            with etapa(metricas, 'graficos') as registro:
+                # matplotlib só é importado quando há gráficos (o tempo de
+                # importação entra na medição desta etapa)
+                from aula19.graficos import renderizar_lote
+
+                caminhos = renderizar_lote(df_agregado, graficos, formatos,
+                                           df_estatisticas=df_estatisticas)
+                registro['arquivos'] = len(caminhos)
+    except Exception as erro:
+        erro.metricas = metricas
+        raise
+
+    return df_estatisticas, metricas
+
+
+def gravar_metricas(metricas, destino=None):
+    """Grava as métricas como JSON, uma linha por etapa (stdout se destino=None)."""
+    linhas = ''.join(json.dumps(registro, ensure_ascii=False) + '\n' for registro in metricas)
+    if destino is None:
+        sys.stdout.write(linhas)
+    else:
+        with open(destino, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linhas)
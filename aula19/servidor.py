@@ -0,0 +1,396 @@
+# Servidor HTTP de relatórios (asyncio)
+#
+# Com o exemplo1.py, cada consulta baixa e lê o CSV, calcula tudo e abre
+# uma janela de gráfico. Aqui um processo servidor carrega os dados UMA
+# vez (totais por município de todos os indicadores, na memória) e
+# responde às consultas em JSON ou imagem:
+#
+#   GET /saude                          -> versão (sha256) e tamanho dos dados
+#   GET /indicadores                    -> lista de indicadores
+#   GET /estatisticas                   -> medidas de todos os indicadores
+#   GET /estatisticas/<indicador>       -> medidas e listas de outliers
+#   GET /outliers/<indicador>           -> municípios outliers com os totais
+#   GET /graficos/<indicador>.png       -> gráfico 2x2 (ou .svg)
+#
+# Parâmetros opcionais: ?metodo=weibull|linear|hazen&fator_iqr=1.5
+#
+# - O laço do asyncio só lê e escreve nas conexões. As estatísticas são
+#   calculadas numa thread (ThreadPoolExecutor) e os gráficos em processos
+#   (ProcessPoolExecutor, um modelo de figura por processo, ver
+#   graficos.renderizar_bytes), sem travar as outras requisições.
+# - Cada resposta é guardada na memória (LRU) pela URL. Requisições
+#   simultâneas para algo ainda não calculado esperam o MESMO cálculo.
+# - ETag: hash dos dados + URL. Como os dados não mudam enquanto o
+#   servidor está no ar, o ETag é conhecido antes de calcular qualquer
+#   coisa; com If-None-Match igual, a resposta é 304 sem corpo.
+#
+# Só a biblioteca padrão (asyncio) é usada para o HTTP: HTTP/1.1 com
+# conexões persistentes, métodos GET e HEAD. Para uso local ou atrás de
+# um proxy reverso.
+#
+# Uso:
+#   python -m aula19 servidor --porta 8000
+#   curl http://127.0.0.1:8000/estatisticas/roubo_veiculo
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import math
+import multiprocessing
+import re
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from aula19.analise import agregar_por_municipio, estatisticas, indicadores_disponiveis
+from aula19.dados import ENDERECO_DADOS, atualizar_cache, carregar_ocorrencias, ler_meta
+from aula19.estatistica import FATOR_IQR, METODOS
+
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8000
+# Respostas guardadas na memória (as menos usadas saem primeiro)
+LIMITE_RESPOSTAS = 512
+# Segundos para receber uma requisição inteira (linha e cabeçalhos); também
+# é o tempo que uma conexão persistente pode ficar parada
+TEMPO_OCIOSO = 15
+TAMANHO_MAXIMO_CABECALHOS = 100
+
+TIPOS_IMAGEM = {'png': 'image/png', 'svg': 'image/svg+xml'}
+TIPO_JSON = 'application/json; charset=utf-8'
+
+MOTIVOS = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 500: 'Internal Server Error',
+}
+
+
+class ErroHTTP(Exception):
+    """Erro com código HTTP, devolvido ao cliente como JSON."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def carregar_estado(origem=ENDERECO_DADOS, pasta=None, atualizar=True,
+                    trabalhadores=None):
+    """Carrega os dados uma vez e cria os executores do servidor.
+
+    trabalhadores: processos para os gráficos (None = número de CPUs).
+
+    Retorna o dicionário compartilhado por todas as requisições.
+    """
+    meta = atualizar_cache(origem, pasta) if atualizar else ler_meta(pasta)
+    indicadores = indicadores_disponiveis(meta['colunas'])
+    df_ocorrencias = carregar_ocorrencias(['munic', *indicadores], pasta=pasta, atualizar=False)
+    df_agregado = agregar_por_municipio(df_ocorrencias, indicadores)
+    return {
+        'sha256': meta['sha256'],
+        'linhas': meta['linhas'],
+        'indicadores': indicadores,
+        'agregado': df_agregado.astype(np.float64),
+        'respostas': collections.OrderedDict(),
+        'calculo': ThreadPoolExecutor(),
+        # 'spawn': os processos dos gráficos começam do zero, sem herdar o
+        # socket do servidor nem os dados carregados (com fork, um processo
+        # que sobrasse manteria a porta ocupada)
+        'graficos': ProcessPoolExecutor(trabalhadores,
+                                        mp_context=multiprocessing.get_context('spawn')),
+    }
+
+
+def encerrar_estado(estado):
+    estado['calculo'].shutdown(cancel_futures=True)
+    estado['graficos'].shutdown(cancel_futures=True)
+
+
+def _para_json(valor):
+    # Tipos do numpy/pandas para tipos do JSON (NaN e infinito viram null)
+    if isinstance(valor, dict):
+        return {chave: _para_json(v) for chave, v in valor.items()}
+    if isinstance(valor, (list, tuple, np.ndarray)):
+        return [_para_json(v) for v in valor]
+    if isinstance(valor, np.integer):
+        return int(valor)
+    if isinstance(valor, (float, np.floating)):
+        return float(valor) if math.isfinite(valor) else None
+    return valor
+
+
+def _corpo_json(conteudo):
+    return json.dumps(_para_json(conteudo), ensure_ascii=False).encode('utf-8')
+
+
+def _etag(estado, alvo):
+    resumo = hashlib.sha256(alvo.encode('utf-8')).hexdigest()[:16]
+    return f'"{estado["sha256"][:16]}-{resumo}"'
+
+
+# Itens de If-None-Match: '*' ou uma ETag entre aspas, opcionalmente fraca
+ITENS_ETAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def _etag_confere(etag, if_none_match):
+    # If-None-Match é uma lista separada por vírgulas (RFC 9110). Cada item
+    # é comparado inteiro, pela comparação fraca: W/"x" equivale a "x".
+    for item in ITENS_ETAG.findall(if_none_match):
+        if item == '*' or item.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+async def _memorizar(estado, chave, calcular):
+    """Resposta guardada para `chave`, ou calcula com a corrotina `calcular`.
+
+    Guarda a tarefa (e não só o resultado): quem chegar durante o cálculo
+    espera a mesma tarefa. Se o cálculo falhar, a chave é descartada.
+    """
+    respostas = estado['respostas']
+    tarefa = respostas.get(chave)
+    if tarefa is None:
+        tarefa = asyncio.ensure_future(calcular())
+        respostas[chave] = tarefa
+        while len(respostas) > LIMITE_RESPOSTAS:
+            respostas.popitem(last=False)
+    else:
+        respostas.move_to_end(chave)
+    try:
+        return await asyncio.shield(tarefa)
+    except Exception:
+        if respostas.get(chave) is tarefa:
+            del respostas[chave]
+        raise
+
+
+def _parametros(consulta):
+    parametros = parse_qs(consulta)
+    metodo = parametros.get('metodo', ['weibull'])[-1]
+    if metodo not in METODOS:
+        raise ErroHTTP(400, f'metodo deve ser um de: {", ".join(METODOS)}')
+    try:
+        fator_iqr = float(parametros.get('fator_iqr', [FATOR_IQR])[-1])
+    except ValueError:
+        raise ErroHTTP(400, 'fator_iqr deve ser um número') from None
+    if not math.isfinite(fator_iqr) or fator_iqr < 0:
+        raise ErroHTTP(400, 'fator_iqr deve ser um número positivo')
+    return metodo, fator_iqr
+
+
+def _indicador(estado, nome):
+    if nome not in estado['indicadores']:
+        raise ErroHTTP(404, f'Indicador desconhecido: {nome}')
+    return nome
+
+
+async def _estatisticas(estado, indicadores, metodo, fator_iqr):
+    # DataFrame com uma linha por indicador, calculado numa thread
+    chave = ('estatisticas', tuple(indicadores), metodo, fator_iqr)
+    df_agregado = estado['agregado'][indicadores]
+
+    async def calcular():
+        laco = asyncio.get_running_loop()
+        return await laco.run_in_executor(estado['calculo'], estatisticas, df_agregado,
+                                          metodo, fator_iqr, True)
+
+    return await _memorizar(estado, chave, calcular)
+
+
+async def _rota_estatisticas(estado, partes, metodo, fator_iqr):
+    if not partes:
+        df = await _estatisticas(estado, estado['indicadores'], metodo, fator_iqr)
+        df = df.drop(columns=['municipios_outliers_inferiores',
+                              'municipios_outliers_superiores'])
+        return df.to_dict(orient='index')
+    indicador = _indicador(estado, partes[0])
+    df = await _estatisticas(estado, [indicador], metodo, fator_iqr)
+    return {'indicador': indicador, 'metodo': metodo, 'fator_iqr': fator_iqr,
+            **df.loc[indicador].to_dict()}
+
+
+async def _rota_outliers(estado, partes, metodo, fator_iqr):
+    if len(partes) != 1:
+        raise ErroHTTP(404, 'Use /outliers/<indicador>')
+    indicador = _indicador(estado, partes[0])
+    medidas = (await _estatisticas(estado, [indicador], metodo, fator_iqr)).loc[indicador]
+    valores = estado['agregado'][indicador]
+
+    def lista(nomes):
+        return [{'municipio': nome, 'valor': valores[nome]} for nome in nomes]
+
+    return {
+        'indicador': indicador,
+        'limite_inferior': medidas['limite_inferior'],
+        'limite_superior': medidas['limite_superior'],
+        'inferiores': lista(medidas['municipios_outliers_inferiores']),
+        'superiores': lista(medidas['municipios_outliers_superiores']),
+    }
+
+
+async def _rota_grafico(estado, partes, metodo, fator_iqr):
+    if len(partes) != 1 or '.' not in partes[0]:
+        raise ErroHTTP(404, 'Use /graficos/<indicador>.png ou .svg')
+    nome, formato = partes[0].rsplit('.', 1)
+    if formato not in TIPOS_IMAGEM:
+        raise ErroHTTP(404, f'Formato não suportado: {formato}')
+    indicador = _indicador(estado, nome)
+    medidas = (await _estatisticas(estado, [indicador], metodo, fator_iqr)).loc[indicador]
+    valores = estado['agregado'][indicador]
+
+    # Importado aqui: quem não pede gráficos não carrega o matplotlib
+    from aula19.graficos import renderizar_bytes
+
+    async def calcular():
+        laco = asyncio.get_running_loop()
+        return await laco.run_in_executor(estado['graficos'], renderizar_bytes, indicador,
+                                          valores, medidas, formato)
+
+    corpo = await _memorizar(estado, ('grafico', indicador, formato, metodo, fator_iqr),
+                             calcular)
+    return TIPOS_IMAGEM[formato], corpo
+
+
+async def _corpo(estado, url, partes):
+    # (tipo, corpo) de uma rota; as rotas só são chamadas na primeira vez
+    if partes == ['indicadores']:
+        return TIPO_JSON, _corpo_json(estado['indicadores'])
+    if partes and partes[0] in ('estatisticas', 'outliers'):
+        metodo, fator_iqr = _parametros(url.query)
+        rota = _rota_estatisticas if partes[0] == 'estatisticas' else _rota_outliers
+        return TIPO_JSON, _corpo_json(await rota(estado, partes[1:], metodo, fator_iqr))
+    if partes and partes[0] == 'graficos':
+        metodo, fator_iqr = _parametros(url.query)
+        return await _rota_grafico(estado, partes[1:], metodo, fator_iqr)
+    raise ErroHTTP(404, f'Caminho desconhecido: {url.path}')
+
+
+async def responder(estado, alvo, cabecalhos):
+    """Resposta de um GET: (status, cabeçalhos extras, corpo em bytes)."""
+    url = urlsplit(alvo)
+    partes = [unquote(parte) for parte in url.path.split('/') if parte]
+    if partes == ['saude']:
+        corpo = _corpo_json({'status': 'ok', 'sha256': estado['sha256'],
+                             'linhas': estado['linhas'], 'municipios': len(estado['agregado'])})
+        return 200, {'Content-Type': TIPO_JSON, 'Cache-Control': 'no-store'}, corpo
+
+    # A resposta pronta (já em bytes) fica guardada pela URL. Ela é obtida
+    # antes de olhar o If-None-Match: caminho ou indicador inexistente dá
+    # 404 (ou 400) mesmo com "If-None-Match: *", que só vale para recurso
+    # que existe (RFC 9110). Depois da primeira vez, é só uma consulta ao
+    # dicionário.
+    tipo, corpo = await _memorizar(estado, ('url', alvo),
+                                   lambda: _corpo(estado, url, partes))
+    etag = _etag(estado, alvo)
+    if _etag_confere(etag, cabecalhos.get('if-none-match', '')):
+        return 304, {'ETag': etag}, b''
+    # no-cache: o cliente pode guardar, mas confirma com o ETag a cada uso
+    return 200, {'Content-Type': tipo, 'ETag': etag, 'Cache-Control': 'no-cache'}, corpo
+
+
+async def _ler_requisicao(leitor):
+    # Linha de requisição e cabeçalhos; None se a conexão foi fechada.
+    # O limite de tempo (TEMPO_OCIOSO) é aplicado por quem chama, à
+    # requisição inteira.
+    linha = await leitor.readline()
+    if not linha:
+        return None
+    try:
+        metodo, alvo, versao = linha.decode('latin-1').split()
+    except ValueError:
+        raise ErroHTTP(400, 'Linha de requisição inválida') from None
+
+    cabecalhos = {}
+    for _ in range(TAMANHO_MAXIMO_CABECALHOS):
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    else:
+        raise ErroHTTP(400, 'Cabeçalhos demais')
+    return metodo, alvo, versao, cabecalhos
+
+
+def _escrever(escritor, status, cabecalhos, corpo, enviar_corpo=True, manter=True):
+    linhas = [f'HTTP/1.1 {status} {MOTIVOS.get(status, "")}']
+    cabecalhos = {**cabecalhos, 'Content-Length': str(len(corpo)),
+                  'Connection': 'keep-alive' if manter else 'close'}
+    linhas += [f'{nome}: {valor}' for nome, valor in cabecalhos.items()]
+    escritor.write(('\r\n'.join(linhas) + '\r\n\r\n').encode('latin-1'))
+    if enviar_corpo:
+        escritor.write(corpo)
+
+
+async def tratar_conexao(estado, leitor, escritor):
+    """Atende as requisições de uma conexão até o cliente fechar."""
+    try:
+        while True:
+            try:
+                # Um único prazo para a linha e todos os cabeçalhos: um
+                # cliente que envia um cabeçalho de cada vez, devagar, não
+                # prende a conexão
+                requisicao = await asyncio.wait_for(_ler_requisicao(leitor), TEMPO_OCIOSO)
+            except (asyncio.TimeoutError, ConnectionError):
+                break
+            except ErroHTTP as erro:
+                _escrever(escritor, erro.status, {'Content-Type': TIPO_JSON},
+                          _corpo_json({'erro': str(erro)}), manter=False)
+                break
+            if requisicao is None:
+                break
+
+            metodo, alvo, versao, cabecalhos = requisicao
+            conexao = cabecalhos.get('connection', '').lower()
+            manter = conexao == 'keep-alive' if versao == 'HTTP/1.0' else conexao != 'close'
+            try:
+                if metodo not in ('GET', 'HEAD'):
+                    raise ErroHTTP(405, f'Método não suportado: {metodo}')
+                status, extras, corpo = await responder(estado, alvo, cabecalhos)
+            except ErroHTTP as erro:
+                status, extras = erro.status, {'Content-Type': TIPO_JSON}
+                corpo = _corpo_json({'erro': str(erro)})
+            except Exception as erro:
+                status, extras = 500, {'Content-Type': TIPO_JSON}
+                corpo = _corpo_json({'erro': f'{type(erro).__name__}: {erro}'})
+
+            _escrever(escritor, status, extras, corpo, metodo != 'HEAD', manter)
+            await escritor.drain()
+            if not manter:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        escritor.close()
+
+
+async def servir(estado, host=HOST_PADRAO, porta=PORTA_PADRAO):
+    """Atende conexões até ser cancelado (Ctrl+C ou SIGTERM)."""
+    laco = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):  # Windows
+        laco.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    servidor = await asyncio.start_server(
+        lambda leitor, escritor: tratar_conexao(estado, leitor, escritor), host, porta)
+    enderecos = ', '.join(f'http://{s.getsockname()[0]}:{s.getsockname()[1]}'
+                          for s in servidor.sockets)
+    print(f'{len(estado["indicadores"])} indicadores, {estado["linhas"]} registros; '
+          f'servindo em {enderecos}', flush=True)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def executar(host=HOST_PADRAO, porta=PORTA_PADRAO, trabalhadores=None, **kwargs):
+    """Carrega os dados e roda o servidor até Ctrl+C.
+
+    Os argumentos nomeados vão para carregar_estado() (origem, pasta,
+    atualizar).
+    """
+    estado = carregar_estado(trabalhadores=trabalhadores, **kwargs)
+    try:
+        asyncio.run(servir(estado, host, porta))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        encerrar_estado(estado)
@@ -0,0 +1,180 @@
+# Gerador de dados sintéticos no formato do CSV do ISP
+#
+# Cria um arquivo com o mesmo separador (;), a mesma codificação
+# (iso-8859-1) e a mesma estrutura da BaseDPEvolucaoMensalCisp, com o
+# tamanho que quisermos. Serve para medir desempenho sem depender do site
+# do ISP.
+#
+# Como no arquivo real, cada linha é uma delegacia (CISP) em um mês:
+#   - cada CISP pertence sempre ao mesmo município, AISP e RISP, e cada
+#     município a uma única região;
+#   - o arquivo está ordenado por ano, mês e CISP (todas as CISPs de um
+#     mês, depois o mês seguinte);
+#   - colunas: cisp, mes, ano, mes_ano, aisp, risp, munic, mcirc, regiao,
+#     os indicadores e fase.
+# O tamanho é controlado pelo número de CISPs e de meses (ou diretamente
+# pelo número de linhas). Os códigos mcirc são fictícios (33 + número do
+# município), não os códigos IBGE verdadeiros.
+#
+# As contagens seguem Poisson com uma "escala" por CISP (lognormal) e por
+# município, para que as somas tenham a distribuição assimétrica, com
+# outliers, dos dados reais.
+#
+# Uso:
+#   python -m aula19.sintetico dados.csv --linhas 2000000
+#   python -m aula19.sintetico dados.csv --cisps 500 --anos 2003 2024
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from aula19.dados import CODIFICACAO, SEPARADOR
+
+
+# Município -> região (Capital, Baixada, Grande Niterói e Interior)
+MUNICIPIOS = {
+    'Angra dos Reis': 'Interior',
+    'Barra Mansa': 'Interior',
+    'Belford Roxo': 'Baixada Fluminense',
+    'Cabo Frio': 'Interior',
+    'Campos dos Goytacazes': 'Interior',
+    'Duque de Caxias': 'Baixada Fluminense',
+    'Itaboraí': 'Grande Niterói',
+    'Macaé': 'Interior',
+    'Magé': 'Baixada Fluminense',
+    'Maricá': 'Grande Niterói',
+    'Mesquita': 'Baixada Fluminense',
+    'Nilópolis': 'Baixada Fluminense',
+    'Niterói': 'Grande Niterói',
+    'Nova Friburgo': 'Interior',
+    'Nova Iguaçu': 'Baixada Fluminense',
+    'Petrópolis': 'Interior',
+    'Queimados': 'Baixada Fluminense',
+    'Resende': 'Interior',
+    'Rio de Janeiro': 'Capital',
+    'São Gonçalo': 'Grande Niterói',
+    'São João de Meriti': 'Baixada Fluminense',
+    'Teresópolis': 'Interior',
+    'Três Rios': 'Interior',
+    'Volta Redonda': 'Interior',
+}
+
+REGIOES = ['Capital', 'Baixada Fluminense', 'Grande Niterói', 'Interior']
+
+INDICADORES = [
+    'hom_doloso', 'latrocinio', 'estupro', 'roubo_transeunte',
+    'roubo_celular', 'roubo_veiculo', 'roubo_carga', 'furto_veiculos',
+    'estelionato', 'ameaca',
+]
+
+# Média mensal por CISP de cada indicador (antes da escala da CISP)
+MEDIAS = [1.5, 0.1, 3.0, 40.0, 20.0, 15.0, 3.0, 10.0, 12.0, 25.0]
+
+CISPS_PADRAO = 137
+ANOS_PADRAO = (2003, 2024)
+CISPS_POR_AISP = 3
+AISPS_POR_RISP = 6
+
+# Quantidade aproximada de linhas geradas e gravadas de cada vez
+TAMANHO_BLOCO = 500_000
+
+
+def criar_delegacias(cisps=CISPS_PADRAO, semente=0):
+    """Tabela fixa das CISPs: município, AISP, RISP, mcirc e escala.
+
+    A capital fica com cerca de 40% das CISPs e os demais municípios
+    dividem o restante, com pelo menos uma CISP cada quando possível.
+    """
+    rng = np.random.default_rng(semente)
+    nomes = list(MUNICIPIOS)
+    capital = nomes.index('Rio de Janeiro')
+    pesos = np.full(len(nomes), 0.6 / (len(nomes) - 1))
+    pesos[capital] = 0.4
+
+    indice_munic = rng.choice(len(nomes), cisps, p=pesos)
+    indice_munic[:min(cisps, len(nomes))] = np.arange(min(cisps, len(nomes)))
+    indice_munic.sort()
+
+    # Escala por CISP: algumas delegacias muito maiores que as outras
+    escala = rng.lognormal(0, 0.8, cisps) * (1 + (indice_munic == capital))
+    aisp = np.arange(cisps) // CISPS_POR_AISP + 1
+    return pd.DataFrame({
+        'cisp': np.arange(1, cisps + 1),
+        'aisp': aisp,
+        'risp': (aisp - 1) // AISPS_POR_RISP + 1,
+        'munic': np.array(nomes)[indice_munic],
+        'mcirc': 3300000 + 10 * (indice_munic + 1),
+        'regiao': [MUNICIPIOS[nomes[i]] for i in indice_munic],
+        'escala': escala,
+    })
+
+
+def gerar_bloco(rng, delegacias, periodos, indicadores=INDICADORES):
+    """Gera as linhas de todas as delegacias nos períodos (ano*12 + mes-1) dados."""
+    quantidade = len(delegacias)
+    periodo = np.repeat(periodos, quantidade)
+    ano, mes = periodo // 12, periodo % 12 + 1
+    repetir = np.tile(np.arange(quantidade), len(periodos))
+    # O texto 'AAAAmMM' é montado uma vez por mês, não por linha
+    rotulos = np.array([f'{p // 12}m{p % 12 + 1:02d}' for p in periodos])
+
+    df = pd.DataFrame({
+        'cisp': delegacias['cisp'].to_numpy()[repetir],
+        'mes': mes,
+        'ano': ano,
+        'mes_ano': np.repeat(rotulos, quantidade),
+        'aisp': delegacias['aisp'].to_numpy()[repetir],
+        'risp': delegacias['risp'].to_numpy()[repetir],
+        'munic': delegacias['munic'].to_numpy()[repetir],
+        'mcirc': delegacias['mcirc'].to_numpy()[repetir],
+        'regiao': delegacias['regiao'].to_numpy()[repetir],
+    })
+    # Sazonalidade leve: mais ocorrências no verão
+    sazonal = 1 + 0.15 * np.cos(2 * np.pi * (mes - 1) / 12)
+    escala = delegacias['escala'].to_numpy()[repetir] * sazonal
+    for i, nome in enumerate(indicadores):
+        df[nome] = rng.poisson(escala * MEDIAS[i % len(MEDIAS)])
+    df['fase'] = 3
+    return df
+
+
+def gerar_csv(caminho, linhas=None, indicadores=INDICADORES, semente=0,
+              cisps=CISPS_PADRAO, anos=ANOS_PADRAO):
+    """Grava um CSV sintético no formato do ISP, em blocos.
+
+    linhas: se informado, o número de CISPs é ajustado para chegar a esse
+            total com os meses de `anos` (o arquivo pode ter até uma
+            linha por mês a mais ou a menos).
+    cisps: número de delegacias (ignorado se linhas for informado).
+    anos: (primeiro, último), inclusive.
+
+    Retorna o caminho gravado.
+    """
+    rng = np.random.default_rng(semente)
+    periodos = np.arange(anos[0] * 12, (anos[1] + 1) * 12)
+    if linhas is not None:
+        cisps = max(1, round(linhas / len(periodos)))
+    delegacias = criar_delegacias(cisps, semente)
+
+    meses_por_bloco = max(1, TAMANHO_BLOCO // cisps)
+    with open(caminho, 'w', encoding=CODIFICACAO, newline='') as arquivo:
+        for inicio in range(0, len(periodos), meses_por_bloco):
+            bloco = gerar_bloco(rng, delegacias, periodos[inicio:inicio + meses_por_bloco],
+                                indicadores)
+            bloco.to_csv(arquivo, sep=SEPARADOR, index=False, header=inicio == 0)
+    return caminho
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera um CSV sintético no formato do ISP')
+    parser.add_argument('caminho')
+    parser.add_argument('--linhas', type=int,
+                        help='total aproximado de linhas (define o número de CISPs)')
+    parser.add_argument('--cisps', type=int, default=CISPS_PADRAO)
+    parser.add_argument('--anos', type=int, nargs=2, default=ANOS_PADRAO,
+                        metavar=('PRIMEIRO', 'ULTIMO'))
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args()
+    gerar_csv(args.caminho, args.linhas, semente=args.semente, cisps=args.cisps,
+              anos=tuple(args.anos))
+    print(f'Arquivo gravado em {args.caminho}')
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from aula19 import aproximado, dados
+from aula19.aproximado import (criar_sketch, erro_posto, mesclar_sketches, quantis_sketch,
+                               relatorio_registros)
+
+K = 200
+LIMITE = 1.65 / K
+
+
+@pytest.fixture
+def valores():
+    # Contagens com cauda longa, como os registros CISP x mês
+    rng = np.random.default_rng(0)
+    return rng.poisson(rng.lognormal(1.5, 1.0, 200_000)).astype(np.float64)
+
+
+def _peso_total(sketch):
+    return sum(len(itens) * 2 ** h for h, itens in enumerate(sketch['niveis']))
+
+
+def _sketch(valores, semente=0, bloco=10_000):
+    sketch = criar_sketch(K, semente)
+    for inicio in range(0, len(valores), bloco):
+        aproximado.atualizar_sketch(sketch, valores[inicio:inicio + bloco])
+    return sketch
+
+
+def test_peso_total_igual_a_n(valores):
+    sketch = _sketch(valores)
+    assert len(sketch['niveis']) > 5
+    assert sketch['n'] == _peso_total(sketch) == len(valores)
+
+    partes = [_sketch(parte, semente) for semente, parte in enumerate(np.array_split(valores, 3))]
+    mesclado = partes[0]
+    for parte in partes[1:]:
+        mesclar_sketches(mesclado, parte)
+    assert mesclado['n'] == _peso_total(mesclado) == len(valores)
+    # A memória continua limitada depois da mescla
+    assert sum(len(itens) for itens in mesclado['niveis']) < 4 * K
+
+
+def test_erro_de_posto_dentro_do_limite(valores):
+    erro = erro_posto(_sketch(valores), valores, (0.1, 0.25, 0.5, 0.75, 0.9))
+    assert (erro['erro_posto'] <= LIMITE).all(), erro
+
+
+def test_mescla_igual_a_um_fluxo_so(valores):
+    probabilidades = (0.25, 0.5, 0.75)
+    unico = _sketch(valores)
+    mesclado = criar_sketch(K, 1)
+    for semente, parte in enumerate(np.array_split(valores, 8)):
+        mesclar_sketches(mesclado, _sketch(parte, semente + 2))
+
+    assert mesclado['n'] == unico['n']
+    assert (erro_posto(mesclado, valores, probabilidades)['erro_posto'] <= LIMITE).all()
+    ordenados = np.sort(valores)
+    postos = [np.searchsorted(ordenados, quantis_sketch(s, probabilidades), 'right') / len(valores)
+              for s in (unico, mesclado)]
+    np.testing.assert_allclose(postos[0], postos[1], atol=2 * LIMITE)
+
+
+def test_sketch_vazio():
+    sketch = aproximado.atualizar_sketch(criar_sketch(K), [np.nan, np.nan])
+    assert sketch['n'] == 0
+    with pytest.raises(ValueError, match='vazio'):
+        quantis_sketch(sketch, [0.5])
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    caminho = tmp_path / 'a.csv'
+    caminho.write_text('munic;ano;mes;roubo_veiculo;furto_celular\n'
+                       + ''.join(f'Rio;2020;{mes};{mes * 3};\n' for mes in range(1, 13))
+                       + 'Niterói;2020;1;90;\n', encoding=dados.CODIFICACAO)
+    pasta = tmp_path / 'cache'
+    dados.atualizar_cache(str(caminho), pasta)
+    return pasta
+
+
+@pytest.mark.parametrize('modo', aproximado.MODOS)
+def test_indicador_sem_valores(pasta, modo):
+    df = relatorio_registros(['roubo_veiculo', 'furto_celular'], modo, pasta=pasta,
+                             atualizar=False)
+
+    assert df.loc['roubo_veiculo', 'registros'] == 13
+    assert df.loc['roubo_veiculo', 'outliers_superiores'] == 1
+    vazio = df.loc['furto_celular']
+    assert vazio['registros'] == 0
+    assert vazio[['outliers_inferiores', 'outliers_superiores']].tolist() == [0, 0]
+    assert vazio[['media', 'q1', 'q2', 'q3', 'minimo', 'maximo']].isna().all()
+
+
+@pytest.mark.parametrize('modo', aproximado.MODOS)
+def test_base_sem_linhas(tmp_path, modo):
+    caminho = tmp_path / 'a.csv'
+    caminho.write_text('munic;ano;mes;roubo_veiculo\n', encoding=dados.CODIFICACAO)
+    df = relatorio_registros(modo=modo, origem=str(caminho), pasta=tmp_path / 'cache')
+
+    assert df.index.tolist() == ['roubo_veiculo']
+    assert df.loc['roubo_veiculo', 'registros'] == 0
+
+
+def test_origem_consultada_uma_vez(pasta, monkeypatch):
+    chamadas = []
+    atualizar_cache = dados.atualizar_cache
+
+    def contar(*args, **kwargs):
+        chamadas.append(args)
+        return atualizar_cache(*args, **kwargs)
+
+    monkeypatch.setattr(dados, 'atualizar_cache', contar)
+    origem = str(pasta.parent / 'a.csv')
+
+    relatorio_registros(['roubo_veiculo'], 'aproximado', chunksize=5, origem=origem, pasta=pasta)
+    assert len(chamadas) == 1
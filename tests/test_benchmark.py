@@ -0,0 +1,25 @@
+from aula19.benchmark import comparar, executar_suite
+
+
+def test_suite_em_miniatura():
+    # Só confere que todos os casos rodam; os tempos só valem contra uma
+    # base gravada na mesma máquina (python -m aula19.benchmark suite)
+    resultado = executar_suite(linhas=2_000, repeticoes=1, graficos=False)
+
+    assert resultado['parametros'] == {'linhas': 2_000, 'semente': 0}
+    assert set(resultado['casos']) == {'conversao', 'carga', 'agregacao', 'estatisticas',
+                                       'outliers_municipio', 'outliers_registro'}
+    assert all(caso['minimo'] > 0 for caso in resultado['casos'].values())
+
+
+def _casos(**tempos):
+    return {'casos': {caso: {'minimo': segundos} for caso, segundos in tempos.items()}}
+
+
+def test_comparar_com_a_base():
+    base = _casos(lento=1.0, rapido=1.0, ruido=0.001, igual=1.0)
+    atual = _casos(lento=1.5, rapido=0.5, ruido=0.004, igual=1.05, novo=0.1)
+
+    situacoes = {caso: situacao for caso, *_, situacao in comparar(atual, base, 0.1)}
+    assert situacoes == {'lento': 'regressao', 'rapido': 'melhora', 'ruido': 'ok',
+                         'igual': 'ok', 'novo': 'novo'}
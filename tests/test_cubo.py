@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aula19.cubo import cubo_de_dataframe, janelas, periodo, totais
+from aula19.dados import CODIFICACAO, SEPARADOR
+from aula19.sintetico import gerar_csv
+
+INDICADORES = ['hom_doloso', 'roubo_veiculo']
+
+
+@pytest.fixture
+def df_ocorrencias(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=12, anos=(2003, 2005))
+    df = pd.read_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO)
+    # Linhas sem município no primeiro mês e sem ano/mês no meio: ficam
+    # fora do cubo, como fora do groupby
+    extras = df.iloc[[0, 1, 2]].copy()
+    extras['munic'] = [None, df['munic'].iloc[0], df['munic'].iloc[0]]
+    extras['ano'] = [2003, None, 2004]
+    extras['mes'] = [1, 5, None]
+    extras[INDICADORES] = 1000
+    return pd.concat([extras, df], ignore_index=True)
+
+
+def _esperado(df, filtro=None):
+    df = df.dropna(subset=['munic', 'ano', 'mes'])
+    if filtro is not None:
+        df = df[filtro(periodo(df['ano'], df['mes']))]
+    return df.groupby('munic')[INDICADORES].sum().astype(np.float64)
+
+
+def test_valores_iguais_ao_groupby(df_ocorrencias):
+    cubo = cubo_de_dataframe(df_ocorrencias, INDICADORES)
+    validas = df_ocorrencias.dropna(subset=['munic', 'ano', 'mes'])
+    esperado = validas.groupby(['ano', 'mes', 'munic'])[INDICADORES].sum()
+
+    assert cubo['inicio'] == periodo(2003, 1)
+    assert list(cubo['municipios']) == sorted(validas['munic'].unique())
+    for (ano, mes, munic), linha in esperado.iterrows():
+        t = int(periodo(ano, mes)) - cubo['inicio']
+        m = cubo['municipios'].get_loc(munic)
+        np.testing.assert_array_equal(cubo['valores'][t, m], linha.to_numpy(np.float64))
+    assert cubo['valores'].sum() == esperado.to_numpy().sum()
+
+
+@pytest.mark.parametrize('inicio, fim', [((2003, 1), (2005, 12)), ((2004, 3), (2004, 5)),
+                                         ((2003, 1), (2003, 1)), ((2002, 1), (2003, 6))])
+def test_totais_iguais_ao_filtro(df_ocorrencias, inicio, fim):
+    cubo = cubo_de_dataframe(df_ocorrencias, INDICADORES)
+    esperado = _esperado(df_ocorrencias,
+                         lambda p: (p >= periodo(*inicio)) & (p <= periodo(*fim)))
+    pd.testing.assert_frame_equal(totais(cubo, inicio, fim).loc[esperado.index], esperado,
+                                  check_names=False)
+
+
+def test_janelas_somam_o_historico(df_ocorrencias):
+    cubo = cubo_de_dataframe(df_ocorrencias, INDICADORES)
+    total = _esperado(df_ocorrencias).to_numpy()
+    for tipo in ('ano', 'trimestre'):
+        soma = sum(cubo['acumulado'][fim] - cubo['acumulado'][inicio]
+                   for _, inicio, fim in janelas(cubo, tipo))
+        np.testing.assert_allclose(soma, total)
+    assert len(janelas(cubo, 'movel12')) == 36 - 11
+
+
+def test_sem_linhas_validas():
+    df = pd.DataFrame({'munic': [None], 'ano': [2003], 'mes': [1], 'hom_doloso': [1]})
+    with pytest.raises(ValueError, match='Nenhuma linha'):
+        cubo_de_dataframe(df, ['hom_doloso'])
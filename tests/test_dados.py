@@ -0,0 +1,303 @@
+import concurrent.futures
+import http.server
+import os
+import threading
+import urllib.error
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aula19 import dados
+from aula19.sintetico import gerar_csv
+
+
+class Origem(http.server.BaseHTTPRequestHandler):
+    """Servidor local que faz o papel do site do ISP."""
+
+    conteudo = b''
+    etag = None
+    truncar = False
+    respostas = []
+
+    def do_GET(self):
+        if self.etag and self.headers.get('If-None-Match') == self.etag:
+            self.respostas.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.respostas.append(200)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.conteudo)))
+        if self.etag:
+            self.send_header('ETag', self.etag)
+        self.end_headers()
+        corpo = self.conteudo[:len(self.conteudo) // 2] if self.truncar else self.conteudo
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origem():
+    Origem.conteudo, Origem.etag, Origem.truncar = b'', None, False
+    Origem.respostas = []
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origem)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield Origem, f'http://127.0.0.1:{servidor.server_address[1]}/dados.csv'
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _csv(caminho, semente=0, anos=(2020, 2021)):
+    gerar_csv(caminho, cisps=6, anos=anos, semente=semente)
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def _conteudo_cache(pasta):
+    with open(os.path.join(pasta, dados.NOME_CSV), 'rb') as arquivo:
+        csv = arquivo.read()
+    return csv, dados._ler_json(os.path.join(pasta, dados.NOME_ORIGEM)), dados.ler_meta(pasta)
+
+
+def test_etag_igual_responde_304_sem_baixar(origem, tmp_path):
+    servidor, url = origem
+    servidor.conteudo = _csv(tmp_path / 'a.csv')
+    servidor.etag = '"v1"'
+
+    primeiro = dados.atualizar_cache(url, tmp_path / 'cache')
+    segundo = dados.atualizar_cache(url, tmp_path / 'cache')
+
+    assert servidor.respostas == [200, 304]
+    assert segundo == primeiro
+    assert dados._ler_json(tmp_path / 'cache' / dados.NOME_ORIGEM)['etag'] == '"v1"'
+
+
+def test_mesmo_sha256_nao_converte_de_novo(origem, tmp_path, monkeypatch):
+    servidor, url = origem
+    servidor.conteudo = _csv(tmp_path / 'a.csv')
+    servidor.etag = '"v1"'
+    meta = dados.atualizar_cache(url, tmp_path / 'cache')
+
+    # ETag novo, mesmo conteúdo: só os cabeçalhos guardados mudam
+    servidor.etag = '"v2"'
+    conversoes = []
+    monkeypatch.setattr(dados, 'converter_para_colunas',
+                        lambda *args: conversoes.append(args))
+    assert dados.atualizar_cache(url, tmp_path / 'cache') == meta
+    assert servidor.respostas == [200, 200]
+    assert conversoes == []
+    assert dados._ler_json(tmp_path / 'cache' / dados.NOME_ORIGEM)['etag'] == '"v2"'
+
+
+def test_conteudo_novo_converte_de_novo(origem, tmp_path):
+    servidor, url = origem
+    servidor.conteudo = _csv(tmp_path / 'a.csv')
+    antes = dados.atualizar_cache(url, tmp_path / 'cache')
+
+    servidor.conteudo = _csv(tmp_path / 'b.csv', semente=1, anos=(2020, 2022))
+    depois = dados.atualizar_cache(url, tmp_path / 'cache')
+
+    assert depois['sha256'] != antes['sha256']
+    assert depois['linhas'] == 6 * 36
+    csv, info, meta = _conteudo_cache(tmp_path / 'cache')
+    assert csv == servidor.conteudo
+    assert info['sha256'] == meta['sha256'] == depois['sha256']
+
+
+def test_download_incompleto_mantem_o_cache(origem, tmp_path):
+    servidor, url = origem
+    servidor.conteudo = _csv(tmp_path / 'a.csv')
+    dados.atualizar_cache(url, tmp_path / 'cache')
+    antes = _conteudo_cache(tmp_path / 'cache')
+
+    servidor.conteudo = _csv(tmp_path / 'b.csv', semente=1)
+    servidor.truncar = True
+    with pytest.raises(urllib.error.ContentTooShortError):
+        dados.atualizar_cache(url, tmp_path / 'cache')
+
+    assert _conteudo_cache(tmp_path / 'cache') == antes
+    assert sorted(os.listdir(tmp_path / 'cache')) == [dados.NOME_CSV, dados.PASTA_COLUNAS,
+                                                      dados.NOME_ORIGEM, dados.NOME_TRAVA]
+
+
+@pytest.mark.parametrize('conteudo', [
+    b'<html><body>Erro; tente mais tarde</body></html>\n',
+    b'munic;ano;mes;../fora\nRio;2020;1;3\n',
+    b'cisp;ano;mes;roubo_veiculo\n1;2020;1;3\n',
+])
+def test_cabecalho_invalido_nao_substitui_o_cache(origem, tmp_path, conteudo):
+    servidor, url = origem
+    servidor.conteudo = _csv(tmp_path / 'a.csv')
+    dados.atualizar_cache(url, tmp_path / 'cache')
+    antes = _conteudo_cache(tmp_path / 'cache')
+
+    servidor.conteudo = conteudo
+    with pytest.raises(ValueError, match='Cabeçalho inválido'):
+        dados.atualizar_cache(url, tmp_path / 'cache')
+
+    assert _conteudo_cache(tmp_path / 'cache') == antes
+    assert not (tmp_path / 'fora.npy').exists()
+
+
+def test_processos_simultaneos_convertem_uma_vez(tmp_path):
+    caminho = tmp_path / 'a.csv'
+    conteudo = _csv(caminho)
+    pasta = str(tmp_path / 'cache')
+
+    with concurrent.futures.ProcessPoolExecutor(6) as executor:
+        metas = list(executor.map(dados.atualizar_cache, [str(caminho)] * 6, [pasta] * 6))
+
+    assert all(meta == metas[0] for meta in metas)
+    assert metas[0]['linhas'] == 6 * 24
+    csv, info, meta = _conteudo_cache(pasta)
+    assert csv == conteudo and info['sha256'] == meta['sha256']
+    # Nenhuma pasta ou arquivo temporário ficou para trás
+    assert sorted(os.listdir(pasta)) == [dados.NOME_CSV, dados.PASTA_COLUNAS,
+                                         dados.NOME_ORIGEM, dados.NOME_TRAVA]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    caminho = tmp_path / 'a.csv'
+    _csv(caminho)
+    pasta = tmp_path / 'cache'
+    dados.atualizar_cache(str(caminho), pasta)
+    referencia = pd.read_csv(caminho, sep=dados.SEPARADOR, encoding=dados.CODIFICACAO)
+    return pasta, referencia
+
+
+def test_carregar_ocorrencias_somente_colunas_pedidas(cache):
+    pasta, referencia = cache
+    df = dados.carregar_ocorrencias(['munic', 'roubo_veiculo'], pasta=pasta, atualizar=False)
+
+    assert list(df.columns) == ['munic', 'roubo_veiculo']
+    assert isinstance(df['munic'].dtype, pd.CategoricalDtype)
+    assert np.issubdtype(df['roubo_veiculo'].dtype, np.integer)
+    assert df['munic'].astype(str).tolist() == referencia['munic'].tolist()
+    assert df['roubo_veiculo'].tolist() == referencia['roubo_veiculo'].tolist()
+
+
+def test_carregar_ocorrencias_em_blocos(cache):
+    pasta, _ = cache
+    inteiro = dados.carregar_ocorrencias(['munic', 'ano', 'hom_doloso'], pasta=pasta,
+                                         atualizar=False)
+    blocos = list(dados.carregar_ocorrencias(['munic', 'ano', 'hom_doloso'], chunksize=50,
+                                             pasta=pasta, atualizar=False))
+
+    assert [len(bloco) for bloco in blocos] == [50, 50, 44]
+    assert blocos[-1].index[0] == 100
+    pd.testing.assert_frame_equal(pd.concat(blocos), inteiro)
+
+
+def test_carregar_ocorrencias_sem_colunas(cache):
+    pasta, referencia = cache
+    df = dados.carregar_ocorrencias([], pasta=pasta, atualizar=False)
+    assert df.shape == (len(referencia), 0)
+    blocos = list(dados.carregar_ocorrencias([], chunksize=100, pasta=pasta, atualizar=False))
+    assert [len(bloco) for bloco in blocos] == [100, 44]
+
+
+def test_coluna_que_nao_e_inteira_nao_interrompe_a_leitura(tmp_path):
+    caminho = tmp_path / 'a.csv'
+    caminho.write_text('munic;ano;mes;roubo_veiculo;taxa;observacao;grande\n'
+                       'Rio;2020;1;-;1.5;sem dados;3000000000\n'
+                       'Rio;2020;2;3;2;;1\n', encoding=dados.CODIFICACAO)
+
+    df = dados.ler_csv_ocorrencias(caminho)
+    assert str(df['ano'].dtype) == dados.TIPO_CONTAGEM
+    assert df['roubo_veiculo'].isna().tolist() == [True, False]
+    assert df['taxa'].tolist() == [1.5, 2.0]
+    assert isinstance(df['observacao'].dtype, pd.CategoricalDtype)
+    assert df['grande'].tolist() == [3000000000, 1]
+
+    meta = dados.converter_para_colunas(caminho, str(tmp_path / 'colunas'))
+    assert meta['colunas']['roubo_veiculo']['tipo'] == 'numero'
+    assert meta['colunas']['observacao']['tipo'] == 'categoria'
+
+
+def _sem_vazios(valores):
+    return [None if pd.isna(valor) else valor for valor in valores]
+
+
+def test_conversao_em_blocos_igual_a_leitura_inteira(tmp_path, monkeypatch):
+    caminho = tmp_path / 'a.csv'
+    caminho.write_text('munic;ano;mes;roubo_veiculo;taxa;observacao;grande\n'
+                       'Rio;2020;1;-;1.5;;3000000000\n'
+                       'Rio;2020;2;-;2;sem dados;1\n'
+                       'Niterói;2020;1;3;2;;1\n'
+                       'Angra;2020;2;4;2;outra;-5\n'
+                       'Rio;2020;3;;2;;1\n', encoding=dados.CODIFICACAO)
+    # Blocos de 2 linhas: categorias novas em blocos diferentes e um bloco
+    # de 'roubo_veiculo' sem nenhum número
+    monkeypatch.setattr(dados, 'LINHAS_CONVERSAO', 2)
+    meta = dados.converter_para_colunas(caminho, str(tmp_path / 'colunas'))
+
+    referencia = dados.ler_csv_ocorrencias(caminho)
+    assert meta['linhas'] == 5
+    assert meta['colunas']['munic']['categorias'] == ['Angra', 'Niterói', 'Rio']
+    assert meta['colunas']['observacao']['tipo'] == 'categoria'
+    assert meta['colunas']['roubo_veiculo']['dtype'] == np.dtype(np.float32).str
+    assert meta['colunas']['ano']['dtype'] == np.dtype(np.int16).str
+    assert meta['colunas']['grande']['dtype'] == np.dtype(np.int64).str
+
+    pasta = tmp_path / 'colunas'
+    for nome in referencia.columns:
+        valores = np.load(pasta / f'{nome}.npy')
+        info = meta['colunas'][nome]
+        if info['tipo'] == 'categoria':
+            valores = pd.Categorical.from_codes(valores, info['categorias'])
+        assert _sem_vazios(valores) == _sem_vazios(referencia[nome]), nome
+    assert sorted(os.listdir(pasta)) == sorted([f'{nome}.npy' for nome in referencia.columns]
+                                               + [dados.NOME_META])
+
+
+def _colunas(pasta):
+    meta = dados.ler_meta(pasta)
+    return meta, {nome: np.load(os.path.join(pasta, dados.PASTA_COLUNAS, nome + '.npy'))
+                  for nome in meta['colunas']}
+
+
+def test_linhas_acrescentadas_nao_reconvertem_o_csv(tmp_path, monkeypatch):
+    linhas = _csv(tmp_path / 'a.csv').splitlines(keepends=True)
+    origem = tmp_path / 'origem.csv'
+    origem.write_bytes(b''.join(linhas[:1 + 6 * 12]))
+    antes = dados.atualizar_cache(str(origem), tmp_path / 'cache')
+
+    # Linha nova com um município que fica no meio da ordem alfabética e
+    # um valor que não cabe mais em int8
+    cabecalho = linhas[0].decode(dados.CODIFICACAO).strip().split(dados.SEPARADOR)
+    linha = dict.fromkeys(cabecalho, '0') | {'munic': 'Carapebus', 'ano': '2022', 'mes': '1',
+                                             'mes_ano': '2022m01', 'regiao': 'Baixadas',
+                                             'hom_doloso': '999'}
+    novas = [';'.join(linha[nome] for nome in cabecalho).encode(dados.CODIFICACAO) + b'\n']
+    origem.write_bytes(b''.join(linhas + novas))
+    monkeypatch.setattr(dados, 'converter_para_colunas', pytest.fail)
+    depois = dados.atualizar_cache(str(origem), tmp_path / 'cache')
+
+    assert depois['linhas'] == len(linhas)
+    assert depois['anteriores'] == [{'sha256': antes['sha256'], 'linhas': antes['linhas']}]
+    monkeypatch.undo()
+    meta, valores = _colunas(tmp_path / 'cache')
+    referencia = dados.converter_para_colunas(str(origem), str(tmp_path / 'inteiro' / dados.PASTA_COLUNAS),
+                                              depois['sha256'])
+    assert {**meta, 'anteriores': None} == {**referencia, 'anteriores': None}
+    for nome, esperado in _colunas(tmp_path / 'inteiro')[1].items():
+        np.testing.assert_array_equal(valores[nome], esperado, err_msg=nome)
+
+
+def test_historico_revisado_converte_tudo(tmp_path):
+    linhas = _csv(tmp_path / 'a.csv').splitlines(keepends=True)
+    origem = tmp_path / 'origem.csv'
+    origem.write_bytes(b''.join(linhas[:-1]))
+    dados.atualizar_cache(str(origem), tmp_path / 'cache')
+
+    # Uma linha antiga removida e outra acrescentada: o arquivo cresceu,
+    # mas não é o antigo mais linhas no final
+    origem.write_bytes(b''.join(linhas[:1] + linhas[2:] + linhas[1:2]))
+    meta = dados.atualizar_cache(str(origem), tmp_path / 'cache')
+    assert 'anteriores' not in meta
+    assert meta['linhas'] == len(linhas) - 1
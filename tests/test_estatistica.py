@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from aula19.estatistica import METODOS, ranquear, resumir, resumir_agrupado
+
+
+@pytest.fixture
+def valores():
+    # Contagens com empates e uma cauda longa, como os totais por município
+    rng = np.random.default_rng(0)
+    return np.column_stack([
+        rng.poisson(5, 92),
+        rng.lognormal(3, 1.2, 92).round(),
+        np.r_[np.zeros(80), rng.integers(100, 1000, 12)],
+    ]).astype(np.float64)
+
+
+@pytest.mark.parametrize('metodo', METODOS)
+@pytest.mark.parametrize('tamanho', [1, 2, 3, 7, 92])
+def test_resumir_igual_ao_numpy(valores, metodo, tamanho):
+    amostra = valores[:tamanho]
+    resumo = resumir(amostra, metodo, fator_iqr=1.5)
+
+    q1, q2, q3 = np.quantile(amostra, [0.25, 0.50, 0.75], axis=0, method=metodo)
+    np.testing.assert_allclose(resumo['q1'], q1)
+    np.testing.assert_allclose(resumo['q2'], q2)
+    np.testing.assert_allclose(resumo['q3'], q3)
+    np.testing.assert_allclose(resumo['mediana'], np.median(amostra, axis=0))
+    np.testing.assert_array_equal(resumo['minimo'], amostra.min(axis=0))
+    np.testing.assert_array_equal(resumo['maximo'], amostra.max(axis=0))
+
+    limite_inferior = q1 - 1.5 * (q3 - q1)
+    limite_superior = q3 + 1.5 * (q3 - q1)
+    np.testing.assert_allclose(resumo['limite_inferior'], limite_inferior)
+    np.testing.assert_allclose(resumo['limite_superior'], limite_superior)
+    np.testing.assert_array_equal(resumo['outliers_inferiores'],
+                                  (amostra < limite_inferior).sum(axis=0))
+    np.testing.assert_array_equal(resumo['outliers_superiores'],
+                                  (amostra > limite_superior).sum(axis=0))
+    np.testing.assert_array_equal(resumo['menores'], (amostra < q1).sum(axis=0))
+    np.testing.assert_array_equal(resumo['maiores'], (amostra > q3).sum(axis=0))
+
+
+def test_resumir_uma_coluna_igual_a_duas(valores):
+    resumo = resumir(valores)
+    for coluna in range(valores.shape[1]):
+        sozinha = resumir(valores[:, coluna])
+        for nome in ('q1', 'q2', 'q3', 'limite_inferior', 'limite_superior',
+                     'outliers_inferiores', 'outliers_superiores'):
+            assert sozinha[nome] == resumo[nome][coluna]
+
+
+def test_ranquear_outliers_como_o_exemplo1(valores):
+    coluna = valores[:, 2]
+    resumo = resumir(coluna)
+    inferiores, superiores = ranquear(resumo, 'outliers')
+
+    # exemplo1.py: valores fora dos limites, ordenados (superiores do maior
+    # para o menor)
+    esperados = np.sort(coluna[coluna > resumo['limite_superior']])[::-1]
+    np.testing.assert_array_equal(coluna[superiores], esperados)
+    assert len(inferiores) == (coluna < resumo['limite_inferior']).sum()
+
+
+def test_resumir_vazio():
+    with pytest.raises(ValueError):
+        resumir(np.empty(0))
+
+
+@pytest.mark.parametrize('metodo', METODOS)
+def test_resumir_agrupado_igual_a_resumir_por_grupo(valores, metodo):
+    rng = np.random.default_rng(1)
+    # Grupos de tamanhos diferentes (1 a 40 linhas) e um grupo vazio
+    grupos = np.repeat([0, 1, 2, 4, 5], [1, 2, 9, 40, 40])
+    grupos = grupos[rng.permutation(len(grupos))]
+    resumo = resumir_agrupado(valores, grupos, 6, metodo)
+
+    assert resumo['tamanho'].tolist() == [1, 2, 9, 0, 40, 40]
+    assert np.isnan(resumo['q1'][3]).all()
+    for grupo in (0, 1, 2, 4, 5):
+        linhas = grupos == grupo
+        esperado = resumir(valores[linhas], metodo)
+        for nome in ('minimo', 'q1', 'q2', 'q3', 'maximo', 'mediana', 'limite_inferior',
+                     'limite_superior', 'outliers_inferiores', 'outliers_superiores'):
+            np.testing.assert_allclose(resumo[nome][grupo], esperado[nome], err_msg=nome)
+        np.testing.assert_array_equal(resumo['superior'][linhas],
+                                      valores[linhas] > esperado['limite_superior'])
+        np.testing.assert_array_equal(resumo['inferior'][linhas],
+                                      valores[linhas] < esperado['limite_inferior'])
+
+
+def test_resumir_agrupado_uma_coluna(valores):
+    grupos = np.arange(len(valores)) % 3
+    uma = resumir_agrupado(valores[:, 1], grupos)
+    todas = resumir_agrupado(valores, grupos)
+    np.testing.assert_array_equal(uma['q3'], todas['q3'][:, 1])
+    assert uma['superior'].shape == (len(valores),)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aula19 import incremental
+from aula19.dados import CODIFICACAO, SEPARADOR
+from aula19.sintetico import gerar_csv
+
+INDICADORES = ['hom_doloso', 'roubo_veiculo']
+
+
+@pytest.fixture
+def linhas(tmp_path):
+    # Histórico completo (2003 a 2005); os testes gravam só uma parte dele
+    caminho = tmp_path / 'completo.csv'
+    gerar_csv(caminho, cisps=8, anos=(2003, 2005))
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read().splitlines(keepends=True)
+
+
+def _gravar(caminho, linhas):
+    with open(caminho, 'wb') as arquivo:
+        arquivo.writelines(linhas)
+    return str(caminho)
+
+
+def _esperado(caminho):
+    df = pd.read_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO)
+    return df.groupby('munic')[INDICADORES].sum().astype(np.float64)
+
+
+def _conferir(estado, caminho):
+    esperado = _esperado(caminho)
+    pd.testing.assert_frame_equal(estado['soma'].loc[esperado.index, INDICADORES], esperado,
+                                  check_names=False)
+
+
+def test_linhas_acrescentadas_sao_somadas_sem_recalcular(linhas, tmp_path, monkeypatch):
+    # 8 CISPs x 24 meses (2003 e 2004) + cabeçalho
+    csv = _gravar(tmp_path / 'isp.csv', linhas[:1 + 8 * 24])
+    pasta = tmp_path / 'cache'
+    incremental.atualizar_agregados(INDICADORES, pasta=str(pasta), origem=csv)
+
+    _gravar(tmp_path / 'isp.csv', linhas)
+    monkeypatch.setattr(incremental, '_recalcular', pytest.fail)
+    estado = incremental.atualizar_agregados(INDICADORES, pasta=str(pasta), origem=csv)
+
+    assert estado['linhas'] == len(linhas) - 1
+    _conferir(estado, csv)
+    # O estado gravado é o mesmo devolvido
+    pd.testing.assert_frame_equal(incremental.ler_estado(str(pasta))['soma'], estado['soma'])
+
+
+def test_valor_antigo_revisado_recalcula_tudo(linhas, tmp_path):
+    csv = _gravar(tmp_path / 'isp.csv', linhas)
+    pasta = str(tmp_path / 'cache')
+    incremental.atualizar_agregados(INDICADORES, pasta=pasta, origem=csv)
+
+    # Mesmo número de linhas, um valor de 2003 alterado
+    df = pd.read_csv(csv, sep=SEPARADOR, encoding=CODIFICACAO)
+    df.loc[0, 'roubo_veiculo'] += 100_000
+    df.to_csv(csv, sep=SEPARADOR, encoding=CODIFICACAO, index=False)
+    estado = incremental.atualizar_agregados(INDICADORES, pasta=pasta, origem=csv)
+
+    _conferir(estado, csv)
+    assert estado['soma'].loc[df.loc[0, 'munic'], 'roubo_veiculo'] >= 100_000
+
+
+def test_linhas_acrescentadas_com_historico_revisado(linhas, tmp_path):
+    csv = _gravar(tmp_path / 'isp.csv', linhas[:1 + 8 * 24])
+    pasta = str(tmp_path / 'cache')
+    incremental.atualizar_agregados(INDICADORES, pasta=pasta, origem=csv)
+
+    # Linhas novas e, ao mesmo tempo, a primeira linha antiga removida
+    _gravar(tmp_path / 'isp.csv', linhas[:1] + linhas[2:])
+    estado = incremental.atualizar_agregados(INDICADORES, pasta=pasta, origem=csv)
+
+    assert estado['linhas'] == len(linhas) - 2
+    _conferir(estado, csv)
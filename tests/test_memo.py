@@ -0,0 +1,38 @@
+import pandas as pd
+
+from aula19 import memo
+from aula19.cubo import montar_cubo, relatorio, totais
+from aula19.dados import CODIFICACAO, SEPARADOR
+from aula19.sintetico import gerar_csv
+
+INDICADORES = ['hom_doloso', 'roubo_veiculo']
+JANELA = ((2004, 1), (2004, 12))
+
+
+def test_janela_igual_ao_cubo(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=30, anos=(2003, 2005))
+    # Um município sem nenhum registro em 2004
+    df = pd.read_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO)
+    ausente = df['munic'].iloc[0]
+    df = df[(df['munic'] != ausente) | (df['ano'] != 2004)]
+    df.to_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO, index=False)
+    pasta = str(tmp_path / 'cache')
+
+    df_agregado, df_estatisticas = memo.resultados(INDICADORES, janela=JANELA, pasta=pasta,
+                                                   origem=str(caminho))
+
+    cubo = montar_cubo(INDICADORES, pasta=pasta, atualizar=False)
+    esperado = totais(cubo, *JANELA)
+    assert df_agregado.loc[ausente].tolist() == [0, 0]
+    pd.testing.assert_frame_equal(df_agregado, esperado)
+
+    t_inicio = 12 * 2004 - cubo['inicio']
+    df_cubo = relatorio(cubo, [('2004', t_inicio, t_inicio + 12)], INDICADORES, outliers=True)
+    colunas = ['q1', 'q2', 'q3', 'limite_inferior', 'limite_superior']
+    pd.testing.assert_frame_equal(df_estatisticas[colunas].reset_index(drop=True),
+                                  df_cubo[colunas].reset_index(drop=True))
+
+    # Segunda consulta: lida do cache de resultados, igual à primeira
+    df_agregado_2, _ = memo.resultados(INDICADORES, janela=JANELA, pasta=pasta, atualizar=False)
+    pd.testing.assert_frame_equal(df_agregado_2, df_agregado)
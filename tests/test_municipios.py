@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aula19.analise import agregar_por_municipio
+from aula19.dados import ler_csv_ocorrencias
+from aula19.municipios import POR_HABITANTES, anexar_populacao, codificar
+from aula19.sintetico import gerar_csv
+
+INDICADORES = ['hom_doloso', 'roubo_veiculo', 'estelionato']
+
+
+@pytest.fixture
+def df_ocorrencias(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=40, anos=(2020, 2021))
+    df = ler_csv_ocorrencias(caminho, ['munic', 'mcirc', *INDICADORES])
+    # Uma linha sem município e um valor vazio
+    df.loc[0, 'munic'] = np.nan
+    df.loc[1, 'roubo_veiculo'] = pd.NA
+    return df
+
+
+@pytest.fixture
+def populacao(df_ocorrencias):
+    # Um município fica de fora da tabela, e a tabela tem um que não está
+    # nos dados
+    municipios = df_ocorrencias.dropna(subset=['munic']).groupby('munic', observed=True)['mcirc']
+    tabela = municipios.first().reset_index().iloc[1:]
+    tabela.columns = ['munic', 'ibge']
+    tabela['populacao'] = np.arange(len(tabela)) * 10_000 + 50_000
+    extra = pd.DataFrame({'munic': ['Outro'], 'ibge': [3399999], 'populacao': [1000]})
+    return pd.concat([tabela, extra], ignore_index=True)
+
+
+def _comparar(resultado, esperado):
+    # Índices só com os nomes (o groupby devolve 'category')
+    esperado = esperado.set_axis(esperado.index.astype(str), axis=0)
+    pd.testing.assert_frame_equal(resultado, esperado, check_names=False)
+
+
+def test_totais_iguais_ao_groupby(df_ocorrencias):
+    esperado = df_ocorrencias.groupby('munic', observed=True)[INDICADORES].sum()
+    df_agregado = agregar_por_municipio(df_ocorrencias, INDICADORES)
+    _comparar(df_agregado, esperado.astype(np.int64))
+
+
+@pytest.mark.parametrize('chave', ['munic', 'ibge'])
+def test_taxas_iguais_ao_merge(df_ocorrencias, populacao, chave):
+    tabela = populacao[[chave, 'populacao']]
+    totais = df_ocorrencias.groupby('munic', observed=True)[INDICADORES].sum().reset_index()
+    totais['munic'] = totais['munic'].astype(str)
+    if chave == 'ibge':
+        codigos = df_ocorrencias.groupby('munic', observed=True)['mcirc'].first()
+        totais['ibge'] = totais['munic'].map(codigos.rename(index=str)).astype(np.int64)
+    else:
+        # Sem mcirc, a ligação é pelo nome
+        df_ocorrencias = df_ocorrencias.drop(columns='mcirc')
+    unidos = totais.merge(tabela, on=chave).set_index('munic')
+    esperado = unidos[INDICADORES].div(unidos['populacao'], axis=0) * POR_HABITANTES
+
+    df_taxas = agregar_por_municipio(df_ocorrencias, INDICADORES, populacao=tabela)
+    assert len(df_taxas) == len(totais) - 1
+    _comparar(df_taxas, esperado.astype(np.float64))
+
+
+@pytest.mark.parametrize('chave', ['munic', 'ibge'])
+def test_chave_repetida(df_ocorrencias, populacao, chave):
+    _, dimensao = codificar(df_ocorrencias['munic'], df_ocorrencias['mcirc'])
+    tabela = pd.concat([populacao, populacao.iloc[:1]])[[chave, 'populacao']]
+    with pytest.raises(ValueError, match=f'{chave} repetido'):
+        anexar_populacao(dimensao, tabela)
+
+
+def test_nenhum_municipio_corresponde(df_ocorrencias):
+    _, dimensao = codificar(df_ocorrencias['munic'])
+    tabela = pd.DataFrame({'munic': ['RIO DE JANEIRO', 'NITERÓI'], 'populacao': [1, 2]})
+    with pytest.raises(ValueError, match='Nenhum município'):
+        anexar_populacao(dimensao, tabela)
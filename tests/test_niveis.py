@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from aula19.dados import CODIFICACAO, SEPARADOR
+from aula19.estatistica import resumir
+from aula19.niveis import agregar_niveis, outliers_niveis
+from aula19.sintetico import gerar_csv
+
+INDICADORES = ['hom_doloso', 'roubo_veiculo']
+
+
+def _ocorrencias(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=60, anos=(2020, 2021))
+    return pd.read_csv(caminho, sep=SEPARADOR, encoding=CODIFICACAO)
+
+
+def test_totais_de_cada_nivel_iguais_ao_groupby(tmp_path):
+    df = _ocorrencias(tmp_path)
+    niveis = agregar_niveis(df, INDICADORES)
+
+    for nivel in ('cisp', 'munic', 'regiao'):
+        esperado = df.groupby(nivel)[INDICADORES].sum().astype(np.float64)
+        obtido = pd.DataFrame(niveis[nivel]['totais'], index=niveis[nivel]['nomes'],
+                              columns=INDICADORES)
+        pd.testing.assert_frame_equal(obtido.sort_index(), esperado, check_names=False,
+                                      check_index_type=False)
+
+    # O pai de cada município é a sua região
+    regiao = df.groupby('munic')['regiao'].first()
+    pais = niveis['regiao']['nomes'][niveis['munic']['pai']]
+    assert list(pais) == regiao.loc[niveis['munic']['nomes']].tolist()
+
+
+def test_outliers_de_cisp_iguais_ao_laco_por_municipio(tmp_path):
+    df = _ocorrencias(tmp_path)
+    _, df_outliers = outliers_niveis(agregar_niveis(df, INDICADORES),
+                                     analises=['cisp_municipio'])
+
+    esperados = set()
+    for munic, grupo in df.groupby('munic'):
+        totais = grupo.groupby('cisp')[INDICADORES].sum()
+        for indicador in INDICADORES:
+            resumo = resumir(totais[indicador].to_numpy())
+            fora = totais[indicador][(totais[indicador] < resumo['limite_inferior'])
+                                     | (totais[indicador] > resumo['limite_superior'])]
+            esperados |= {(munic, indicador, cisp) for cisp in fora.index}
+
+    obtidos = set(zip(df_outliers['grupo'], df_outliers['indicador'], df_outliers['unidade']))
+    assert obtidos == esperados
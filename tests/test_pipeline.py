@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from aula19 import dados, pipeline
+from aula19.sintetico import gerar_csv
+
+
+@pytest.fixture
+def cache(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=8, anos=(2020, 2021))
+    pasta = str(tmp_path / 'cache')
+    meta = dados.atualizar_cache(str(caminho), pasta)
+    return caminho, pasta, meta
+
+
+@pytest.mark.parametrize('conteudo', [
+    '',                                                   # EmptyDataError
+    'munic;ano;mes;roubo_veiculo\n"Rio;2020;1;3\n',       # ParserError
+    '<html><body>Erro</body></html>\n',                   # cabeçalho inválido
+])
+def test_arquivo_ilegivel_usa_o_cache_anterior(cache, conteudo):
+    caminho, pasta, meta = cache
+    origem = dados._ler_json(os.path.join(pasta, dados.NOME_ORIGEM))
+    caminho.write_text(conteudo, encoding=dados.CODIFICACAO)
+
+    df_estatisticas, metricas = pipeline.executar(['roubo_veiculo'], origem=str(caminho),
+                                                  pasta=pasta, espera=0)
+
+    download, conversao = metricas[:2]
+    assert download['etapa'] == 'download' and download['status'] == 'ok'
+    assert download['tentativas'] == 1 and download['novo']
+    assert conversao['etapa'] == 'conversao'
+    assert conversao['status'] == 'fallback'
+    assert conversao['erro']
+    assert conversao['sha256'] == meta['sha256']
+    assert list(df_estatisticas.index) == ['roubo_veiculo']
+    # O origem.json continua apontando para o CSV convertido
+    assert dados._ler_json(os.path.join(pasta, dados.NOME_ORIGEM)) == origem
+
+
+def test_sem_cache_o_erro_sobe(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    caminho.write_text('', encoding=dados.CODIFICACAO)
+    with pytest.raises(Exception) as erro:
+        pipeline.executar(['roubo_veiculo'], origem=str(caminho), pasta=str(tmp_path / 'c'),
+                          espera=0)
+    assert [(m['etapa'], m['status']) for m in erro.value.metricas] == [('download', 'ok'),
+                                                                        ('conversao', 'erro')]
+
+
+def test_erro_de_rede_e_repetido(cache, monkeypatch):
+    _, pasta, meta = cache
+
+    def fora_do_ar(*args):
+        raise ConnectionRefusedError('fora do ar')
+
+    monkeypatch.setattr(pipeline, 'baixar_csv', fora_do_ar)
+    _, metricas = pipeline.executar(['roubo_veiculo'], origem='http://127.0.0.1:9/', pasta=pasta,
+                                    tentativas=3, espera=0)
+
+    download = metricas[0]
+    assert download['tentativas'] == 3
+    assert download['status'] == 'fallback'
+    assert 'ConnectionRefusedError' in download['erro']
+    # Nada novo para converter: a próxima etapa já é a carga
+    assert metricas[1]['etapa'] == 'carga'
+    assert metricas[1]['linhas'] == meta['linhas']
+
+
+def test_etapas_separadas(cache):
+    caminho, pasta, meta = cache
+    _, metricas = pipeline.executar(['roubo_veiculo'], origem=str(caminho), pasta=pasta)
+
+    assert [m['etapa'] for m in metricas] == ['download', 'conversao', 'carga', 'agregacao',
+                                              'estatisticas']
+    # Mesmo arquivo: nada foi baixado de novo nem convertido
+    assert metricas[0]['novo'] is False
+    assert metricas[1]['sha256'] == meta['sha256']
+
+
+@pytest.mark.skipif(not pipeline.zerar_pico_memoria(), reason='só no Linux')
+def test_pico_de_memoria_por_etapa():
+    metricas = []
+    with pipeline.etapa(metricas, 'grande'):
+        grande = np.ones(50_000_000)     # 400 MB
+        del grande
+    with pipeline.etapa(metricas, 'pequena'):
+        pass
+
+    grande, pequena = metricas
+    assert grande['memoria_pico_mb'] > 350
+    assert pequena['memoria_pico_mb'] < grande['memoria_pico_mb'] - 300
+    assert pequena['memoria_pico_processo_mb'] >= grande['memoria_pico_mb']
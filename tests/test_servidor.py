@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from aula19 import servidor
+from aula19.sintetico import gerar_csv
+
+
+@pytest.fixture
+def estado(tmp_path):
+    caminho = tmp_path / 'isp.csv'
+    gerar_csv(caminho, cisps=30, anos=(2020, 2021))
+    estado = servidor.carregar_estado(str(caminho), str(tmp_path / 'cache'), trabalhadores=1)
+    yield estado
+    servidor.encerrar_estado(estado)
+
+
+async def _com_servidor(estado, cliente):
+    tcp = await asyncio.start_server(
+        lambda leitor, escritor: servidor.tratar_conexao(estado, leitor, escritor),
+        '127.0.0.1', 0)
+    async with tcp:
+        return await cliente(tcp.sockets[0].getsockname()[1])
+
+
+async def _get(porta, alvo, *cabecalhos):
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    linhas = [f'GET {alvo} HTTP/1.1', 'Host: teste', 'Connection: close', *cabecalhos]
+    escritor.write(('\r\n'.join(linhas) + '\r\n\r\n').encode('latin-1'))
+    resposta = await leitor.read()
+    escritor.close()
+    cabecalho, _, corpo = resposta.partition(b'\r\n\r\n')
+    linhas = cabecalho.decode('latin-1').split('\r\n')
+    cabecalhos = dict(linha.split(': ', 1) for linha in linhas[1:])
+    return int(linhas[0].split()[1]), cabecalhos, corpo
+
+
+def test_if_none_match_compara_cada_etag_inteira(estado):
+    async def cliente(porta):
+        _, cabecalhos, _ = await _get(porta, '/indicadores')
+        etag = cabecalhos['ETag']
+        return etag, [
+            (await _get(porta, '/indicadores', f'If-None-Match: {etag}'))[0],
+            (await _get(porta, '/indicadores', f'If-None-Match: "a", W/{etag}'))[0],
+            (await _get(porta, '/indicadores', 'If-None-Match: *'))[0],
+            # Só um pedaço do ETag, ou o ETag dentro de outro: não confere
+            (await _get(porta, '/indicadores', f'If-None-Match: {etag[:-3]}"'))[0],
+            (await _get(porta, '/indicadores', f'If-None-Match: "x{etag[1:]}'))[0],
+        ]
+
+    etag, status = asyncio.run(_com_servidor(estado, cliente))
+    assert etag.startswith('"')
+    assert status == [304, 304, 304, 200, 200]
+
+
+def test_if_none_match_nao_esconde_recurso_inexistente(estado):
+    async def cliente(porta):
+        return [
+            (await _get(porta, alvo, 'If-None-Match: *'))[0]
+            for alvo in ('/nada', '/estatisticas/nao_existe', '/indicadores')
+        ]
+
+    assert asyncio.run(_com_servidor(estado, cliente)) == [404, 404, 304]
+
+
+def test_cabecalhos_lentos_nao_prendem_a_conexao(estado, monkeypatch):
+    monkeypatch.setattr(servidor, 'TEMPO_OCIOSO', 0.5)
+
+    async def cliente(porta):
+        leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+        inicio = time.perf_counter()
+        escritor.write(b'GET /indicadores HTTP/1.1\r\n')
+        # Um cabeçalho a cada 0.2 s, sem nunca terminar a requisição
+        for i in range(20):
+            try:
+                escritor.write(f'X-Lento-{i}: 1\r\n'.encode())
+                await escritor.drain()
+            except ConnectionError:
+                break
+            try:
+                if await asyncio.wait_for(leitor.read(), 0.2) == b'':
+                    break
+            except asyncio.TimeoutError:
+                pass
+        escritor.close()
+        return time.perf_counter() - inicio
+
+    assert asyncio.run(_com_servidor(estado, cliente)) < 2